@@ -12,6 +12,9 @@ import threading
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_from_directory, current_app, jsonify
 from werkzeug.utils import secure_filename
 import config
+from gallery_cache import get_gallery_cache
+from embedding_store import embeddings_exist, load_embeddings, embeddings_mtime
+from model_registry import model_stats
 
 # Membuat Blueprint untuk admin
 admin_bp = Blueprint('admin', __name__, template_folder='templates')
@@ -43,6 +46,9 @@ def background_update_embeddings(process_id, database_dir):
             confidence_threshold=0.6
         )
         
+        # Muat galeri baru di background agar job klasifikasi berikutnya tidak perlu menunggu
+        get_gallery_cache("face_embeddings.pkl").refresh_in_background()
+        
         # Update status selesai
         message = (
             f"Face embeddings telah diupdate! "
@@ -93,6 +99,9 @@ def background_reprocess_embeddings(process_id, database_dir, confidence_thresho
             confidence_threshold=confidence_threshold
         )
         
+        # Muat galeri baru di background agar job klasifikasi berikutnya tidak perlu menunggu
+        get_gallery_cache("face_embeddings.pkl").refresh_in_background()
+        
         # Update status selesai
         if result['status'] == 'success':
             message = (
@@ -144,6 +153,9 @@ def auto_update_embeddings():
             metadata_path="face_embeddings_metadata.pkl",
             confidence_threshold=confidence_threshold
         )
+        
+        # Muat galeri baru di background agar job klasifikasi berikutnya tidak perlu menunggu
+        get_gallery_cache("face_embeddings.pkl").refresh_in_background()
        
         return {
             'success': True,
@@ -199,8 +211,8 @@ def audit_face_database():
     metadata_path = 'face_embeddings_metadata.pkl'  # File berada di root direktori
     database_dir = current_app.config['DATABASE_FOLDER']
     
-    # Cek keberadaan file pickle
-    if not os.path.exists(pickle_path):
+    # Cek keberadaan embeddings (store columnar atau file pickle)
+    if not embeddings_exist(pickle_path):
         return {
             'error': True,
             'message': f"File embeddings tidak ditemukan di {pickle_path}"
@@ -210,8 +222,7 @@ def audit_face_database():
     has_metadata = os.path.exists(metadata_path)
     
     # Load embeddings
-    with open(pickle_path, "rb") as f:
-        embeddings = pickle.load(f)
+    embeddings = load_embeddings(pickle_path)
     
     # Load metadata jika tersedia
     if has_metadata:
@@ -358,9 +369,8 @@ def get_database_stats():
     
     # Mendapatkan waktu terakhir diperbarui dari file embeddings jika ada
     last_updated = "Never"
-    embeddings_path = 'face_embeddings.pkl'
-    if os.path.exists(embeddings_path):
-        mod_time = os.path.getmtime(embeddings_path)
+    mod_time = embeddings_mtime('face_embeddings.pkl')
+    if mod_time is not None:
         last_updated = datetime.fromtimestamp(mod_time).strftime('%Y-%m-%d %H:%M')
     
     return {
@@ -804,6 +814,13 @@ def admin_reprocess_embeddings():
     
     return redirect(url_for('admin.admin_panel'))
 
+# Route untuk melihat waktu muat dan memori model yang sudah dimuat proses ini
+@admin_bp.route('/model_stats', methods=['GET'])
+@admin_required
+def admin_model_stats():
+    """Endpoint JSON berisi status, waktu muat, dan selisih RSS per model"""
+    return jsonify(model_stats())
+
 # Route untuk memeriksa status background process
 @admin_bp.route('/processing_status', methods=['GET'])
 @admin_required
@@ -0,0 +1,236 @@
+import os
+import time
+import numpy as np
+from gallery import match_mode, load_person_centroids, centroids_path_for
+from env_settings import env_int
+
+# Jumlah list IVF yang diperiksa per query jika tidak diatur lewat environment
+DEFAULT_NPROBE = 8
+
+# Jumlah iterasi k-means saat melatih centroid IVF
+KMEANS_ITERATIONS = 10
+
+# Jumlah kandidat orang (berdasarkan skor centroid) yang di-rerank secara exact pada mode centroid
+DEFAULT_CENTROID_TOP_K = 5
+
+# Path file indeks IVF diletakkan di samping file embeddings
+def index_path_for(embeddings_path):
+    return os.path.splitext(embeddings_path)[0] + "_ivf.npz"
+
+# Jumlah list IVF default, tumbuh sebanding akar jumlah embedding
+def default_nlist(num_rows):
+    return int(max(1, min(num_rows, round(4 * np.sqrt(num_rows)))))
+
+# Mencari centroid terdekat (kosinus) untuk setiap baris, diproses per chunk
+def assign_rows(matrix, centroids, chunk_size=4096):
+    assignments = np.empty(matrix.shape[0], dtype=np.int32)
+    for start in range(0, matrix.shape[0], chunk_size):
+        scores = matrix[start:start + chunk_size] @ centroids.T
+        assignments[start:start + chunk_size] = np.argmax(scores, axis=1)
+    return assignments
+
+# K-means sferis sederhana pada baris yang sudah dinormalisasi
+def train_centroids(matrix, nlist, iterations=KMEANS_ITERATIONS, seed=0):
+    rng = np.random.default_rng(seed)
+    num_rows = matrix.shape[0]
+    centroids = matrix[rng.choice(num_rows, size=nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = assign_rows(matrix, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, matrix)
+        counts = np.bincount(assignments, minlength=nlist)
+
+        # List kosong diisi ulang dengan baris acak agar semua centroid terpakai
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = matrix[rng.choice(num_rows, size=int(empty.sum()), replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+
+    return np.ascontiguousarray(centroids)
+
+class IVFIndex:
+    """Indeks inverted-file (IVF) untuk matriks FaceGallery.
+
+    Setiap baris galeri dimasukkan ke list milik centroid terdekat. Query
+    hanya dibandingkan secara exact dengan baris di `nprobe` list yang
+    centroidnya paling mirip, sehingga biaya pencarian tidak lagi linear
+    terhadap ukuran galeri.
+
+    Mode centroid memakai struktur yang sama dengan satu list per orang:
+    centroid list adalah rata-rata embedding orang itu dan `nprobe` adalah
+    jumlah kandidat orang yang di-rerank (lihat IVFIndex.from_person_centroids).
+    """
+
+    def __init__(self, centroids, assignments, fingerprint, trained_rows, nprobe=DEFAULT_NPROBE):
+        self.centroids = centroids
+        self.assignments = assignments
+        self.fingerprint = fingerprint
+        self.trained_rows = trained_rows
+        self.nprobe = nprobe
+        self.build_lists()
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    # Menyusun daftar baris per list dari array assignment
+    def build_lists(self):
+        order = np.argsort(self.assignments, kind="stable")
+        counts = np.bincount(self.assignments, minlength=self.nlist)
+        self.list_rows = np.split(order, np.cumsum(counts)[:-1])
+
+    @classmethod
+    def build(cls, gallery, nlist=None, nprobe=DEFAULT_NPROBE):
+        """Melatih centroid baru dari seluruh galeri"""
+        num_rows = len(gallery)
+        nlist = min(nlist or default_nlist(num_rows), num_rows)
+        matrix = gallery.take_rows(slice(None))
+        centroids = train_centroids(matrix, nlist)
+        assignments = assign_rows(matrix, centroids)
+        return cls(centroids, assignments, gallery.fingerprint(), num_rows, nprobe)
+
+    @classmethod
+    def from_person_centroids(cls, gallery, centroids, top_k=DEFAULT_CENTROID_TOP_K):
+        """Prefilter dua tahap: skor terhadap centroid per orang, lalu rerank exact top-k orang"""
+        return cls(centroids, gallery.labels, None, len(gallery), top_k)
+
+    def refresh(self, gallery):
+        """Memperbarui indeks untuk galeri yang berubah
+
+        Centroid lama dipakai ulang dan hanya assignment baris yang dihitung
+        ulang. Centroid dilatih ulang jika ukuran galeri sudah berubah lebih
+        dari dua kali lipat sejak pelatihan terakhir.
+        """
+        num_rows = len(gallery)
+        if not (self.trained_rows / 2 <= num_rows <= self.trained_rows * 2):
+            return IVFIndex.build(gallery, nprobe=self.nprobe)
+
+        assignments = assign_rows(gallery.take_rows(slice(None)), self.centroids)
+        return IVFIndex(self.centroids, assignments, gallery.fingerprint(), self.trained_rows, self.nprobe)
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                assignments=self.assignments,
+                fingerprint=np.array(self.fingerprint),
+                trained_rows=np.array(self.trained_rows),
+                nprobe=np.array(self.nprobe)
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data["centroids"],
+                data["assignments"],
+                str(data["fingerprint"]),
+                int(data["trained_rows"]),
+                int(data["nprobe"])
+            )
+
+    def search(self, gallery, queries, nprobe=None):
+        """Mengembalikan (indeks baris terbaik, skor terbaik) untuk query yang sudah dinormalisasi"""
+        num_queries = queries.shape[0]
+        best_rows = np.full(num_queries, -1, dtype=np.int64)
+        best_scores = np.full(num_queries, -np.inf, dtype=np.float32)
+        if num_queries == 0:
+            return best_rows, best_scores
+
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        coarse = queries @ self.centroids.T
+        if nprobe < self.nlist:
+            probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.tile(np.arange(self.nlist), (num_queries, 1))
+
+        # Kelompokkan query per list agar setiap list cukup satu perkalian matriks
+        flat_lists = probes.ravel()
+        flat_queries = np.repeat(np.arange(num_queries), probes.shape[1])
+        order = np.argsort(flat_lists, kind="stable")
+        flat_lists = flat_lists[order]
+        flat_queries = flat_queries[order]
+        list_ids, starts = np.unique(flat_lists, return_index=True)
+        ends = np.append(starts[1:], len(flat_lists))
+
+        for list_id, start, end in zip(list_ids, starts, ends):
+            rows = self.list_rows[list_id]
+            if rows.size == 0:
+                continue
+            query_ids = flat_queries[start:end]
+            scores = queries[query_ids] @ gallery.take_rows(rows).T
+            local = np.argmax(scores, axis=1)
+            local_scores = scores[np.arange(len(local)), local]
+
+            better = local_scores > best_scores[query_ids]
+            best_scores[query_ids[better]] = local_scores[better]
+            best_rows[query_ids[better]] = rows[local[better]]
+
+        return best_rows, best_scores
+
+# Memuat indeks yang cocok dengan galeri, None jika tidak ada atau sudah basi
+def load_index(path, gallery):
+    if not os.path.exists(path):
+        print(f"Warning: Indeks ANN {path} tidak ditemukan, menggunakan pencarian exact")
+        return None
+
+    try:
+        index = IVFIndex.load(path)
+    except Exception as e:
+        print(f"Warning: Gagal memuat indeks ANN {path}: {e}. Menggunakan pencarian exact")
+        return None
+
+    if index.fingerprint != gallery.fingerprint():
+        print(f"Warning: Indeks ANN {path} tidak sesuai dengan embeddings saat ini, menggunakan pencarian exact")
+        return None
+
+    nprobe = env_int("ANN_NPROBE", 0)
+    if nprobe > 0:
+        index.nprobe = nprobe
+    return index
+
+# Memasang struktur pencarian sesuai MATCH_MODE ke galeri, exact jika tidak tersedia
+def attach_search_index(gallery, embeddings_path):
+    mode = match_mode()
+    if mode == "ivf":
+        gallery.index = load_index(index_path_for(embeddings_path), gallery)
+    elif mode == "centroid" and len(gallery):
+        centroids = load_person_centroids(centroids_path_for(embeddings_path), gallery)
+        top_k = env_int("CENTROID_TOP_K", DEFAULT_CENTROID_TOP_K, minimum=1)
+        gallery.index = IVFIndex.from_person_centroids(gallery, centroids, top_k)
+    return gallery
+
+# Membangun ulang indeks secara inkremental setelah embeddings ditulis ulang
+# Hanya berjalan jika MATCH_MODE=ivf; indeks lama yang basi ditolak load_index lewat sidik jari galeri
+def refresh_index(path, gallery):
+    if match_mode() != "ivf":
+        return None
+
+    start_time = time.time()
+    if len(gallery) == 0:
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+
+    index = None
+    if os.path.exists(path):
+        try:
+            index = IVFIndex.load(path)
+        except Exception as e:
+            print(f"Warning: Gagal memuat indeks ANN lama {path}: {e}. Membangun ulang")
+
+    if index is None:
+        index = IVFIndex.build(gallery)
+    elif index.fingerprint != gallery.fingerprint():
+        index = index.refresh(gallery)
+
+    index.save(path)
+    print(f"ANN index ({index.nlist} lists) saved to {path} in {time.time() - start_time:.2f} seconds")
+    return index
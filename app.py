@@ -15,8 +15,9 @@ from collections import defaultdict
 from flask import Flask, jsonify, render_template, request, redirect, url_for, send_from_directory, session, flash
 from flask_session import Session
 from werkzeug.utils import secure_filename
-from classify_faces import classify_faces
 from admin import admin_bp
+from model_registry import start_warm_up, wait_until_ready, warmup_enabled, readiness
+from gallery_cache import start_gallery_watcher
 import config
 
 # --- Global Variables Background Processing ---
@@ -33,6 +34,21 @@ def clear_folder(folder_path):
 def background_classify_faces(session_id, extracted_folder_path, output_folder_name):
     """Menjalankan klasifikasi wajah di background thread"""
     try:
+        # Upload yang datang sebelum warm-up selesai diantrikan sampai model siap
+        if not wait_until_ready(timeout=0):
+            background_processes[session_id] = {
+                'status': 'processing',
+                'message': 'Waiting for face models to finish loading...',
+                'progress': 0,
+                'queued': True,
+                'start_time': time.time()
+            }
+            wait_until_ready()
+            
+            # Dibatalkan selagi menunggu model
+            if background_processes.get(session_id, {}).get('status') == 'cancelled':
+                return
+        
         # Update status
         background_processes[session_id] = {
             'status': 'processing',
@@ -41,11 +57,21 @@ def background_classify_faces(session_id, extracted_folder_path, output_folder_n
             'start_time': time.time()
         }
         
-        # Jalankan klasifikasi
-        output_folder, output_zip_path, processing_time = classify_faces(
-            extracted_folder_path, 
-            output_folder=output_folder_name
-        )
+        # Import di sini agar start aplikasi tidak menunggu TensorFlow / Ultralytics
+        from classify_faces import classify_faces
+        from sharded_classify import classify_faces_sharded, classify_workers
+        
+        # Jalankan klasifikasi (dibagi ke beberapa proses worker jika CLASSIFY_WORKERS > 1)
+        if classify_workers() > 1:
+            output_folder, output_zip_path, processing_time = classify_faces_sharded(
+                extracted_folder_path,
+                output_folder=output_folder_name
+            )
+        else:
+            output_folder, output_zip_path, processing_time = classify_faces(
+                extracted_folder_path, 
+                output_folder=output_folder_name
+            )
         
         # Update status selesai
         background_processes[session_id] = {
@@ -128,6 +154,13 @@ Session(app)
 # Register Admin Blueprint
 app.register_blueprint(admin_bp, url_prefix='/admin')
 
+# Muat dan panaskan model di background; halaman sudah bisa dilayani selama proses ini
+if warmup_enabled():
+    start_warm_up()
+
+# Perubahan embeddings dari skrip CLI (update / reprocess / rebuild) dibangun ulang di background
+start_gallery_watcher("face_embeddings.pkl")
+
 # --- Main Routes ---
 @app.route('/')
 def index():
@@ -178,6 +211,12 @@ def check_processing_status():
     else:
         return jsonify({"status": "unknown", "message": "No processing information available"})
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Endpoint readiness: status model dan waktu warm-up (503 selama model belum siap)"""
+    status = readiness()
+    return jsonify(status), 200 if status['ready'] else 503
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     """Menerima upload file ZIP, mengekstrak, dan memulai proses klasifikasi wajah di background."""
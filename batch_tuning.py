@@ -0,0 +1,118 @@
+import os
+
+from model_registry import current_rss
+from env_settings import env_int, env_float, env_flag
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Penyesuaian ukuran batch YOLO / FaceNet selama job berdasarkan throughput dan memori proses.
+# Ukuran batch dinaikkan selama throughput (item/detik) masih membaik dan RSS di bawah batas memori;
+# jika throughput turun, tuner kembali ke ukuran terbaik. Melewati batas memori memperkecil batch.
+DEFAULT_CLASSIFY_BATCH_SIZE = 5
+DEFAULT_MEMORY_FRACTION = 0.8
+GROWTH_FACTOR = 2
+MIN_IMPROVEMENT = 0.05
+BATCHES_PER_PROBE = 2
+
+# Ukuran batch YOLO awal untuk klasifikasi (titik mulai tuner, atau ukuran tetap jika tuning dimatikan)
+def classify_batch_size():
+    return env_int("CLASSIFY_BATCH_SIZE", DEFAULT_CLASSIFY_BATCH_SIZE, minimum=1)
+
+# Membaca dari environment apakah ukuran batch disesuaikan otomatis
+def batch_tuning_enabled():
+    return env_flag("BATCH_TUNING", True)
+
+# Batas RSS proses dalam byte: CLASSIFY_MEMORY_LIMIT_MB, atau 80% RAM sistem jika tidak diisi
+def memory_limit_bytes():
+    limit_mb = env_float("CLASSIFY_MEMORY_LIMIT_MB", 0)
+    if limit_mb > 0:
+        return int(limit_mb * 1e6)
+
+    if psutil is not None:
+        return int(psutil.virtual_memory().total * DEFAULT_MEMORY_FRACTION)
+    try:
+        return int(os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") * DEFAULT_MEMORY_FRACTION)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+class BatchSizeTuner:
+    """Hill climbing ukuran batch dari item/detik yang terukur, dibatasi memori.
+
+    observe(items, seconds) dipanggil setelah setiap batch dan mengembalikan ukuran batch
+    berikutnya. Setiap ukuran diukur selama BATCHES_PER_PROBE batch sebelum dibandingkan.
+    Jika tuning dimatikan (enabled=False) ukuran awal dipakai terus dan hanya statistik dicatat.
+    """
+
+    def __init__(self, name, initial_size, min_size=1, max_size=64, memory_limit=None, enabled=True):
+        self.name = name
+        self.size = max(min(initial_size, max_size), min_size)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.memory_limit = memory_limit
+        self.enabled = enabled
+        self.settled = not enabled
+        self.best_size = self.size
+        self.best_rate = 0.0
+        self.window_items = 0
+        self.window_seconds = 0.0
+        self.window_batches = 0
+        self.total_items = 0
+        self.total_seconds = 0.0
+        self.shrunk_at_rss = None
+
+    def observe(self, items, seconds, rss=None):
+        self.total_items += items
+        self.total_seconds += seconds
+        if not self.enabled:
+            return self.size
+
+        # Batas memori selalu diperiksa, juga setelah ukuran batch stabil. RSS jarang turun setelah
+        # batch diperkecil (memori dipakai ulang allocator), jadi batch hanya diperkecil lagi jika RSS terus naik
+        rss = current_rss() if rss is None else rss
+        if (self.memory_limit and rss is not None and rss > self.memory_limit and self.size > self.min_size
+                and (self.shrunk_at_rss is None or rss > self.shrunk_at_rss)):
+            self.shrunk_at_rss = rss
+            new_size = max(self.size // GROWTH_FACTOR, self.min_size)
+            self.max_size = max(new_size, self.min_size)
+            self.best_size = min(self.best_size, self.max_size)
+            self.settled = True
+            return self._resize(new_size, f"RSS {rss / 1e6:.0f} MB di atas batas {self.memory_limit / 1e6:.0f} MB")
+
+        if self.settled:
+            return self.size
+
+        self.window_items += items
+        self.window_seconds += seconds
+        self.window_batches += 1
+        if self.window_batches < BATCHES_PER_PROBE or self.window_seconds <= 0:
+            return self.size
+
+        rate = self.window_items / self.window_seconds
+        self.window_items = 0
+        self.window_seconds = 0.0
+        self.window_batches = 0
+
+        if rate > self.best_rate * (1 + MIN_IMPROVEMENT):
+            self.best_size, self.best_rate = self.size, rate
+            if self.size < self.max_size:
+                return self._resize(min(self.size * GROWTH_FACTOR, self.max_size), f"{rate:.1f} item/s")
+            self.settled = True
+            return self.size
+
+        # Batch lebih besar tidak lebih cepat: kembali ke ukuran terbaik
+        self.settled = True
+        return self._resize(self.best_size, f"{rate:.1f} item/s, terbaik {self.best_rate:.1f} item/s")
+
+    def _resize(self, new_size, reason):
+        if new_size != self.size:
+            print(f"Batch tuner {self.name}: {self.size} -> {new_size} ({reason})")
+            self.size = new_size
+        return self.size
+
+    def summary(self):
+        rate = self.total_items / self.total_seconds if self.total_seconds > 0 else 0
+        state = "auto" if self.enabled else "tetap"
+        return f"{self.name} batch size {self.size} ({state}, {rate:.1f} item/s)"
@@ -1,11 +1,21 @@
 import os
+import queue
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
-from keras_facenet import FaceNet
-from ultralytics import YOLO
-import pickle
 import cv2
+import numpy as np
 import utils
+from gallery_cache import get_gallery_cache
+from embedding_store import load_embeddings as load_saved_embeddings
+from model_registry import get_yolo_model, get_face_embedder
+from face_batching import FaceEmbeddingBatcher
+from staged_pipeline import StagedPipeline, END_OF_STREAM, decode_workers, queue_batches
+from batch_tuning import BatchSizeTuner, batch_tuning_enabled, classify_batch_size, memory_limit_bytes
+import face_batching
+from image_decoding import decode_for_detection, reduced_decode_enabled, scale_box, DETECT_IMAGE_SIZE
+from detector_cascade import DetectorCascade, cascade_enabled, cascade_weights
+from tiled_detection import TiledDetector, tiled_detection_enabled
 import threading
 import time
 from datetime import datetime
@@ -13,40 +23,10 @@ from datetime import datetime
 # Global flag untuk mengontrol proses
 processing_cancelled = threading.Event()
 
-# Inisialisasi model (hanya sekali)
-yolo_model = YOLO("yolov8m-face.pt")
-embedder = FaceNet()
-
-# Variabel untuk menyimpan waktu terakhir kali embedding dimuat
-last_embedding_load_time = 0
-
-# Fungsi untuk memuat embedding dengan cek waktu modifikasi file
+# Fungsi untuk memuat dictionary embedding langsung dari file
+# Untuk klasifikasi gunakan gallery_cache agar galeri tidak dibangun ulang setiap job
 def load_embeddings():
-    global last_embedding_load_time
-    
-    embedding_file = "face_embeddings.pkl"
-    
-    if os.path.exists(embedding_file):
-        # Periksa kapan terakhir kali file dimodifikasi
-        current_mod_time = os.path.getmtime(embedding_file)
-        
-        # Jika file telah diubah sejak terakhir kali dimuat atau belum pernah dimuat
-        if current_mod_time > last_embedding_load_time:
-            print(f"Loading updated embeddings from {embedding_file}")
-            with open(embedding_file, "rb") as f:
-                known_embeddings = pickle.load(f)
-            
-            # Perbarui waktu muat terakhir
-            last_embedding_load_time = current_mod_time
-            return known_embeddings
-        else:
-            # File tidak berubah, coba muat dari cache
-            with open(embedding_file, "rb") as f:
-                return pickle.load(f)
-    else:
-        # File tidak ada, kembalikan dictionary kosong
-        print(f"Warning: Embedding file {embedding_file} tidak ditemukan!")
-        return {}
+    return load_saved_embeddings("face_embeddings.pkl")
 
 def cancel_processing():
     """Fungsi untuk membatalkan proses klasifikasi"""
@@ -57,8 +37,215 @@ def reset_cancel_flag():
     """Reset flag pembatalan"""
     processing_cancelled.clear()
 
+# Menyalin, menggambar, dan menyimpan anotasi untuk satu gambar berdasarkan hasil pencocokan wajahnya
+def write_image_result(record, matches, output_folder):
+    unknown_folder = os.path.join(output_folder, "UNKNOWN")
+    visualized_folder = os.path.join(output_folder, "VISUALIZED")
+    labels_folder = os.path.join(output_folder, "labels")
+
+    image_path = record["image_path"]
+    image_name = record["image_name"]
+    identified_faces = any(matches)
+
+    # Mode job tidak menyimpan gambar di memori, baca ulang hanya jika perlu divisualisasikan
+    original_image = record["image"]
+    if original_image is None and identified_faces:
+        original_image = cv2.imread(image_path)
+
+    for bbox, match in zip(record["bboxes"], matches):
+        if match:
+            label = match
+            person_folder = os.path.join(output_folder, match)
+        else:
+            label = "Unknown"
+            person_folder = unknown_folder
+
+        os.makedirs(person_folder, exist_ok=True)
+
+        if match:
+            shutil.copy(image_path, person_folder)
+
+        # Gambar bounding box di gambar asli
+        if original_image is not None:
+            utils.draw_bounding_box(original_image, bbox, label)
+
+    # Simpan gambar hasil visualisasi jika ada wajah yang teridentifikasi
+    if identified_faces and original_image is not None:
+        visualized_path = os.path.join(visualized_folder, image_name)
+        cv2.imwrite(visualized_path, original_image)
+    elif not identified_faces:
+        shutil.copy(image_path, unknown_folder)
+
+    # Simpan anotasi bounding box ke format YOLO
+    utils.save_yolo_annotation(labels_folder, image_name, record["image_shape"], record["bboxes"], record["confidences"])
+
+# Mencocokkan embedding dari banyak gambar dalam satu panggilan galeri lalu membagikan hasilnya kembali per gambar
+# Dengan pipeline, penulisan hasil dijadwalkan ke pool write-behind alih-alih ditulis langsung
+def match_pending_images(pending_images, gallery, output_folder, pipeline=None):
+    if not pending_images or processing_cancelled.is_set():
+        return
+
+    all_embeddings = np.concatenate([record["embeddings"] for record in pending_images])
+    if pipeline is not None:
+        with pipeline.timed("match"):
+            all_matches = gallery.match(all_embeddings)
+    else:
+        all_matches = gallery.match(all_embeddings)
+
+    offset = 0
+    for record in pending_images:
+        if processing_cancelled.is_set():
+            break
+
+        face_count = len(record["embeddings"])
+        matches = all_matches[offset:offset + face_count]
+        if pipeline is not None:
+            pipeline.submit_write(write_image_result, record, matches, output_folder)
+        else:
+            write_image_result(record, matches, output_folder)
+        offset += face_count
+
+# Bounding box dan confidence hasil deteksi YOLO yang lolos ambang batas kepercayaan
+def detected_boxes(result, confidence_threshold):
+    bboxes = []
+    confidences = []
+
+    if not result or not result.boxes:
+        return bboxes, confidences
+
+    # Proses setiap bounding box hasil deteksi
+    for box in result.boxes:
+        bbox = box.xyxy.cpu().numpy()[0]
+        conf = box.conf.cpu().numpy()[0]
+
+        if conf < confidence_threshold:
+            continue
+
+        bboxes.append(bbox)
+        confidences.append(conf)
+
+    return bboxes, confidences
+
+# Mengambil crop wajah (RGB 160x160) dari gambar untuk setiap bounding box
+def crop_faces(image, bboxes):
+    face_crops = []
+    for bbox in bboxes:
+        face = utils.crop_face(image, bbox)
+        face_rgb = cv2.cvtColor(face, cv2.COLOR_BGR2RGB)
+        face_crops.append(cv2.resize(face_rgb, (160, 160)))
+    return face_crops
+
+# Tahap decode: membaca gambar dengan thread pool; urutan input dipertahankan lewat queue future
+# Queue terbatas membatasi jumlah gambar yang sudah / sedang di-decode tapi belum dideteksi
+# Dengan REDUCED_DECODE gambar besar di-decode pada skala 1/2, 1/4, atau 1/8 untuk deteksi
+# (sisi terpanjang tetap >= min_side; deteksi bertile memakai min_side yang lebih besar)
+def decode_stage(pipeline, image_paths, decoded_queue, workers, min_side=DETECT_IMAGE_SIZE):
+    reduced = reduced_decode_enabled()
+
+    def decode(image_path):
+        with pipeline.timed("decode"):
+            if reduced:
+                return decode_for_detection(image_path, min_side)
+            image = cv2.imread(image_path)
+            return image, (1.0, 1.0), image.shape[:2] if image is not None else None
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pipeline-decode") as executor:
+        for image_path in image_paths:
+            if not pipeline.put(decoded_queue, (image_path, executor.submit(decode, image_path))):
+                break
+    pipeline.put(decoded_queue, END_OF_STREAM)
+
+# Tahap deteksi: mengumpulkan gambar hasil decode menjadi batch YOLO lalu mengirim
+# (jumlah gambar, [(record, crop wajah)]) per batch ke tahap embedding
+# Ukuran batch diambil dari tuner sebelum setiap batch dan waktu batch dilaporkan kembali ke tuner
+# Gambar yang di-decode tereduksi: box dipetakan ke resolusi penuh, dan hanya gambar yang punya
+# wajah yang dibaca ulang pada resolusi penuh (paralel) untuk crop dan visualisasi
+def detect_stage(pipeline, yolo_model, decoded_queue, detected_queue, batch_tuner, confidence_threshold, keep_images):
+    batch_images = []
+    batch_items = []
+    full_reader = ThreadPoolExecutor(max_workers=decode_workers(), thread_name_prefix="pipeline-full-decode")
+
+    def full_resolution(image, image_path, scale):
+        if scale == (1.0, 1.0):
+            return image
+        with pipeline.timed("decode"):
+            return cv2.imread(image_path)
+
+    def run_batch():
+        start_time = time.perf_counter()
+        with pipeline.timed("detect"):
+            results = yolo_model.predict(batch_images)
+
+            faces = []
+            for image, (image_path, scale, full_shape), result in zip(batch_images, batch_items, results):
+                bboxes, confidences = detected_boxes(result, confidence_threshold)
+
+                # Gambar tanpa wajah yang lolos threshold dilewati (tidak pernah di-decode penuh)
+                if not bboxes:
+                    continue
+
+                if scale != (1.0, 1.0):
+                    bboxes = [np.array(scale_box(bbox, scale, full_shape), dtype=np.float32) for bbox in bboxes]
+                faces.append((image_path, full_shape, bboxes, confidences,
+                              full_reader.submit(full_resolution, image, image_path, scale)))
+
+            detected = []
+            for image_path, full_shape, bboxes, confidences, full_image in faces:
+                full_image = full_image.result()
+                if full_image is None:
+                    continue
+
+                detected.append(({
+                    "image_path": image_path,
+                    "image_name": os.path.basename(image_path),
+                    "image_shape": full_image.shape,
+                    "image": full_image if keep_images else None,
+                    "bboxes": bboxes,
+                    "confidences": confidences
+                }, crop_faces(full_image, bboxes)))
+
+        image_count = len(batch_images)
+        batch_tuner.observe(image_count, time.perf_counter() - start_time)
+        batch_images.clear()
+        batch_items.clear()
+        return pipeline.put(detected_queue, (image_count, detected))
+
+    try:
+        while not pipeline.stopped():
+            item = pipeline.get(decoded_queue)
+            if item is END_OF_STREAM:
+                break
+
+            image_path, decoded = item
+            image, scale, full_shape = decoded.result()
+            if image is None:
+                continue
+            batch_images.append(image)
+            batch_items.append((image_path, scale, full_shape))
+
+            if len(batch_images) >= batch_tuner.size and not run_batch():
+                return
+
+        if batch_images and not pipeline.stopped():
+            run_batch()
+        pipeline.put(detected_queue, END_OF_STREAM)
+    finally:
+        full_reader.shutdown(wait=True)
+
+# Path file ZIP hasil klasifikasi untuk sebuah output folder
+def zip_output_for(output_folder):
+    zip_output_folder = 'zip'
+    os.makedirs(zip_output_folder, exist_ok=True)
+    return os.path.join(zip_output_folder, os.path.basename(output_folder) + ".zip")
+
 # Fungsi utama untuk mengklasifikasikan wajah dari folder input
-def classify_faces(input_folder, output_folder=None, confidence_threshold=0.6, batch_size=5):
+# match_scope="batch" mencocokkan wajah per batch YOLO, "job" menunda pencocokan sampai semua gambar selesai di-embed
+# Crop wajah dikumpulkan lintas gambar ke batch FaceNet berukuran tetap (embed_batch_size / EMBED_BATCH_SIZE)
+# batch_size / embed_batch_size None: mulai dari CLASSIFY_BATCH_SIZE / EMBED_BATCH_SIZE lalu disesuaikan otomatis
+# selama job (BATCH_TUNING, batas memori CLASSIFY_MEMORY_LIMIT_MB); nilai eksplisit memakai ukuran tetap
+# image_files membatasi gambar yang diproses (shard dari sharded_classify); make_zip=False melewati pembuatan ZIP
+def classify_faces(input_folder, output_folder=None, confidence_threshold=0.6, batch_size=None, match_scope="batch",
+                   embed_batch_size=None, image_files=None, make_zip=True):
     # Reset flag pembatalan setiap kali memulai klasifikasi baru
     reset_cancel_flag()
     
@@ -66,13 +253,34 @@ def classify_faces(input_folder, output_folder=None, confidence_threshold=0.6, b
     print(f"Starting classification process at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     start_time = time.time()
     
+    # Gunakan nama folder input sebagai default output folder jika tidak diberikan
+    # (sebelum try agar pembersihan saat error tidak menerima None)
+    if output_folder is None:
+        output_folder = "(Classified) " + os.path.basename(input_folder)
+    
     try:
-        # Muat embedding paling baru (dengan deteksi perubahan file otomatis)
-        known_embeddings = load_embeddings()
+        # Ambil galeri dari cache proses; hanya dibangun ulang jika file embeddings berubah
+        # Indeks ANN / prefilter centroid sudah terpasang sesuai MATCH_MODE (exact sebagai fallback)
+        gallery = get_gallery_cache("face_embeddings.pkl").get()
         
-        # Gunakan nama folder input sebagai default output folder jika tidak diberikan
-        if output_folder is None:
-            output_folder = "(Classified) " + os.path.basename(input_folder)
+        # Model dimuat sekali per proses oleh registry dan dipakai bersama dengan halaman admin
+        yolo_model = get_yolo_model()
+        embedder = get_face_embedder()
+
+        # DETECTOR_CASCADE: detektor kecil lebih dulu, yolov8m hanya untuk gambar yang dieskalasi
+        # Statistik cascade dibuat per job
+        cascade = None
+        if cascade_enabled():
+            cascade = DetectorCascade(get_yolo_model(cascade_weights()), yolo_model, confidence_threshold)
+            yolo_model = cascade
+
+        # TILED_DETECTION: gambar besar dideteksi per tile yang tumpang tindih (wajah kecil di foto grup)
+        tiler = None
+        decode_min_side = DETECT_IMAGE_SIZE
+        if tiled_detection_enabled():
+            tiler = TiledDetector(yolo_model)
+            yolo_model = tiler
+            decode_min_side = tiler.min_image_side
         
         unknown_folder = os.path.join(output_folder, "UNKNOWN")
         visualized_folder = os.path.join(output_folder, "VISUALIZED")
@@ -90,121 +298,74 @@ def classify_faces(input_folder, output_folder=None, confidence_threshold=0.6, b
         utils.clear_folder(labels_folder)
 
         # Ambil semua file gambar dari folder input
-        image_files = [f for f in os.listdir(input_folder) if f.lower().endswith((".jpg", ".png", ".jpeg"))]
-        batch_range = range(0, len(image_files), batch_size)
-
-        # Proses gambar dalam batch
-        for i in tqdm(batch_range, desc="🔄 Processing Batches"):
-            # Cek apakah proses dibatalkan
-            if processing_cancelled.is_set():
-                # Bersihkan folder output jika proses dibatalkan
-                if os.path.exists(output_folder):
-                    shutil.rmtree(output_folder)
-                return None, None, None
-                
-            batch_files = image_files[i:i+batch_size]
-            batch_images = []
-            original_images = []
-            paths = []
-
-            # Membaca gambar batch
-            for image_name in batch_files:
-                if processing_cancelled.is_set():
-                    break
-                    
-                image_path = os.path.join(input_folder, image_name)
-                image = cv2.imread(image_path)
-                if image is None:
-                    continue
-                batch_images.append(image)
-                original_images.append(image.copy())
-                paths.append(image_path)
-
-            if not batch_images or processing_cancelled.is_set():
-                continue
-
-            # Deteksi wajah dengan YOLO
-            results = yolo_model.predict(batch_images)
-
-            # Proses hasil deteksi satu per satu
-            for j in tqdm(range(len(results)), desc=f"🔍 Batch {i//batch_size + 1}", leave=False):
-                if processing_cancelled.is_set():
-                    break
-                    
-                result = results[j]
-                image = batch_images[j]
-                original_image = original_images[j]
-                image_name = os.path.basename(paths[j])
-                image_path = paths[j]
-
-                if not result or not result.boxes:
-                    # Tidak ada wajah terdeteksi, skip gambar ini
-                    continue
-
-                bboxes = []
-                confidences = []
-                face_crops = []
-                coords = []
-                identified_faces = False
-
-                # Proses setiap bounding box hasil deteksi
-                for box in result.boxes:
-                    if processing_cancelled.is_set():
+        if image_files is None:
+            image_files = [f for f in os.listdir(input_folder) if f.lower().endswith((".jpg", ".png", ".jpeg"))]
+        image_paths = [os.path.join(input_folder, image_name) for image_name in image_files]
+
+        # Ukuran batch YOLO dan FaceNet disesuaikan dari throughput dan RSS yang terukur
+        tuning = batch_tuning_enabled()
+        memory_limit = memory_limit_bytes()
+        detect_tuner = BatchSizeTuner("yolo", batch_size or classify_batch_size(), max_size=64,
+                                      memory_limit=memory_limit, enabled=tuning and batch_size is None)
+        embed_tuner = BatchSizeTuner("facenet", embed_batch_size or face_batching.embed_batch_size(), max_size=256,
+                                     memory_limit=memory_limit, enabled=tuning and embed_batch_size is None)
+
+        # Gambar yang wajahnya sudah di-embed tapi belum dicocokkan dengan galeri
+        pending_images = []
+        
+        # Crop wajah dari banyak gambar mengisi batch FaceNet berukuran tetap; batch sisa di-flush
+        # di akhir setiap batch YOLO (match_scope="batch") atau di akhir job (match_scope="job")
+        embedding_batcher = FaceEmbeddingBatcher(lambda: embedder, tuner=embed_tuner)
+        
+        # Gambar yang seluruh wajahnya sudah di-embed siap dicocokkan
+        def collect_embedded_images(completed):
+            for record, embeddings in completed:
+                record["embeddings"] = np.asarray(embeddings)
+                pending_images.append(record)
+
+        # Pipeline bertahap: decode (thread pool) -> deteksi YOLO (thread) -> embedding + pencocokan
+        # (thread ini) -> penulisan hasil (pool write-behind), dihubungkan queue terbatas
+        pipeline = StagedPipeline(processing_cancelled)
+        decoded_queue = queue.Queue(maxsize=queue_batches() * detect_tuner.size)
+        detected_queue = queue.Queue(maxsize=queue_batches())
+        pipeline.start_stage("decode", decode_stage, pipeline, image_paths, decoded_queue, decode_workers(),
+                             decode_min_side)
+        pipeline.start_stage("detect", detect_stage, pipeline, yolo_model, decoded_queue, detected_queue,
+                             detect_tuner, confidence_threshold, match_scope == "batch")
+
+        try:
+            with tqdm(total=len(image_files), desc="🔄 Processing Images") as progress:
+                while True:
+                    item = pipeline.get(detected_queue)
+                    if item is END_OF_STREAM:
                         break
-                        
-                    bbox = box.xyxy.cpu().numpy()[0]
-                    conf = box.conf.cpu().numpy()[0]
-
-                    if conf < confidence_threshold:
-                        continue
-
-                    face = utils.crop_face(image, bbox)
-                    face_rgb = cv2.cvtColor(face, cv2.COLOR_BGR2RGB)
-                    face_resized = cv2.resize(face_rgb, (160, 160))
-                    face_crops.append(face_resized)
-                    bboxes.append(bbox)
-                    confidences.append(conf)
-                    coords.append(bbox)
-
-                if processing_cancelled.is_set():
-                    continue
-
-                # Kalau ada wajah yang terdeteksi dan lolos threshold, lakukan ekstraksi embedding
-                if face_crops:
-                    embeddings = embedder.embeddings(face_crops)
-
-                    for k, face_embedding in enumerate(embeddings):
-                        if processing_cancelled.is_set():
-                            break
-                            
-                        bbox = coords[k]
-                        match = utils.find_match(face_embedding, known_embeddings)
-
-                        if match:
-                            label = match
-                            person_folder = os.path.join(output_folder, match)
-                            identified_faces = True
-                        else:
-                            label = "Unknown"
-                            person_folder = unknown_folder
-
-                        os.makedirs(person_folder, exist_ok=True)
-
-                        if match:
-                            shutil.copy(image_path, person_folder)
-
-                        # Gambar bounding box di gambar asli
-                        utils.draw_bounding_box(original_image, bbox, label)
-
-                    # Simpan gambar hasil visualisasi jika ada wajah yang teridentifikasi
-                    if identified_faces:
-                        visualized_path = os.path.join(visualized_folder, image_name)
-                        cv2.imwrite(visualized_path, original_image)
-                    else:
-                        shutil.copy(image_path, unknown_folder)
-
-                    # Simpan anotasi bounding box ke format YOLO
-                    utils.save_yolo_annotation(labels_folder, image_name, image.shape, bboxes, confidences)
+                    image_count, detected = item
+
+                    # Kalau ada wajah yang terdeteksi dan lolos threshold, antrikan crop-nya ke batch FaceNet
+                    # Pencocokan ditunda agar seluruh wajah dicocokkan sekaligus
+                    with pipeline.timed("embed"):
+                        for record, face_crops in detected:
+                            collect_embedded_images(embedding_batcher.add(record, face_crops))
+                        if match_scope == "batch":
+                            collect_embedded_images(embedding_batcher.flush())
+
+                    # Cocokkan semua wajah dalam batch ini dengan satu panggilan galeri
+                    if match_scope == "batch":
+                        match_pending_images(pending_images, gallery, output_folder, pipeline)
+                        pending_images.clear()
+                    progress.update(image_count)
+
+            # Embed sisa crop lalu cocokkan semua wajah dari seluruh job dengan satu panggilan galeri
+            if not pipeline.stopped():
+                with pipeline.timed("embed"):
+                    collect_embedded_images(embedding_batcher.flush())
+                match_pending_images(pending_images, gallery, output_folder, pipeline)
+        except BaseException:
+            pipeline.close(abort=True)
+            raise
+
+        # Tunggu semua tahap dan penulisan selesai (error dari tahap lain dilempar ulang di sini)
+        pipeline.close()
 
         if processing_cancelled.is_set():
             # Bersihkan folder output jika proses dibatalkan
@@ -213,13 +374,10 @@ def classify_faces(input_folder, output_folder=None, confidence_threshold=0.6, b
             return None, None, None
 
         # Setelah selesai, buat file ZIP dari output folder
-        zip_output_folder = 'zip'
-        os.makedirs(zip_output_folder, exist_ok=True)
-        
-        output_folder_basename = os.path.basename(output_folder)
-        zip_output_path = os.path.join(zip_output_folder, output_folder_basename + ".zip")
-        
-        utils.zip_folder(output_folder, zip_output_path)
+        zip_output_path = None
+        if make_zip:
+            zip_output_path = zip_output_for(output_folder)
+            utils.zip_folder(output_folder, zip_output_path)
 
         # Hitung total waktu pemrosesan
         end_time = time.time()
@@ -232,6 +390,16 @@ def classify_faces(input_folder, output_folder=None, confidence_threshold=0.6, b
         print(f"Input folder: {input_folder}")
         print(f"Output folder: {output_folder}")
         print(f"Total images processed: {len(image_files)}")
+        print(embedding_batcher.summary())
+        print(embedder.summary())
+        if cascade is not None:
+            print(cascade.summary())
+        if tiler is not None:
+            print(tiler.summary())
+        print(f"Batch sizes: {detect_tuner.summary()}; {embed_tuner.summary()}")
+        if tuning:
+            print(f"  Pin with CLASSIFY_BATCH_SIZE={detect_tuner.size} EMBED_BATCH_SIZE={embed_tuner.size} BATCH_TUNING=false")
+        print(pipeline.summary())
         print(f"Processing time: {processing_time:.2f} seconds")
         print("=" * 50)
         print(f"Classification completed at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -247,6 +415,6 @@ def classify_faces(input_folder, output_folder=None, confidence_threshold=0.6, b
         print(f"Processing time before error: {processing_time:.2f} seconds")
         
         # Bersihkan folder output jika terjadi error
-        if os.path.exists(output_folder):
+        if output_folder and os.path.exists(output_folder):
             shutil.rmtree(output_folder)
         return None, None, None
\ No newline at end of file
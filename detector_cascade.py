@@ -0,0 +1,108 @@
+import os
+import time
+
+from env_settings import env_float, env_flag
+
+# Cascade detektor untuk klasifikasi: detektor kecil (mis. YOLOv8n-face) dijalankan lebih dulu untuk
+# semua gambar; hanya gambar dengan deteksi yang meragukan (confidence dekat ambang batas) atau wajah
+# sangat kecil yang dideteksi ulang dengan yolov8m-face. Foto potret biasa tidak pernah menyentuh model besar.
+DEFAULT_CASCADE_WEIGHTS = "yolov8n-face.pt"
+DEFAULT_CASCADE_MARGIN = 0.15
+DEFAULT_CASCADE_MIN_FACE = 0.03
+
+# Membaca dari environment apakah klasifikasi memakai cascade detektor
+def cascade_enabled():
+    return env_flag("DETECTOR_CASCADE", False)
+
+# Bobot detektor kecil untuk tahap pertama cascade
+def cascade_weights():
+    return os.environ.get("CASCADE_DETECTOR_WEIGHTS", DEFAULT_CASCADE_WEIGHTS)
+
+# Deteksi dengan confidence dalam ambang batas ± margin ini dianggap meragukan
+def cascade_margin():
+    return env_float("CASCADE_CONFIDENCE_MARGIN", DEFAULT_CASCADE_MARGIN)
+
+# Wajah dengan sisi terpendek di bawah fraksi sisi terpanjang gambar ini dianggap sangat kecil
+def cascade_min_face():
+    return env_float("CASCADE_MIN_FACE_FRACTION", DEFAULT_CASCADE_MIN_FACE)
+
+class DetectorCascade:
+    """Detektor dua tahap dengan antarmuka predict() seperti YOLO.
+
+    Hasil detektor kecil dipakai apa adanya kecuali gambar perlu dieskalasi; gambar yang
+    dieskalasi dalam satu batch dideteksi ulang bersama dengan detektor besar dalam satu panggilan.
+    Gambar tanpa deteksi di atas threshold - margin tidak dieskalasi.
+    """
+
+    def __init__(self, fast_detector, full_detector, confidence_threshold, margin=None, min_face=None):
+        self.fast_detector = fast_detector
+        self.full_detector = full_detector
+        self.confidence_threshold = confidence_threshold
+        self.margin = cascade_margin() if margin is None else margin
+        self.min_face = cascade_min_face() if min_face is None else min_face
+        self.images = 0
+        self.escalated = 0
+        self.reasons = {"borderline": 0, "small_face": 0}
+        self.fast_seconds = 0.0
+        self.full_seconds = 0.0
+
+    def escalation_reason(self, result, image_shape):
+        if not result or not result.boxes:
+            return None
+
+        # Hanya box di pita threshold ± margin yang meragukan; box jauh di bawah threshold (noise
+        # latar dari conf default detektor) diabaikan dan tidak memicu eskalasi
+        low = self.confidence_threshold - self.margin
+        high = self.confidence_threshold + self.margin
+        min_side = self.min_face * max(image_shape[:2])
+        reason = None
+        for box in result.boxes:
+            confidence = box.conf.cpu().numpy()[0]
+            if confidence < low:
+                continue
+            if confidence < high:
+                return "borderline"
+            x1, y1, x2, y2 = box.xyxy.cpu().numpy()[0]
+            if min(x2 - x1, y2 - y1) < min_side:
+                reason = "small_face"
+        return reason
+
+    def predict(self, images, **kwargs):
+        start_time = time.perf_counter()
+        results = list(self.fast_detector.predict(images, **kwargs))
+        self.fast_seconds += time.perf_counter() - start_time
+        self.images += len(images)
+
+        escalate = []
+        for k, (image, result) in enumerate(zip(images, results)):
+            reason = self.escalation_reason(result, image.shape)
+            if reason:
+                self.reasons[reason] += 1
+                escalate.append(k)
+
+        if escalate:
+            start_time = time.perf_counter()
+            full_results = self.full_detector.predict([images[k] for k in escalate], **kwargs)
+            self.full_seconds += time.perf_counter() - start_time
+            for k, result in zip(escalate, full_results):
+                results[k] = result
+            self.escalated += len(escalate)
+        return results
+
+    def __call__(self, images, **kwargs):
+        return self.predict(images, **kwargs)
+
+    def stats(self):
+        return {
+            "images": self.images,
+            "escalated": self.escalated,
+            "reasons": dict(self.reasons),
+            "fast_seconds": round(self.fast_seconds, 3),
+            "full_seconds": round(self.full_seconds, 3)
+        }
+
+    def summary(self):
+        rate = self.escalated / self.images if self.images else 0
+        return (f"Detector cascade: {self.escalated}/{self.images} images escalated ({rate:.0%}; "
+                f"borderline {self.reasons['borderline']}, small face {self.reasons['small_face']}), "
+                f"fast {self.fast_seconds:.2f}s, full {self.full_seconds:.2f}s")
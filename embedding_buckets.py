@@ -0,0 +1,111 @@
+import time
+
+import numpy as np
+
+from env_settings import env_int_list
+
+# Shape bucketing untuk FaceNet: jumlah crop per panggilan embeddings() berbeda-beda (1 wajah di satu
+# gambar, 7 di gambar lain, sisa batch terakhir), dan setiap panjang batch baru memicu trace graph serta
+# alokasi buffer baru di TensorFlow / onnxruntime. Batch dipad ke ukuran bucket tetap dengan salinan
+# crop terakhir, lalu hasil padding dibuang. Batch lebih besar dari bucket terbesar dipecah.
+DEFAULT_EMBED_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# Membaca ukuran bucket dari environment ("1,2,4,8"); kosong / off = tanpa padding
+def embed_buckets():
+    return sorted({size for size in env_int_list("EMBED_BUCKETS", DEFAULT_EMBED_BUCKETS) if size > 0})
+
+# Bucket terkecil yang muat `count` wajah (None jika lebih besar dari bucket terbesar)
+def bucket_for(count, buckets):
+    for size in buckets:
+        if size >= count:
+            return size
+    return None
+
+# Menambah salinan crop terakhir sampai panjang batch sama dengan bucket
+def pad_faces(faces, size):
+    faces = np.asarray(faces)
+    if len(faces) >= size:
+        return faces
+    return np.concatenate([faces, np.repeat(faces[-1:], size - len(faces), axis=0)])
+
+class BucketedEmbedder:
+    """Pembungkus embedder dengan antarmuka embeddings() yang memakai ukuran batch dari bucket tetap.
+
+    Setiap panggilan model dicatat per ukuran batch yang dikirim: panggilan pertama per ukuran
+    (trace graph / alokasi) dipisahkan dari latensi steady-state. Tanpa bucket, batch dikirim
+    apa adanya dan hanya waktunya yang dicatat.
+    """
+
+    def __init__(self, embedder, buckets=None):
+        self.embedder = embedder
+        self.buckets = embed_buckets() if buckets is None else sorted(buckets)
+        self.shapes = {}   # ukuran batch dikirim -> {"calls", "faces", "first_seconds", ...}
+        self.faces = 0
+        self.padded_faces = 0
+
+    def __getattr__(self, attr_name):
+        return getattr(self.embedder, attr_name)
+
+    def _call(self, faces, count):
+        start_time = time.perf_counter()
+        embeddings = np.asarray(self.embedder.embeddings(faces))[:count]
+        elapsed = time.perf_counter() - start_time
+
+        shape = self.shapes.get(len(faces))
+        if shape is None:
+            self.shapes[len(faces)] = {"calls": 1, "faces": count, "first_seconds": elapsed,
+                                     "steady_faces": 0, "steady_seconds": 0.0}
+        else:
+            shape["calls"] += 1
+            shape["faces"] += count
+            shape["steady_faces"] += count
+            shape["steady_seconds"] += elapsed
+        self.faces += count
+        self.padded_faces += len(faces) - count
+        return embeddings
+
+    def embeddings(self, images):
+        if not len(images):
+            return self.embedder.embeddings(images)
+        if not self.buckets:
+            return self._call(images, len(images))
+
+        largest = self.buckets[-1]
+        embeddings = []
+        for start in range(0, len(images), largest):
+            chunk = images[start:start + largest]
+            embeddings.append(self._call(pad_faces(chunk, bucket_for(len(chunk), self.buckets)), len(chunk)))
+        return np.concatenate(embeddings)
+
+    def warm_up(self, face, max_size=None):
+        """Menjalankan satu batch dummy per bucket (hingga max_size) agar job pertama tidak men-trace"""
+        sizes = [size for size in self.buckets if max_size is None or size <= max_size] or [1]
+        for size in sizes:
+            self._call(pad_faces([face], size), size)
+        return sizes
+
+    def stats(self):
+        """Latensi per ukuran batch yang dikirim: {ukuran: {...}} (steady = tanpa panggilan pertama)"""
+        stats = {}
+        for size, shape in sorted(self.shapes.items()):
+            steady_calls = shape["calls"] - 1
+            stats[size] = {
+                "calls": shape["calls"],
+                "faces": shape["faces"],
+                "first_ms": round(1000 * shape["first_seconds"], 2),
+                "steady_ms_per_call": round(1000 * shape["steady_seconds"] / steady_calls, 2) if steady_calls else None,
+                # Per wajah asli: padding ikut dibayar oleh wajah di batch itu
+                "steady_ms_per_face": (round(1000 * shape["steady_seconds"] / shape["steady_faces"], 3)
+                                       if shape["steady_faces"] else None)
+            }
+        return stats
+
+    def summary(self):
+        calls = sum(shape["calls"] for shape in self.shapes.values())
+        first_seconds = sum(shape["first_seconds"] for shape in self.shapes.values())
+        steady = ", ".join(f"{size}: {shape['steady_ms_per_call']:.1f} ms"
+                           for size, shape in self.stats().items() if shape["steady_ms_per_call"] is not None)
+        buckets = ",".join(map(str, self.buckets)) if self.buckets else "off"
+        return (f"FaceNet shapes: {calls} calls in {len(self.shapes)} batch shapes (buckets {buckets}), "
+                f"{self.padded_faces} padded faces for {self.faces} faces, first calls {first_seconds:.2f}s; "
+                f"steady latency per call: {steady or '-'}")
@@ -0,0 +1,268 @@
+import os
+import json
+import hashlib
+import numpy as np
+from inference_backends import inference_backend, model_precision, NATIVE_BACKEND
+from env_settings import env_float
+
+# Cache embeddings per isi gambar: kunci = hash isi gambar + parameter detektor/embedder.
+# Rename folder, memindah foto antar orang, atau menambahkan ulang foto yang sama
+# tidak memerlukan panggilan YOLO / FaceNet sama sekali.
+DEFAULT_CACHE_DIR = "embedding_cache"
+DEFAULT_CACHE_MAX_MB = 512
+DEFAULT_DETECTOR_WEIGHTS = "yolov8m-face.pt"
+FACE_SIZE = 160
+
+# Membaca direktori cache dari environment; string kosong mematikan cache
+def embedding_cache_dir():
+    return os.environ.get("EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR)
+
+# Ukuran maksimum direktori cache embeddings dalam byte; 0 = tanpa batas
+def embedding_cache_max_bytes():
+    return int(env_float("EMBEDDING_CACHE_MAX_MB", DEFAULT_CACHE_MAX_MB, minimum=0.0) * 1e6)
+
+# Entri yang dibaca disentuh (mtime) agar pemangkasan membuang entri yang paling lama tidak dipakai
+def touch_entry(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def prune_cache_dir(cache_dir, max_bytes):
+    """Menghapus entri yang paling lama tidak dipakai hingga ukuran cache_dir <= max_bytes
+
+    Mencakup semua namespace parameter di bawah cache_dir, sehingga entri detektor / threshold
+    lama yang tidak dipakai lagi ikut terbuang. Mengembalikan (jumlah file, byte) yang dihapus.
+    """
+    if max_bytes <= 0 or not os.path.isdir(cache_dir):
+        return 0, 0
+
+    entries = []
+    total_bytes = 0
+    for root, _, filenames in os.walk(cache_dir):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_bytes += stat.st_size
+
+    removed, removed_bytes = 0, 0
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total_bytes -= size
+        removed += 1
+        removed_bytes += size
+    return removed, removed_bytes
+
+# Parameter yang menentukan hasil embedding sebuah gambar
+def embedding_params(confidence_threshold, detector_weights=DEFAULT_DETECTOR_WEIGHTS, embedder="keras_facenet"):
+    params = {
+        "detector": os.path.basename(detector_weights),
+        "confidence": round(float(confidence_threshold), 4),
+        "face_size": FACE_SIZE,
+        "embedder": embedder
+    }
+    # Backend ONNX / OpenVINO (dan model INT8) menghasilkan embedding yang sedikit berbeda: namespace cache sendiri
+    backend = inference_backend()
+    if backend != NATIVE_BACKEND:
+        params["backend"] = backend
+        if model_precision() != "fp32":
+            params["precision"] = model_precision()
+    # File bobot yang diganti menghasilkan namespace cache baru
+    if os.path.exists(detector_weights):
+        stat = os.stat(detector_weights)
+        params["detector_size"] = stat.st_size
+        params["detector_mtime_ns"] = stat.st_mtime_ns
+    return params
+
+def params_key(params):
+    return hashlib.md5(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+class EmbeddingCache:
+    """Cache embeddings di disk, satu file .npz per (parameter, hash isi gambar).
+
+    Layout: <cache_dir>/<params_key>/<hex[:2]>/<hash>.npz berisi "embeddings"
+    (wajah x dim, boleh 0 baris jika tidak ada wajah) dan "confidences".
+    File ditulis ke .tmp lalu di-rename sehingga entri selalu utuh. Ukuran direktori dibatasi
+    EMBEDDING_CACHE_MAX_MB lewat prune_caches(): entri yang paling lama tidak dibaca dibuang dulu.
+    """
+
+    def __init__(self, cache_dir, params):
+        self.params = params
+        self.path = os.path.join(cache_dir, params_key(params))
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_confidence(cls, confidence_threshold, detector_weights=DEFAULT_DETECTOR_WEIGHTS):
+        """Cache untuk parameter deteksi ini, None jika cache dimatikan"""
+        cache_dir = embedding_cache_dir()
+        if not cache_dir:
+            return None
+        return cls(cache_dir, embedding_params(confidence_threshold, detector_weights))
+
+    def entry_path(self, image_hash):
+        digest = image_hash.rsplit("-", 1)[-1]  # "sha256-<hex>" atau md5 hex lama
+        return os.path.join(self.path, digest[:2], image_hash + ".npz")
+
+    def get(self, image_hash):
+        """Mengembalikan (embeddings, confidences) untuk hash ini, None jika belum ada"""
+        path = self.entry_path(image_hash)
+        try:
+            with np.load(path) as data:
+                result = ([row for row in data["embeddings"]], [float(c) for c in data["confidences"]])
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        touch_entry(path)
+        self.hits += 1
+        return result
+
+    def put(self, image_hash, embeddings, confidences=()):
+        path = self.entry_path(image_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        matrix = np.stack(embeddings).astype(np.float32) if len(embeddings) else np.zeros((0, 0), dtype=np.float32)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, embeddings=matrix, confidences=np.asarray(confidences, dtype=np.float64))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Gagal menulis cache embedding {path}: {e}")
+
+    def summary(self):
+        return f"Embedding cache: {self.hits} hit, {self.misses} miss ({self.path})"
+
+# --- Cache deteksi mentah ---
+# Semua box dan skor YOLO per isi gambar disimpan hingga batas bawah (DETECTION_FLOOR), bersama embedding
+# wajah yang sudah dihitung atau crop 160x160 untuk wajah yang belum. Memproses ulang dengan confidence
+# threshold lain cukup memfilter data ini; hanya wajah yang baru lolos threshold yang perlu di-embed.
+DEFAULT_DETECTION_CACHE_DIR = "detection_cache"
+DEFAULT_DETECTION_FLOOR = 0.25
+DEFAULT_DETECTION_CACHE_MAX_MB = 2048
+
+# Membaca direktori cache deteksi dari environment; string kosong mematikan cache
+def detection_cache_dir():
+    return os.environ.get("DETECTION_CACHE_DIR", DEFAULT_DETECTION_CACHE_DIR)
+
+# Ukuran maksimum direktori cache deteksi dalam byte (crop wajah membuatnya jauh lebih besar); 0 = tanpa batas
+def detection_cache_max_bytes():
+    return int(env_float("DETECTION_CACHE_MAX_MB", DEFAULT_DETECTION_CACHE_MAX_MB, minimum=0.0) * 1e6)
+
+# Confidence terendah yang disimpan di cache deteksi
+def detection_floor():
+    return env_float("DETECTION_FLOOR", DEFAULT_DETECTION_FLOOR)
+
+class DetectionEntry:
+    """Deteksi mentah satu gambar: box, skor, dan embedding (atau crop) per box"""
+
+    def __init__(self, floor, boxes, confidences, embeddings=None, crops=None):
+        self.floor = float(floor)
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.confidences = np.asarray(confidences, dtype=np.float32).reshape(-1)
+        self.embeddings = embeddings or {}  # baris -> embedding
+        self.crops = crops or {}            # baris -> crop RGB 160x160, hanya untuk baris tanpa embedding
+
+    def covers(self, confidence_threshold):
+        return self.floor <= confidence_threshold
+
+    def rows_above(self, confidence_threshold):
+        return [row for row, conf in enumerate(self.confidences) if conf >= confidence_threshold]
+
+    def missing_rows(self, rows):
+        return [row for row in rows if row not in self.embeddings]
+
+    def set_embeddings(self, rows, embeddings):
+        for row, embedding in zip(rows, embeddings):
+            self.embeddings[row] = np.asarray(embedding, dtype=np.float32)
+            self.crops.pop(row, None)
+
+class DetectionCache:
+    """Cache deteksi mentah di disk, satu file .npz per (detektor, hash isi gambar).
+
+    Layout: <cache_dir>/<params_key>/<hex[:2]>/<hash>.npz berisi "floor", "boxes", "confidences",
+    "embedded_rows" + "embeddings", dan "crop_rows" + "crops". Ditulis ke .tmp lalu di-rename.
+    Ukuran direktori dibatasi DETECTION_CACHE_MAX_MB lewat prune_caches() (LRU seperti EmbeddingCache).
+    """
+
+    def __init__(self, cache_dir, params):
+        self.params = params
+        self.path = os.path.join(cache_dir, params_key(params))
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_detector(cls, detector_weights=DEFAULT_DETECTOR_WEIGHTS):
+        """Cache untuk detektor / embedder ini, None jika cache dimatikan"""
+        cache_dir = detection_cache_dir()
+        if not cache_dir:
+            return None
+        params = embedding_params(0, detector_weights)
+        params.pop("confidence")
+        params["kind"] = "raw_detections"
+        return cls(cache_dir, params)
+
+    def entry_path(self, image_hash):
+        digest = image_hash.rsplit("-", 1)[-1]
+        return os.path.join(self.path, digest[:2], image_hash + ".npz")
+
+    def get(self, image_hash, confidence_threshold):
+        """DetectionEntry untuk hash ini jika floor-nya mencakup threshold, None jika tidak ada"""
+        try:
+            with np.load(self.entry_path(image_hash)) as data:
+                embedded_rows = [int(row) for row in data["embedded_rows"]]
+                crop_rows = [int(row) for row in data["crop_rows"]]
+                entry = DetectionEntry(float(data["floor"]), data["boxes"], data["confidences"],
+                                       dict(zip(embedded_rows, data["embeddings"])),
+                                       dict(zip(crop_rows, data["crops"])))
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+
+        if not entry.covers(confidence_threshold):
+            self.misses += 1
+            return None
+        touch_entry(self.entry_path(image_hash))
+        self.hits += 1
+        return entry
+
+    def put(self, image_hash, entry):
+        path = self.entry_path(image_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        embedded_rows = sorted(entry.embeddings)
+        crop_rows = sorted(entry.crops)
+        embeddings = (np.stack([entry.embeddings[row] for row in embedded_rows]) if embedded_rows
+                      else np.zeros((0, 0), dtype=np.float32))
+        crops = (np.stack([entry.crops[row] for row in crop_rows]) if crop_rows
+                 else np.zeros((0, FACE_SIZE, FACE_SIZE, 3), dtype=np.uint8))
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, floor=np.float64(entry.floor), boxes=entry.boxes, confidences=entry.confidences,
+                         embedded_rows=np.asarray(embedded_rows, dtype=np.int32), embeddings=embeddings,
+                         crop_rows=np.asarray(crop_rows, dtype=np.int32), crops=crops)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Gagal menulis cache deteksi {path}: {e}")
+
+    def summary(self):
+        return f"Detection cache: {self.hits} hit, {self.misses} miss ({self.path})"
+
+# Memangkas cache per isi gambar ke batas ukurannya; dipanggil di akhir update / reprocess / rebuild
+def prune_caches():
+    limits = [(embedding_cache_dir(), embedding_cache_max_bytes()),
+              (detection_cache_dir(), detection_cache_max_bytes())]
+    for cache_dir, max_bytes in limits:
+        if not cache_dir:
+            continue
+        removed, removed_bytes = prune_cache_dir(cache_dir, max_bytes)
+        if removed:
+            print(f"Cache {cache_dir}: {removed} entri lama dihapus ({removed_bytes / 1e6:.1f} MB)")
@@ -0,0 +1,85 @@
+import os
+import json
+import struct
+import zlib
+import numpy as np
+
+# Log segmen append-only untuk perubahan embeddings per gambar.
+#
+# Setiap record: [panjang header JSON][panjang payload][crc32] lalu header JSON dan payload float32.
+# Header JSON: {"op": "put" | "delete" | "delete_person", "person": ..., "image": ..., "rows": n, "dim": d}
+# Record "put" mengganti seluruh embedding satu gambar; "delete" menghapus satu gambar; "delete_person"
+# menghapus satu orang beserta semua gambarnya.
+#
+# Record hanya dianggap ada jika lengkap dan crc-nya cocok, sehingga append yang terpotong karena crash
+# tidak pernah terbaca. Ekor yang rusak dipotong sebelum append berikutnya.
+
+RECORD_PREFIX = struct.Struct("<III")
+
+def encode_record(op, person, image=None, vectors=None):
+    payload = b""
+    header = {"op": op, "person": person, "image": image}
+    if vectors is not None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        header["rows"] = int(vectors.shape[0])
+        header["dim"] = int(vectors.shape[1]) if vectors.ndim == 2 else 0
+        payload = vectors.tobytes()
+
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    crc = zlib.crc32(payload, zlib.crc32(header_bytes))
+    return RECORD_PREFIX.pack(len(header_bytes), len(payload), crc) + header_bytes + payload
+
+def decode_records(data):
+    """Mengembalikan (records, panjang byte valid); berhenti di record pertama yang tidak lengkap atau rusak"""
+    records = []
+    offset = 0
+    while offset + RECORD_PREFIX.size <= len(data):
+        header_len, payload_len, crc = RECORD_PREFIX.unpack_from(data, offset)
+        start = offset + RECORD_PREFIX.size
+        end = start + header_len + payload_len
+        if end > len(data):
+            break
+        header_bytes = data[start:start + header_len]
+        payload = data[start + header_len:end]
+        if zlib.crc32(payload, zlib.crc32(header_bytes)) != crc:
+            break
+        try:
+            record = json.loads(header_bytes.decode("utf-8"))
+        except ValueError:
+            break
+
+        if record["op"] == "put":
+            record["vectors"] = np.frombuffer(payload, dtype=np.float32).reshape(record["rows"], record["dim"])
+        records.append(record)
+        offset = end
+    return records, offset
+
+def read_records(path):
+    if not os.path.exists(path):
+        return [], 0
+    with open(path, "rb") as f:
+        data = f.read()
+    return decode_records(data)
+
+# Menambahkan record ke segmen lalu fsync; ekor rusak dari crash sebelumnya dipotong dulu
+# valid_size: panjang byte valid yang sudah diketahui pemanggil (misal dari membuka store). Log hanya
+# dibaca ulang untuk mencari ekor valid jika ukuran file berbeda, sehingga append sebanding dengan record.
+def append_records(path, encoded_records, valid_size=None):
+    with open(path, "ab") as f:
+        size = f.tell()
+        if valid_size is None or size != valid_size:
+            _, valid_size = read_records(path)
+        if size != valid_size:
+            print(f"Warning: Memotong {size - valid_size} byte record tidak lengkap di {path}")
+            f.truncate(valid_size)
+            f.seek(valid_size)
+        for record in encoded_records:
+            f.write(record)
+        f.flush()
+        os.fsync(f.fileno())
+    return os.path.getsize(path)
+
+def create_segment(path):
+    with open(path, "wb") as f:
+        f.flush()
+        os.fsync(f.fileno())
@@ -0,0 +1,145 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+# Agar modul di root project bisa diimport saat skrip dijalankan langsung
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_store import load_embeddings
+from gallery import FaceGallery, normalize_rows, person_centroid, DEFAULT_MATCH_THRESHOLD
+from ann_index import IVFIndex, default_nlist
+
+# Membuat galeri sintetis dengan memperbanyak embedding asli + noise untuk mensimulasikan galeri besar
+def synthesize_embeddings(embeddings, target_persons, noise=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    source = [(name, vectors) for name, vectors in embeddings.items() if vectors]
+    synthetic = dict(embeddings)
+    copy_idx = 0
+
+    while len(synthetic) < target_persons:
+        name, vectors = source[copy_idx % len(source)]
+        # Geser seluruh embedding orang ini ke arah acak agar menjadi "orang" baru
+        offset = rng.normal(0, 0.6, size=vectors[0].shape).astype(np.float32)
+        synthetic[f"{name}__synthetic_{copy_idx}"] = [
+            (v + offset + rng.normal(0, noise, size=v.shape)).astype(np.float32) for v in vectors
+        ]
+        copy_idx += 1
+
+    return synthetic
+
+# Query uji: embedding galeri yang diberi noise (wajah dikenal) + vektor acak (wajah tidak dikenal)
+def build_queries(gallery, num_queries, noise=0.03, unknown_ratio=0.5, seed=1):
+    rng = np.random.default_rng(seed)
+    num_unknown = int(num_queries * unknown_ratio)
+    num_known = num_queries - num_unknown
+    rows = rng.choice(len(gallery), size=num_known, replace=num_known > len(gallery))
+    known = gallery.matrix[rows] + rng.normal(0, noise, size=(num_known, gallery.dim))
+    unknown = rng.normal(0, 1, size=(num_unknown, gallery.dim))
+    return normalize_rows(np.concatenate([known, unknown]).astype(np.float32))
+
+def time_search(search_fn, repeats):
+    timings = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = search_fn()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+# Mencetak satu baris laporan: latency dan kesepakatan hasil ANN terhadap exact
+def report_row(prefix, gallery, exact_rows, exact_scores, exact_time, ann_rows, ann_scores, ann_time, num_queries, threshold):
+    exact_matched = exact_scores > threshold
+
+    # recall@1: baris terbaik ANN sama dengan baris terbaik exact (hanya untuk query yang cocok)
+    if exact_matched.any():
+        recall = np.mean(ann_rows[exact_matched] == exact_rows[exact_matched])
+    else:
+        recall = float("nan")
+
+    # Kesepakatan keputusan akhir (nama orang atau Unknown) setelah threshold
+    exact_names = np.where(exact_matched, gallery.labels[exact_rows], -1)
+    ann_matched = (ann_rows >= 0) & (ann_scores > threshold)
+    ann_names = np.where(ann_matched, gallery.labels[np.maximum(ann_rows, 0)], -1)
+    agreement = np.mean(exact_names == ann_names)
+
+    print(f"{prefix} {ann_time * 1000:>10.2f} {ann_time / num_queries * 1e6:>9.1f} "
+          f"{exact_time / ann_time:>7.1f}x {recall:>9.4f} {agreement:>15.4f}")
+
+def run_report(embeddings_path, num_queries, nlist_values, nprobe_values, top_k_values, synthetic_persons, threshold, repeats):
+    embeddings = load_embeddings(embeddings_path)
+
+    if synthetic_persons:
+        embeddings = synthesize_embeddings(embeddings, synthetic_persons)
+
+    gallery = FaceGallery.from_embeddings(embeddings)
+    queries = build_queries(gallery, num_queries)
+
+    print("\n" + "=" * 80)
+    print("ANN INDEX RECALL VS LATENCY")
+    print("=" * 80)
+    print(f"Gallery: {len(gallery.names)} persons, {len(gallery)} embeddings, dim {gallery.dim}")
+    print(f"Queries: {len(queries)} (50% perturbed gallery faces, 50% random unknown faces)")
+    print(f"Match threshold: {threshold}")
+
+    (exact_rows, exact_scores), exact_time = time_search(lambda: gallery.best_matches(queries, exact=True), repeats)
+    print(f"Exact search: {exact_time * 1000:.2f} ms ({exact_time / len(queries) * 1e6:.1f} us/query)")
+
+    print("-" * 80)
+    print(f"{'nlist':>6} {'nprobe':>7} {'build s':>8} {'search ms':>10} {'us/query':>9} {'speedup':>8} {'recall@1':>9} {'decision agree':>15}")
+    print("-" * 80)
+
+    nlist_values = nlist_values or [default_nlist(len(gallery))]
+    for nlist in nlist_values:
+        build_start = time.perf_counter()
+        index = IVFIndex.build(gallery, nlist=nlist)
+        build_time = time.perf_counter() - build_start
+
+        for nprobe in nprobe_values:
+            if nprobe > index.nlist:
+                continue
+            (ann_rows, ann_scores), ann_time = time_search(lambda: index.search(gallery, queries, nprobe=nprobe), repeats)
+
+            report_row(f"{index.nlist:>6} {nprobe:>7} {build_time:>8.2f}", gallery, exact_rows, exact_scores, exact_time,
+                       ann_rows, ann_scores, ann_time, len(queries), threshold)
+
+    # Prefilter centroid per orang + rerank exact
+    print("-" * 80)
+    print(f"{'centroid top-k':>14} {'build s':>8} {'search ms':>10} {'us/query':>9} {'speedup':>8} {'recall@1':>9} {'decision agree':>15}")
+    print("-" * 80)
+
+    build_start = time.perf_counter()
+    centroids = np.stack([person_centroid(gallery.matrix[gallery.labels == label]) for label in range(len(gallery.names))])
+    build_time = time.perf_counter() - build_start
+
+    for top_k in top_k_values:
+        index = IVFIndex.from_person_centroids(gallery, centroids, top_k)
+        (ann_rows, ann_scores), ann_time = time_search(lambda: index.search(gallery, queries), repeats)
+        report_row(f"{top_k:>14} {build_time:>8.2f}", gallery, exact_rows, exact_scores, exact_time,
+                   ann_rows, ann_scores, ann_time, len(queries), threshold)
+
+    print("=" * 80)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Laporan recall vs latency indeks ANN dan prefilter centroid terhadap pencarian exact")
+    parser.add_argument("--embeddings", type=str, default="face_embeddings.pkl",
+                        help="Path ke file embeddings wajah (.pkl atau store columnar)")
+    parser.add_argument("--queries", type=int, default=2000,
+                        help="Jumlah query uji")
+    parser.add_argument("--nlist", type=int, nargs="*", default=[],
+                        help="Nilai nlist yang diuji (default: 4 * sqrt(jumlah embedding))")
+    parser.add_argument("--nprobe", type=int, nargs="*", default=[1, 2, 4, 8, 16, 32],
+                        help="Nilai nprobe yang diuji")
+    parser.add_argument("--centroid-top-k", type=int, nargs="*", default=[1, 3, 5, 10],
+                        help="Jumlah kandidat orang yang di-rerank pada mode centroid")
+    parser.add_argument("--synthetic-persons", type=int, default=0,
+                        help="Perbesar galeri secara sintetis hingga jumlah orang ini")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_MATCH_THRESHOLD,
+                        help="Ambang batas kecocokan wajah")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Jumlah pengulangan pengukuran (diambil waktu tercepat)")
+
+    args = parser.parse_args()
+    run_report(args.embeddings, args.queries, args.nlist, args.nprobe, args.centroid_top_k,
+               args.synthetic_persons, args.threshold, args.repeats)
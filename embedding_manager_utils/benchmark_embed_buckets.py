@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import numpy as np
+import cv2
+
+# Agar modul di root project bisa diimport saat skrip dijalankan langsung
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference_backends import DEFAULT_DETECTOR_WEIGHTS, load_detector, load_embedder
+from embedding_buckets import BucketedEmbedder, embed_buckets
+from face_batching import crop_faces
+from embedding_manager_utils.benchmark_inference_backends import list_sample_images, load_sample_images, run_detection
+
+# Crop wajah RGB per gambar: panggilan embeddings() per gambar seperti pemakaian asli (1 wajah, 7 wajah, ...)
+def faces_per_image(image_paths, weights, confidence_threshold):
+    images = load_sample_images(image_paths)
+    detections, _ = run_detection(load_detector(weights), images, 8, confidence_threshold)
+    groups = []
+    for image, (boxes, _) in zip(images, detections):
+        if len(boxes):
+            groups.append(crop_faces(cv2.cvtColor(image, cv2.COLOR_BGR2RGB), boxes))
+    return groups
+
+# Dijalankan di proses terpisah per mode agar graph / buffer yang sudah di-trace satu mode tidak terbawa
+def measure(mode, groups, passes):
+    buckets = embed_buckets() if mode == "bucketed" else []
+    embedder = BucketedEmbedder(load_embedder(), buckets)
+
+    calls = []  # (pass, jumlah wajah, detik)
+    for pass_index in range(passes):
+        for faces in groups:
+            start_time = time.perf_counter()
+            embedder.embeddings(faces)
+            calls.append((pass_index, len(faces), time.perf_counter() - start_time))
+
+    # Pass pertama termasuk trace graph per ukuran batch baru; pass berikutnya = steady state
+    cold = [(count, seconds) for pass_index, count, seconds in calls if pass_index == 0]
+    steady = [(count, seconds) for pass_index, count, seconds in calls if pass_index > 0] or cold
+    by_count = {}
+    for count, seconds in steady:
+        by_count.setdefault(count, []).append(seconds)
+
+    per_face_ms = [1000 * seconds / count for count, seconds in steady]
+    return {
+        "buckets": buckets,
+        "shapes": len(embedder.shapes),
+        "padded_faces": embedder.padded_faces,
+        "cold_seconds": sum(seconds for _, seconds in cold),
+        "cold_max_ms": 1000 * max(seconds for _, seconds in cold),
+        "steady_ms_per_face": 1000 * sum(seconds for _, seconds in steady) / sum(count for count, _ in steady),
+        "steady_p95_ms_per_face": float(np.percentile(per_face_ms, 95)),
+        "by_count": {count: {"calls": len(timings), "ms_per_call": 1000 * float(np.mean(timings)),
+                             "ms_per_face": 1000 * float(np.mean(timings)) / count}
+                     for count, timings in sorted(by_count.items())}
+    }
+
+def run_benchmark(input_folder, limit, weights, confidence_threshold, passes):
+    image_paths = list_sample_images(input_folder, limit)
+    if not image_paths:
+        print(f"Error: Tidak ada gambar di {input_folder}")
+        return
+
+    results = {}
+    for mode in ("unbucketed", "bucketed"):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--input", input_folder,
+                                 "--limit", str(limit), "--weights", weights, "--confidence", str(confidence_threshold),
+                                 "--passes", str(passes), "--measure", mode],
+                                capture_output=True, text=True, check=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+        if results[mode] is None:
+            print(f"Error: Tidak ada wajah terdeteksi di {input_folder}")
+            return
+
+    print("\n" + "=" * 78)
+    print("FACENET SHAPE BUCKETING: LATENCY PER CALL")
+    print("=" * 78)
+    print(f"Input: {input_folder} ({len(image_paths)} images), {passes} passes, "
+          f"buckets {','.join(map(str, results['bucketed']['buckets'])) or 'off'}")
+    print("-" * 78)
+    print(f"{'mode':>11} {'shapes':>7} {'padded':>7} {'cold s':>8} {'cold max ms':>12} "
+          f"{'ms/face':>8} {'p95 ms/face':>12}")
+    print("-" * 78)
+    for mode, result in results.items():
+        print(f"{mode:>11} {result['shapes']:>7} {result['padded_faces']:>7} {result['cold_seconds']:>8.2f} "
+              f"{result['cold_max_ms']:>12.1f} {result['steady_ms_per_face']:>8.2f} {result['steady_p95_ms_per_face']:>12.2f}")
+    print("-" * 78)
+    print("Steady-state latency by faces per image (ms/call, ms/face):")
+    print(f"{'faces':>6} {'calls':>6} {'unbucketed':>20} {'bucketed':>20}")
+    for count, unbucketed in results["unbucketed"]["by_count"].items():
+        bucketed = results["bucketed"]["by_count"].get(count)
+        if bucketed is None:
+            continue
+        print(f"{count:>6} {unbucketed['calls']:>6} "
+              f"{unbucketed['ms_per_call']:>10.1f} {unbucketed['ms_per_face']:>9.2f} "
+              f"{bucketed['ms_per_call']:>10.1f} {bucketed['ms_per_face']:>9.2f}")
+    print("=" * 78)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark latensi FaceNet per panggilan: tanpa vs dengan shape bucketing")
+    parser.add_argument("--input", type=str, default="database",
+                        help="Folder gambar uji (subfolder ikut dibaca); campuran foto satu wajah dan foto grup")
+    parser.add_argument("--limit", type=int, default=200,
+                        help="Jumlah gambar maksimum")
+    parser.add_argument("--weights", type=str, default=DEFAULT_DETECTOR_WEIGHTS,
+                        help="File bobot YOLOv8 untuk mendeteksi crop wajah")
+    parser.add_argument("--confidence", type=float, default=0.6,
+                        help="Batas kepercayaan deteksi wajah")
+    parser.add_argument("--passes", type=int, default=3,
+                        help="Jumlah putaran atas semua gambar (putaran pertama = cold)")
+    parser.add_argument("--measure", type=str, choices=["unbucketed", "bucketed"], default=None,
+                        help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if args.measure:
+        groups = faces_per_image(list_sample_images(args.input, args.limit), args.weights, args.confidence)
+        print(json.dumps(measure(args.measure, groups, max(args.passes, 1)) if groups else None))
+    else:
+        run_benchmark(args.input, args.limit, args.weights, args.confidence, max(args.passes, 1))
@@ -0,0 +1,187 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import cv2
+
+# Agar modul di root project bisa diimport saat skrip dijalankan langsung
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference_backends import (INFERENCE_BACKENDS, MODEL_PRECISIONS, NATIVE_BACKEND, DEFAULT_DETECTOR_WEIGHTS,
+                                load_detector, load_embedder)
+from face_batching import crop_faces
+from gallery import load_gallery, DEFAULT_MATCH_THRESHOLD
+
+IOU_MATCH = 0.5
+
+# Daftar gambar contoh dari folder (termasuk subfolder per orang seperti database/)
+def list_sample_images(input_folder, limit=None):
+    image_paths = []
+    for root, _, files in os.walk(input_folder):
+        image_paths.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith((".jpg", ".png", ".jpeg")))
+    image_paths.sort()
+    return image_paths[:limit] if limit else image_paths
+
+def load_sample_images(image_paths):
+    images = [cv2.imread(image_path) for image_path in image_paths]
+    return [image for image in images if image is not None]
+
+# Deteksi semua gambar per batch: ([(boxes, confidences)] per gambar, detik)
+def run_detection(detector, images, batch_size, confidence_threshold):
+    detections = []
+    start_time = time.perf_counter()
+    for k in range(0, len(images), batch_size):
+        for result in detector.predict(images[k:k + batch_size], conf=confidence_threshold, verbose=False):
+            boxes = result.boxes.xyxy.cpu().numpy().reshape(-1, 4)
+            confidences = result.boxes.conf.cpu().numpy().reshape(-1)
+            detections.append((boxes, confidences))
+    return detections, time.perf_counter() - start_time
+
+# Embedding semua crop wajah per batch: (array wajah x dim, detik)
+def run_embedding(embedder, faces, batch_size):
+    embeddings = []
+    start_time = time.perf_counter()
+    for k in range(0, len(faces), batch_size):
+        embeddings.extend(embedder.embeddings(faces[k:k + batch_size]))
+    return np.array(embeddings, dtype=np.float32), time.perf_counter() - start_time
+
+# Crop wajah RGB dari hasil deteksi referensi agar semua backend meng-embed crop yang sama
+def reference_faces(images, detections):
+    faces = []
+    for image, (boxes, _) in zip(images, detections):
+        faces.extend(crop_faces(cv2.cvtColor(image, cv2.COLOR_BGR2RGB), boxes))
+    return faces
+
+def box_iou(box, boxes):
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return intersection / np.maximum(area + areas - intersection, 1e-9)
+
+def compare_detections(reference, detections):
+    """Kesesuaian deteksi terhadap referensi: (recall, precision, selisih confidence rata-rata)
+
+    Box dianggap sama jika IoU >= IOU_MATCH dengan box referensi yang belum dipasangkan.
+    """
+    matched, reference_total, total, confidence_deltas = 0, 0, 0, []
+    for (ref_boxes, ref_confs), (boxes, confs) in zip(reference, detections):
+        reference_total += len(ref_boxes)
+        total += len(boxes)
+        used = np.zeros(len(ref_boxes), dtype=bool)
+        for box, conf in zip(boxes, confs):
+            if not len(ref_boxes):
+                break
+            ious = np.where(used, 0, box_iou(box, ref_boxes))
+            best = int(np.argmax(ious))
+            if ious[best] >= IOU_MATCH:
+                used[best] = True
+                matched += 1
+                confidence_deltas.append(abs(float(conf) - float(ref_confs[best])))
+    recall = matched / reference_total if reference_total else 1.0
+    precision = matched / total if total else 1.0
+    return recall, precision, float(np.mean(confidence_deltas)) if confidence_deltas else 0.0
+
+# Cosine similarity per wajah antara embedding referensi dan backend lain
+def embedding_cosines(reference, embeddings):
+    reference = reference / np.maximum(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12)
+    embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    return np.sum(reference * embeddings, axis=1)
+
+# Persentase wajah yang menghasilkan keputusan galeri (nama / unknown) yang sama dengan referensi
+def match_agreement(gallery, reference, embeddings, threshold=DEFAULT_MATCH_THRESHOLD):
+    if gallery is None or not len(reference):
+        return float("nan")
+    reference_names = gallery.match(reference, threshold)
+    names = gallery.match(embeddings, threshold)
+    return float(np.mean([a == b for a, b in zip(reference_names, names)]))
+
+def load_reference_gallery(embeddings_path):
+    try:
+        return load_gallery(embeddings_path)
+    except Exception as e:
+        print(f"Warning: Galeri {embeddings_path} tidak bisa dimuat, match agreement dilewati: {e}")
+        return None
+
+def run_benchmark(input_folder, backends, weights, limit, detect_batch_size, embed_batch_size,
+                  confidence_threshold, embeddings_path, precision="fp32"):
+    images = load_sample_images(list_sample_images(input_folder, limit))
+    if not images:
+        print(f"Error: Tidak ada gambar di {input_folder}")
+        return
+
+    gallery = load_reference_gallery(embeddings_path)
+    results = []
+    reference = None
+
+    for backend in [NATIVE_BACKEND] + [b for b in backends if b != NATIVE_BACKEND]:
+        try:
+            detector = load_detector(weights, backend, precision)
+            embedder = load_embedder(backend, precision)
+        except Exception as e:
+            print(f"Warning: Backend {backend} dilewati: {e}")
+            continue
+
+        # Satu batch pemanasan agar waktu inisialisasi graph tidak ikut terukur
+        run_detection(detector, images[:detect_batch_size], detect_batch_size, confidence_threshold)
+        detections, detect_seconds = run_detection(detector, images, detect_batch_size, confidence_threshold)
+
+        if reference is None:
+            faces = reference_faces(images, detections)
+            if not faces:
+                print("Error: Tidak ada wajah terdeteksi oleh backend native")
+                return
+        run_embedding(embedder, faces[:embed_batch_size], embed_batch_size)
+        embeddings, embed_seconds = run_embedding(embedder, faces, embed_batch_size)
+
+        if reference is None:
+            reference = (detections, embeddings)
+        recall, box_precision, confidence_delta = compare_detections(reference[0], detections)
+        cosines = embedding_cosines(reference[1], embeddings)
+        agreement = match_agreement(gallery, reference[1], embeddings, DEFAULT_MATCH_THRESHOLD)
+        results.append((backend, len(images) / detect_seconds, len(faces) / embed_seconds,
+                        recall, box_precision, confidence_delta, cosines.min(), agreement))
+
+    print("\n" + "=" * 100)
+    print("INFERENCE BACKEND THROUGHPUT AND PARITY VS NATIVE")
+    print("=" * 100)
+    print(f"Input: {input_folder} ({len(images)} images, {len(reference[1])} faces), CPU cores: {os.cpu_count()}")
+    print(f"Batch size: YOLO {detect_batch_size}, FaceNet {embed_batch_size}, confidence {confidence_threshold}, "
+          f"ONNX precision {precision}")
+    print("-" * 100)
+    print(f"{'backend':>9} {'images/s':>9} {'faces/s':>9} {'box recall':>11} {'box prec':>9} "
+          f"{'|dconf|':>8} {'min cos':>8} {'match agree':>12}")
+    print("-" * 100)
+    for backend, images_rate, faces_rate, recall, box_precision, confidence_delta, min_cosine, agreement in results:
+        print(f"{backend:>9} {images_rate:>9.2f} {faces_rate:>9.2f} {recall:>11.4f} {box_precision:>9.4f} "
+              f"{confidence_delta:>8.4f} {min_cosine:>8.4f} {agreement:>12.4f}")
+    print("=" * 100)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark throughput dan kesesuaian hasil backend inferensi (native / onnx / openvino)")
+    parser.add_argument("--input", type=str, default="database",
+                        help="Folder gambar uji (subfolder ikut dibaca)")
+    parser.add_argument("--backends", type=str, default="onnx,openvino",
+                        help=f"Backend yang dibandingkan dengan native, dipisah koma ({', '.join(INFERENCE_BACKENDS)})")
+    parser.add_argument("--weights", type=str, default=DEFAULT_DETECTOR_WEIGHTS,
+                        help="File bobot YOLOv8 (.pt) untuk backend native")
+    parser.add_argument("--limit", type=int, default=100,
+                        help="Jumlah gambar maksimum")
+    parser.add_argument("--detect-batch-size", type=int, default=8,
+                        help="Jumlah gambar per batch YOLO")
+    parser.add_argument("--embed-batch-size", type=int, default=32,
+                        help="Jumlah wajah per batch FaceNet")
+    parser.add_argument("--confidence", type=float, default=0.6,
+                        help="Batas kepercayaan deteksi wajah")
+    parser.add_argument("--embeddings", type=str, default="face_embeddings.pkl",
+                        help="Galeri untuk mengukur kesamaan keputusan pencocokan")
+    parser.add_argument("--precision", type=str, default="fp32", choices=MODEL_PRECISIONS,
+                        help="Presisi model ONNX yang dibandingkan dengan native")
+
+    args = parser.parse_args()
+    run_benchmark(args.input, [b.strip() for b in args.backends.split(",") if b.strip()], args.weights, args.limit,
+                  args.detect_batch_size, args.embed_batch_size, args.confidence, args.embeddings, args.precision)
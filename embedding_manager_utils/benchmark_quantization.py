@@ -0,0 +1,71 @@
+import os
+import sys
+import argparse
+import numpy as np
+
+# Agar modul di root project bisa diimport saat skrip dijalankan langsung
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_store import load_embeddings
+from gallery import FaceGallery, EMBEDDING_STORAGES, DEFAULT_MATCH_THRESHOLD
+from embedding_manager_utils.benchmark_ann_index import synthesize_embeddings, build_queries, time_search
+
+def run_report(embeddings_path, num_queries, synthetic_persons, threshold, repeats):
+    embeddings = load_embeddings(embeddings_path)
+
+    if synthetic_persons:
+        embeddings = synthesize_embeddings(embeddings, synthetic_persons)
+
+    reference = FaceGallery.from_embeddings(embeddings)
+    queries = build_queries(reference, num_queries)
+
+    print("\n" + "=" * 90)
+    print("QUANTIZED GALLERY ACCURACY VS FLOAT32")
+    print("=" * 90)
+    print(f"Gallery: {len(reference.names)} persons, {len(reference)} embeddings, dim {reference.dim}")
+    print(f"Queries: {len(queries)} (50% perturbed gallery faces, 50% random unknown faces)")
+    print(f"Match threshold: {threshold}")
+    print("-" * 90)
+    print(f"{'storage':>8} {'RAM MB':>8} {'ratio':>6} {'search ms':>10} {'us/query':>9} "
+          f"{'max |dscore|':>13} {'recall@1':>9} {'decision agree':>15}")
+    print("-" * 90)
+
+    (ref_rows, ref_scores), _ = time_search(lambda: reference.best_matches(queries, exact=True), 1)
+    ref_matched = ref_scores > threshold
+    ref_names = np.where(ref_matched, reference.labels[ref_rows], -1)
+
+    for storage in EMBEDDING_STORAGES:
+        gallery = reference.quantized(storage)
+        (rows, scores), search_time = time_search(lambda: gallery.best_matches(queries, exact=True), repeats)
+
+        # Selisih skor kosinus terbaik dibanding float32
+        score_delta = np.abs(scores - ref_scores).max()
+        recall = np.mean(rows[ref_matched] == ref_rows[ref_matched]) if ref_matched.any() else float("nan")
+        names = np.where(scores > threshold, gallery.labels[rows], -1)
+        agreement = np.mean(names == ref_names)
+
+        print(f"{storage:>8} {gallery.nbytes / 1e6:>8.2f} {reference.nbytes / gallery.nbytes:>5.1f}x "
+              f"{search_time * 1000:>10.2f} {search_time / len(queries) * 1e6:>9.1f} "
+              f"{score_delta:>13.6f} {recall:>9.4f} {agreement:>15.4f}")
+
+    # Keputusan yang berubah biasanya berasal dari skor yang sangat dekat dengan threshold
+    near_threshold = np.sum(np.abs(ref_scores - threshold) < 0.01)
+    print("-" * 90)
+    print(f"Queries with float32 score within 0.01 of threshold: {near_threshold}")
+    print("=" * 90)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Laporan selisih akurasi galeri float16/int8 terhadap float32")
+    parser.add_argument("--embeddings", type=str, default="face_embeddings.pkl",
+                        help="Path ke file embeddings wajah (.pkl atau store columnar)")
+    parser.add_argument("--queries", type=int, default=2000,
+                        help="Jumlah query uji")
+    parser.add_argument("--synthetic-persons", type=int, default=0,
+                        help="Perbesar galeri secara sintetis hingga jumlah orang ini")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_MATCH_THRESHOLD,
+                        help="Ambang batas kecocokan wajah")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Jumlah pengulangan pengukuran (diambil waktu tercepat)")
+
+    args = parser.parse_args()
+    run_report(args.embeddings, args.queries, args.synthetic_persons, args.threshold, args.repeats)
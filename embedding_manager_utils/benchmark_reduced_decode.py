@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# Agar modul di root project bisa diimport saat skrip dijalankan langsung
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+from image_decoding import decode_for_detection
+from model_registry import current_rss
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Peak RSS proses sejauh ini dalam byte (ru_maxrss Linux dalam KB)
+def peak_rss():
+    if resource is None:
+        return current_rss()
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def list_images(input_folder, limit):
+    image_files = sorted(f for f in os.listdir(input_folder) if f.lower().endswith((".jpg", ".png", ".jpeg")))
+    return [os.path.join(input_folder, f) for f in image_files[:limit]]
+
+# Dijalankan di proses terpisah per mode agar peak RSS satu mode tidak memengaruhi mode lain
+def measure(mode, image_paths):
+    baseline_peak = peak_rss()
+    timings = []
+    array_bytes = []
+    peak_per_image = []
+
+    for image_path in image_paths:
+        rss_before = current_rss()
+        start_time = time.perf_counter()
+        if mode == "full":
+            image = cv2.imread(image_path)
+        else:
+            image, _, _ = decode_for_detection(image_path)
+        timings.append(time.perf_counter() - start_time)
+        if image is None:
+            continue
+        array_bytes.append(image.nbytes)
+        rss_after = current_rss()
+        if rss_before is not None and rss_after is not None:
+            peak_per_image.append(max(rss_after - rss_before, 0))
+        del image
+
+    return {
+        "images": len(timings),
+        "decode_ms": 1000 * sum(timings) / max(len(timings), 1),
+        "array_mb": sum(array_bytes) / max(len(array_bytes), 1) / 1e6,
+        "rss_per_image_mb": sum(peak_per_image) / max(len(peak_per_image), 1) / 1e6,
+        "peak_rss_delta_mb": (peak_rss() - baseline_peak) / 1e6
+    }
+
+def run_benchmark(input_folder, limit):
+    image_paths = list_images(input_folder, limit)
+    if not image_paths:
+        print(f"Error: Tidak ada gambar di {input_folder}")
+        return
+
+    results = {}
+    for mode in ("full", "reduced"):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--input", input_folder,
+                                 "--limit", str(limit), "--measure", mode],
+                                capture_output=True, text=True, check=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print("\n" + "=" * 78)
+    print("REDUCED-RESOLUTION DECODE FOR DETECTION")
+    print("=" * 78)
+    print(f"Input: {input_folder} ({results['full']['images']} images)")
+    print("-" * 78)
+    print(f"{'mode':>8} {'decode ms/img':>14} {'array MB/img':>13} {'RSS MB/img':>11} {'peak RSS +MB':>13}")
+    print("-" * 78)
+    for mode, result in results.items():
+        print(f"{mode:>8} {result['decode_ms']:>14.2f} {result['array_mb']:>13.2f} "
+              f"{result['rss_per_image_mb']:>11.2f} {result['peak_rss_delta_mb']:>13.2f}")
+    print("-" * 78)
+    if results["reduced"]["decode_ms"] > 0:
+        print(f"Decode speedup: {results['full']['decode_ms'] / results['reduced']['decode_ms']:.2f}x "
+              f"(gambar dengan wajah tetap dibaca penuh satu kali untuk crop)")
+    print("=" * 78)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark waktu decode dan RSS: decode penuh vs decode tereduksi untuk deteksi")
+    parser.add_argument("--input", type=str, required=True,
+                        help="Folder berisi gambar uji (mis. foto kamera JPEG 24 MP)")
+    parser.add_argument("--limit", type=int, default=200,
+                        help="Jumlah gambar maksimum yang diukur")
+    parser.add_argument("--measure", type=str, choices=["full", "reduced"], default=None,
+                        help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if args.measure:
+        print(json.dumps(measure(args.measure, list_images(args.input, args.limit))))
+    else:
+        run_benchmark(args.input, args.limit)
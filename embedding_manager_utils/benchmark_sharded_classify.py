@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+
+# Agar modul di root project bisa diimport saat skrip dijalankan langsung
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sharded_classify import classify_faces_sharded, threads_per_worker
+
+# Kurva skala klasifikasi multi-proses: 1, 2, 4, ... hingga max_workers proses worker
+def worker_counts(max_workers):
+    counts = []
+    workers = 1
+    while workers < max_workers:
+        counts.append(workers)
+        workers *= 2
+    counts.append(max_workers)
+    return counts
+
+def run_benchmark(input_folder, max_workers, batch_size, repeats):
+    image_count = len([f for f in os.listdir(input_folder) if f.lower().endswith((".jpg", ".png", ".jpeg"))])
+    output_folder = "(Benchmark) " + os.path.basename(os.path.normpath(input_folder))
+
+    results = []
+    for workers in worker_counts(max_workers):
+        timings = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            output, zip_path, _ = classify_faces_sharded(input_folder, output_folder, workers=workers,
+                                                         batch_size=batch_size, force_processes=True)
+            timings.append(time.perf_counter() - start_time)
+            if output is None:
+                print(f"Error: Klasifikasi dengan {workers} worker gagal")
+                return
+            shutil.rmtree(output, ignore_errors=True)
+            if zip_path and os.path.exists(zip_path):
+                os.remove(zip_path)
+        results.append((workers, min(timings)))
+
+    baseline = results[0][1]
+    print("\n" + "=" * 72)
+    print("SHARDED CLASSIFICATION SCALING")
+    print("=" * 72)
+    print(f"Input: {input_folder} ({image_count} images), CPU cores: {os.cpu_count()}, batch size: {batch_size}")
+    print("Waktu termasuk memuat model di setiap worker (diambil waktu tercepat dari pengulangan)")
+    print("-" * 72)
+    print(f"{'workers':>8} {'threads':>8} {'seconds':>9} {'images/s':>9} {'speedup':>8} {'efficiency':>11}")
+    print("-" * 72)
+    for workers, seconds in results:
+        speedup = baseline / seconds
+        print(f"{workers:>8} {threads_per_worker(workers):>8} {seconds:>9.2f} {image_count / seconds:>9.2f} "
+              f"{speedup:>7.2f}x {speedup / workers:>10.0%}")
+    print("=" * 72)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark skala klasifikasi wajah dari 1 hingga N proses worker")
+    parser.add_argument("--input", type=str, required=True,
+                        help="Folder berisi gambar uji")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1,
+                        help="Jumlah worker maksimum")
+    parser.add_argument("--batch-size", type=int, default=5,
+                        help="Jumlah gambar per batch YOLO")
+    parser.add_argument("--repeats", type=int, default=1,
+                        help="Jumlah pengulangan pengukuran per jumlah worker")
+
+    args = parser.parse_args()
+    run_benchmark(args.input, args.max_workers, args.batch_size, args.repeats)
@@ -0,0 +1,68 @@
+import os
+import sys
+import shutil
+import argparse
+
+# Agar modul di root project bisa diimport saat skrip dijalankan langsung
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference_backends import (DEFAULT_DETECTOR_WEIGHTS, DETECT_IMAGE_SIZE, FACE_SIZE, detector_model_path,
+                                embedder_model_path, save_model_metadata)
+
+ONNX_OPSET = 17
+
+# Ekspor detektor YOLOv8 ke ONNX dengan ukuran batch dinamis (dibutuhkan batching lintas gambar)
+def export_detector(weights=DEFAULT_DETECTOR_WEIGHTS, output_path=None, image_size=DETECT_IMAGE_SIZE):
+    from ultralytics import YOLO
+
+    output_path = output_path or detector_model_path(weights)
+    model = YOLO(weights)
+    exported_path = model.export(format="onnx", imgsz=image_size, dynamic=True, simplify=True,
+                                 opset=ONNX_OPSET, half=False)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    if os.path.abspath(exported_path) != os.path.abspath(output_path):
+        shutil.move(exported_path, output_path)
+
+    names = model.names
+    save_model_metadata(output_path, {
+        "source": os.path.basename(weights),
+        "image_size": image_size,
+        "names": [names[k] for k in sorted(names)] if isinstance(names, dict) else list(names)
+    })
+    print(f"Detektor diekspor ke {output_path}")
+    return output_path
+
+# Ekspor model Keras di dalam keras-facenet ke ONNX (input NHWC float32 yang sudah distandarisasi)
+def export_embedder(output_path=None):
+    import tensorflow as tf
+    import tf2onnx
+    from keras_facenet import FaceNet
+
+    output_path = output_path or embedder_model_path()
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    embedder = FaceNet()
+    input_signature = [tf.TensorSpec((None, FACE_SIZE, FACE_SIZE, 3), tf.float32, name="faces")]
+    tf2onnx.convert.from_keras(embedder.model, input_signature=input_signature, opset=ONNX_OPSET,
+                               output_path=output_path)
+
+    save_model_metadata(output_path, {
+        "source": "keras_facenet",
+        "face_size": FACE_SIZE,
+        "input_normalization": "per-image standardization"
+    })
+    print(f"FaceNet diekspor ke {output_path}")
+    return output_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ekspor YOLOv8 face dan FaceNet ke ONNX untuk INFERENCE_BACKEND=onnx/openvino")
+    parser.add_argument("--weights", type=str, default=DEFAULT_DETECTOR_WEIGHTS,
+                        help="File bobot YOLOv8 (.pt)")
+    parser.add_argument("--model", type=str, default="all", choices=["all", "detector", "embedder"],
+                        help="Model yang diekspor")
+
+    args = parser.parse_args()
+    if args.model in ("all", "detector"):
+        export_detector(args.weights)
+    if args.model in ("all", "embedder"):
+        export_embedder()
+    print("Jalankan benchmark_inference_backends.py untuk memeriksa kesesuaian hasil sebelum mengganti INFERENCE_BACKEND")
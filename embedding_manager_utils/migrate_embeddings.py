@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import argparse
+
+# Agar modul di root project bisa diimport saat skrip dijalankan langsung
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_store import migrate_pickle_to_store, store_path_for
+
+# Migrasi satu kali face_embeddings.pkl ke store columnar yang bisa di-mmap
+def migrate_embeddings(pickle_path="face_embeddings.pkl", store_path=None, metadata_path="face_embeddings_metadata.pkl"):
+    store_path = store_path or store_path_for(pickle_path)
+
+    if not os.path.isfile(pickle_path):
+        print(f"Error: File {pickle_path} tidak ditemukan.")
+        return None
+
+    print(f"Migrasi {pickle_path} -> {store_path}")
+    start_time = time.time()
+    if not os.path.exists(metadata_path):
+        print(f"Warning: File metadata {metadata_path} tidak ditemukan, embedding belum dikelompokkan per gambar.")
+    header = migrate_pickle_to_store(pickle_path, store_path, metadata_path)
+
+    store_size = sum(os.path.getsize(os.path.join(store_path, name)) for name in os.listdir(store_path))
+    print(f"Selesai dalam {time.time() - start_time:.2f} detik")
+    print(f"  Jumlah orang     : {header['persons']}")
+    print(f"  Jumlah embedding : {header['count']} (dim {header['dim']}, {header['dtype']})")
+    print(f"  Ukuran pickle    : {os.path.getsize(pickle_path) / 1e6:.2f} MB")
+    print(f"  Ukuran store     : {store_size / 1e6:.2f} MB")
+    print(f"File {pickle_path} tidak dihapus; hapus manual setelah store terverifikasi "
+          f"atau set EMBEDDING_FORMAT=pickle untuk kembali ke format lama.")
+    return header
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrasi embeddings wajah dari pickle ke store columnar")
+    parser.add_argument("--pickle", type=str, default="face_embeddings.pkl",
+                        help="Path ke file pickle embeddings wajah")
+    parser.add_argument("--store", type=str, default=None,
+                        help="Direktori store tujuan (default: <nama pickle>_store)")
+    parser.add_argument("--metadata", type=str, default="face_embeddings_metadata.pkl",
+                        help="Path ke file pickle metadata wajah (untuk mengelompokkan embedding per gambar)")
+
+    args = parser.parse_args()
+    migrate_embeddings(args.pickle, args.store, args.metadata)
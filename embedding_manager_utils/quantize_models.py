@@ -0,0 +1,176 @@
+import os
+import sys
+import random
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+# Agar modul di root project bisa diimport saat skrip dijalankan langsung
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference_backends import (DEFAULT_DETECTOR_WEIGHTS, OnnxFaceDetector, OnnxFaceEmbedder, standardize_faces,
+                                detector_model_path, embedder_model_path, load_model_metadata, save_model_metadata)
+from gallery import DEFAULT_MATCH_THRESHOLD
+from embedding_manager_utils.benchmark_inference_backends import (list_sample_images, load_sample_images, run_detection,
+                                                                  run_embedding, reference_faces, compare_detections,
+                                                                  embedding_cosines, match_agreement, load_reference_gallery)
+
+# Quantization INT8 pasca-training (ONNX Runtime, format QDQ) untuk model ONNX hasil export_onnx_models.py.
+# Kalibrasi memakai sampel gambar dari database/; sampel lain (held-out) dipakai untuk membandingkan
+# deteksi, embedding, dan keputusan pencocokan galeri model INT8 terhadap model float.
+
+def split_samples(database_dir, calibration_count, holdout_count, seed):
+    image_paths = list_sample_images(database_dir)
+    random.Random(seed).shuffle(image_paths)
+    return image_paths[:calibration_count], image_paths[calibration_count:calibration_count + holdout_count]
+
+def batched(items, batch_size):
+    return [items[k:k + batch_size] for k in range(0, len(items), batch_size)]
+
+def quantize_model(model_path, output_path, batches, calibration_method):
+    """Quantize statis satu model ONNX; batches = list array input untuk kalibrasi"""
+    from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+                                          quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    class BatchReader(CalibrationDataReader):
+        def __init__(self, input_name):
+            self.input_name = input_name
+            self.batches = iter(batches)
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {self.input_name: batch}
+
+    import onnxruntime as ort
+    input_name = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    work_dir = tempfile.mkdtemp(prefix="quantize_")
+    try:
+        # Shape inference dan optimasi graph sebelum quantization (disarankan ONNX Runtime)
+        prepared_path = os.path.join(work_dir, "prepared.onnx")
+        try:
+            quant_pre_process(model_path, prepared_path)
+        except Exception as e:
+            print(f"Warning: Pre-processing {model_path} gagal, model asli di-quantize langsung: {e}")
+            prepared_path = model_path
+
+        quantize_static(prepared_path, output_path, BatchReader(input_name),
+                        quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                        calibrate_method=getattr(CalibrationMethod, calibration_method))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    metadata = load_model_metadata(model_path)
+    metadata.update({"precision": "int8", "calibration_method": calibration_method,
+                     "calibration_batches": len(batches)})
+    save_model_metadata(output_path, metadata)
+    print(f"Model INT8 disimpan di {output_path}")
+
+def report(float_detector, int8_detector, float_embedder, int8_embedder, images, confidence_threshold,
+           detect_batch_size, embed_batch_size, gallery):
+    float_detections, float_detect_seconds = run_detection(float_detector, images, detect_batch_size, confidence_threshold)
+    int8_detections, int8_detect_seconds = run_detection(int8_detector, images, detect_batch_size, confidence_threshold)
+    recall, precision, confidence_delta = compare_detections(float_detections, int8_detections)
+
+    # Embedding dibandingkan pada crop yang sama (hasil deteksi model float)
+    faces = reference_faces(images, float_detections)
+    float_embeddings, float_embed_seconds = run_embedding(float_embedder, faces, embed_batch_size)
+    int8_embeddings, int8_embed_seconds = run_embedding(int8_embedder, faces, embed_batch_size)
+    cosines = embedding_cosines(float_embeddings, int8_embeddings) if faces else np.ones(1)
+    agreement = match_agreement(gallery, float_embeddings, int8_embeddings, DEFAULT_MATCH_THRESHOLD)
+
+    print("\n" + "=" * 72)
+    print("INT8 VS FLOAT (HELD-OUT SET)")
+    print("=" * 72)
+    print(f"Held-out: {len(images)} images, {len(faces)} faces, confidence {confidence_threshold}")
+    print("-" * 72)
+    print(f"{'':>10} {'fp32/s':>10} {'int8/s':>10} {'speedup':>8}")
+    print(f"{'YOLO img':>10} {len(images) / float_detect_seconds:>10.2f} {len(images) / int8_detect_seconds:>10.2f} "
+          f"{float_detect_seconds / int8_detect_seconds:>7.2f}x")
+    if faces:
+        print(f"{'FaceNet':>10} {len(faces) / float_embed_seconds:>10.2f} {len(faces) / int8_embed_seconds:>10.2f} "
+              f"{float_embed_seconds / int8_embed_seconds:>7.2f}x")
+    print("-" * 72)
+    print(f"Box recall / precision vs fp32: {recall:.4f} / {precision:.4f} (mean |dconf| {confidence_delta:.4f})")
+    print(f"Embedding cosine vs fp32: mean {cosines.mean():.4f}, min {cosines.min():.4f}")
+    print(f"Match agreement vs fp32 (threshold {DEFAULT_MATCH_THRESHOLD}): {agreement:.4f}")
+    print("=" * 72)
+
+def run_quantization(database_dir, weights, backend, calibration_count, holdout_count, seed, calibration_method,
+                     confidence_threshold, detect_batch_size, embed_batch_size, embeddings_path, models):
+    calibration_paths, holdout_paths = split_samples(database_dir, calibration_count, holdout_count, seed)
+    calibration_images = load_sample_images(calibration_paths)
+    if not calibration_images:
+        print(f"Error: Tidak ada gambar kalibrasi di {database_dir}")
+        return
+    print(f"Kalibrasi: {len(calibration_images)} gambar, held-out: {len(holdout_paths)} gambar dari {database_dir}")
+
+    float_detector = OnnxFaceDetector(detector_model_path(weights, "fp32"), backend)
+    float_embedder = OnnxFaceEmbedder(embedder_model_path("fp32"), backend)
+
+    if "detector" in models:
+        batches = [float_detector.preprocess(batch)[0] for batch in batched(calibration_images, detect_batch_size)]
+        quantize_model(detector_model_path(weights, "fp32"), detector_model_path(weights, "int8"), batches,
+                       calibration_method)
+
+    if "embedder" in models:
+        # Kalibrasi FaceNet memakai crop wajah nyata dari gambar kalibrasi
+        detections, _ = run_detection(float_detector, calibration_images, detect_batch_size, confidence_threshold)
+        faces = reference_faces(calibration_images, detections)
+        if not faces:
+            print("Error: Tidak ada wajah terdeteksi di gambar kalibrasi")
+            return
+        batches = [standardize_faces(batch) for batch in batched(faces, embed_batch_size)]
+        quantize_model(embedder_model_path("fp32"), embedder_model_path("int8"), batches, calibration_method)
+
+    holdout_images = load_sample_images(holdout_paths)
+    if not holdout_images:
+        print("Warning: Tidak ada gambar held-out, laporan kesesuaian dilewati")
+        return
+
+    # Model yang tidak di-quantize dibandingkan dengan versi INT8 yang sudah ada (jika ada)
+    try:
+        int8_detector = OnnxFaceDetector(detector_model_path(weights, "int8"), backend)
+        int8_embedder = OnnxFaceEmbedder(embedder_model_path("int8"), backend)
+    except FileNotFoundError as e:
+        print(f"Warning: Laporan dilewati: {e}")
+        return
+    report(float_detector, int8_detector, float_embedder, int8_embedder, holdout_images, confidence_threshold,
+           detect_batch_size, embed_batch_size, load_reference_gallery(embeddings_path))
+    print("Aktifkan dengan MODEL_PRECISION=int8 (INFERENCE_BACKEND=onnx atau openvino)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantization INT8 YOLO / FaceNet ONNX dengan kalibrasi dari database")
+    parser.add_argument("--database", type=str, default="database",
+                        help="Folder database wajah untuk sampel kalibrasi dan held-out")
+    parser.add_argument("--weights", type=str, default=DEFAULT_DETECTOR_WEIGHTS,
+                        help="Nama bobot YOLOv8 asal model ONNX")
+    parser.add_argument("--model", type=str, default="all", choices=["all", "detector", "embedder"],
+                        help="Model yang di-quantize")
+    parser.add_argument("--backend", type=str, default="onnx", choices=["onnx", "openvino"],
+                        help="Runtime untuk laporan kesesuaian dan kecepatan")
+    parser.add_argument("--calibration-images", type=int, default=100,
+                        help="Jumlah gambar kalibrasi")
+    parser.add_argument("--holdout-images", type=int, default=100,
+                        help="Jumlah gambar held-out untuk laporan")
+    parser.add_argument("--calibration-method", type=str, default="MinMax", choices=["MinMax", "Entropy", "Percentile"],
+                        help="Metode kalibrasi ONNX Runtime")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed pengacakan sampel")
+    parser.add_argument("--confidence", type=float, default=0.6,
+                        help="Batas kepercayaan deteksi wajah")
+    parser.add_argument("--detect-batch-size", type=int, default=8,
+                        help="Jumlah gambar per batch YOLO")
+    parser.add_argument("--embed-batch-size", type=int, default=32,
+                        help="Jumlah wajah per batch FaceNet")
+    parser.add_argument("--embeddings", type=str, default="face_embeddings.pkl",
+                        help="Galeri untuk mengukur kesamaan keputusan pencocokan")
+
+    args = parser.parse_args()
+    models = ("detector", "embedder") if args.model == "all" else (args.model,)
+    run_quantization(args.database, args.weights, args.backend, args.calibration_images, args.holdout_images, args.seed,
+                     args.calibration_method, args.confidence, args.detect_batch_size, args.embed_batch_size,
+                     args.embeddings, models)
@@ -1,8 +1,14 @@
 import pickle
 import os
+import sys
 import numpy as np
 from collections import defaultdict
 
+# Agar modul di root project bisa diimport saat skrip dijalankan langsung
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_store import embeddings_exist, load_embeddings
+
 def audit_face_database(pickle_path="face_embeddings.pkl", 
                        metadata_path="face_embeddings_metadata.pkl", 
                        database_dir="database"):
@@ -11,8 +17,8 @@ def audit_face_database(pickle_path="face_embeddings.pkl",
     print("AUDIT DATABASE FACE EMBEDDINGS")
     print("=" * 60)
     
-    # 1. Periksa keberadaan file pickle dan metadata
-    if not os.path.exists(pickle_path):
+    # 1. Periksa keberadaan embeddings (store columnar atau file pickle) dan metadata
+    if not embeddings_exist(pickle_path):
         print(f"ERROR: File {pickle_path} tidak ditemukan.")
         return
         
@@ -28,10 +34,9 @@ def audit_face_database(pickle_path="face_embeddings.pkl",
         print(f"ERROR: Direktori {database_dir} tidak ditemukan.")
         return
     
-    # 3. Load embeddings dari file pickle
+    # 3. Load embeddings dari store columnar atau file pickle
     print(f"Membaca file embeddings: {pickle_path}")
-    with open(pickle_path, "rb") as f:
-        embeddings = pickle.load(f)
+    embeddings = load_embeddings(pickle_path)
     
     # 4. Load metadata jika tersedia
     if has_metadata:
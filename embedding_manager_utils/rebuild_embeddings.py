@@ -1,18 +1,26 @@
 import os
 import time
 import numpy as np
-import pickle
-from keras_facenet import FaceNet
-from ultralytics import YOLO
 from PIL import Image
-import cv2
 from collections import defaultdict
-import hashlib
 import sys
+from functools import partial
+
+# Agar modul di root project bisa diimport saat skrip dijalankan langsung
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gallery import gallery_from_saved, update_person_centroids, centroids_path_for, write_compact_gallery
+from embedding_store import remove_embeddings, save_embeddings, save_metadata
+from embedding_cache import EmbeddingCache, DetectionCache, prune_caches
+from model_registry import get_yolo_model, get_face_embedder
+from face_batching import FaceEnrollmentBatcher
+from image_hashing import file_signature, hash_file
+import ann_index
+from env_settings import env_float
 
 # Konfigurasi confidence threshold
 DEFAULT_CONFIDENCE = 0.6
-confidence_threshold = float(os.environ.get('CONFIDENCE_THRESHOLD', DEFAULT_CONFIDENCE))
+confidence_threshold = env_float('CONFIDENCE_THRESHOLD', DEFAULT_CONFIDENCE)
 
 # Validasi confidence threshold
 if not (0.5 <= confidence_threshold <= 0.7):
@@ -51,9 +59,8 @@ if run_process.lower() != 'y':
 output_path = "face_embeddings.pkl"
 metadata_path = "face_embeddings_metadata.pkl"
 
-if os.path.exists(output_path):
-    os.remove(output_path)
-    print(f"File {output_path} telah dihapus untuk membuat yang baru.")
+for removed_path in remove_embeddings(output_path):
+    print(f"File {removed_path} telah dihapus untuk membuat yang baru.")
 
 if os.path.exists(metadata_path):
     os.remove(metadata_path)
@@ -61,10 +68,14 @@ if os.path.exists(metadata_path):
 
 # Inisialisasi model
 print("\nMemuat model YOLOv8 dan FaceNet...")
-yolo_model = YOLO("yolov8m-face.pt")
-embedder = FaceNet()
+yolo_model = get_yolo_model()
+embedder = get_face_embedder()
 print("Model berhasil dimuat.\n")
 
+# Cache embeddings berdasarkan isi gambar; gambar yang tidak berubah sejak rebuild sebelumnya
+# (dengan confidence threshold dan model yang sama) tidak diproses ulang
+embedding_cache = EmbeddingCache.for_confidence(confidence_threshold)
+
 # Fungsi membaca dan memproses gambar ke RGB
 def preprocess_image(image_path):
     try:
@@ -74,30 +85,6 @@ def preprocess_image(image_path):
     except Exception as e:
         raise ValueError(f"Error loading image {image_path}: {e}")
 
-# Fungsi mendeteksi wajah menggunakan YOLOv8 dengan confidence threshold
-def detect_faces(image):
-    results = yolo_model(image, conf=confidence_threshold)  # Gunakan confidence threshold yang telah dikonfigurasi
-    detections = results[0].boxes.xyxy.numpy()  # Bounding box (x1, y1, x2, y2)
-    # Tambahkan juga confidence scores untuk logging
-    confidence_scores = results[0].boxes.conf.numpy()
-    
-    faces = []
-    boxes_with_scores = []
-    
-    for i, box in enumerate(detections):
-        x1, y1, x2, y2 = map(int, box)
-        face = image[y1:y2, x1:x2]  # Crop wajah dari gambar
-        face = cv2.resize(face, (160, 160))
-        faces.append(face)
-        boxes_with_scores.append((box, confidence_scores[i]))
-    
-    return faces, boxes_with_scores
-
-# Fungsi baru untuk menghitung hash file
-def get_image_hash(image_path):
-    with open(image_path, "rb") as f:
-        return hashlib.md5(f.read()).hexdigest()
-
 # Path direktori wajah yang sudah dikenal
 known_faces_dir = "database"
 
@@ -113,6 +100,63 @@ embeddings = {}
 # Dictionary tambahan untuk menyimpan metadata (format yang kompatibel dengan kode update dan rebuild)
 metadata = {}
 
+# Gambar dideteksi YOLOv8 per batch (DETECT_BATCH_SIZE), lalu crop wajah dari banyak gambar di-embed FaceNet
+# dalam batch berukuran tetap (EMBED_BATCH_SIZE). Gambar yang deteksi mentahnya ada di cache deteksi
+# (DETECTION_FLOOR) cukup difilter dengan confidence threshold ini tanpa deteksi ulang
+face_batcher = FaceEnrollmentBatcher(lambda: yolo_model, lambda: embedder, confidence_threshold,
+                                     DetectionCache.for_detector())
+
+# Informasi jumlah wajah dan confidence scores untuk log per gambar
+def describe_faces(face_count, confidence_scores):
+    confidence_info = ", ".join([f"{score:.2f}" for score in confidence_scores]) if confidence_scores else "N/A"
+    if face_count > 1:
+        return f"{face_count} wajah terdeteksi (conf: {confidence_info})"
+    elif face_count == 1:
+        return f"1 wajah terdeteksi (conf: {confidence_info})"
+    return "Tidak ada wajah terdeteksi"
+
+# Format metadata yang kompatibel dengan kode update dan rebuild
+# (embedding_indices diisi saat embeddings gambar ini ditambahkan ke list)
+def record_image(person_name, image_name, image_hash, image_signature, face_count, confidence_scores):
+    metadata[person_name][image_name] = {
+        "hash": image_hash,
+        "stat": image_signature,
+        "embedding_indices": [],
+        # Tambahkan info tambahan yang tidak akan mengganggu kompatibilitas
+        "faces_detected": face_count,
+        "confidence_scores": confidence_scores
+    }
+
+# Tetap catat dalam metadata bahwa file ini bermasalah (dengan format yang kompatibel)
+def record_image_error(person_name, image_name, image_hash, image_signature, error):
+    metadata[person_name][image_name] = {
+        "hash": image_hash,
+        "stat": image_signature,
+        "embedding_indices": [],
+        "faces_detected": 0,
+        "error": str(error)
+    }
+
+# Menambahkan embeddings satu gambar ke list orangnya dan mencatat indeksnya di metadata
+def add_image_embeddings(person_name, image_name, image_embeddings):
+    start_idx = len(embeddings[person_name])
+    embeddings[person_name].extend(image_embeddings)
+    end_idx = len(embeddings[person_name])
+    metadata[person_name][image_name]["embedding_indices"] = list(range(start_idx, end_idx))
+
+# Gambar yang selesai dideteksi dan di-embed: catat metadata lalu tambahkan embeddings-nya
+def store_processed_images(completed):
+    for (person_name, image_name, image_hash, image_signature), image_embeddings, confidence_scores, error in completed:
+        if error is not None:
+            print(f"    {person_name}/{image_name} - ERROR: {error}")
+            record_image_error(person_name, image_name, image_hash, image_signature, error)
+            continue
+        print(f"    {person_name}/{image_name} - {describe_faces(len(image_embeddings), confidence_scores)}")
+        record_image(person_name, image_name, image_hash, image_signature, len(image_embeddings), confidence_scores)
+        if embedding_cache is not None:
+            embedding_cache.put(image_hash, image_embeddings, confidence_scores)
+        add_image_embeddings(person_name, image_name, image_embeddings)
+
 # Hitung total gambar yang akan diproses untuk progress tracking
 total_images = 0
 for person_name in os.listdir(known_faces_dir):
@@ -151,74 +195,51 @@ for person_name in os.listdir(known_faces_dir):
                 
                 print(f"  - [{processed_images}/{total_images}] ({progress:.1f}%) {image_name} - {images_per_sec:.2f} img/s", end="")
                 
+                image_hash = image_signature = None
                 try:
-                    # Preprocess gambar
-                    image = preprocess_image(image_path)
-                    
-                    # Deteksi wajah dengan YOLOv8
-                    faces, face_details = detect_faces(image)
-                    
-                    # Hitung jumlah wajah yang terdeteksi pada gambar ini
-                    face_count = len(faces)
-                    
-                    # Tambahkan info confidence scores
-                    confidence_info = ", ".join([f"{score:.2f}" for _, score in face_details]) if face_details else "N/A"
-                    
-                    # Hitung hash dari gambar (ditambahkan untuk kompatibilitas)
-                    image_hash = get_image_hash(image_path)
-                    
-                    # Catat starting index untuk embedding baru
-                    start_idx = len(embeddings[person_name])
-                    
-                    # Proses setiap wajah yang terdeteksi
-                    for face in faces:
-                        # Buat embedding
-                        embedding = embedder.embeddings([face])[0]
-                        
-                        # Tambahkan embedding ke list
-                        embeddings[person_name].append(embedding)
+                    # Hitung hash dari gambar (kunci metadata dan cache embeddings)
+                    image_signature = file_signature(image_path)
+                    image_hash = hash_file(image_path)
                     
-                    # Hitung indeks embedding untuk metadata
-                    end_idx = len(embeddings[person_name])
-                    embedding_indices = list(range(start_idx, end_idx))
-                    
-                    # Format metadata yang kompatibel dengan kode update dan rebuild
-                    metadata[person_name][image_name] = {
-                        "hash": image_hash,
-                        "embedding_indices": embedding_indices,
-                        # Tambahkan info tambahan yang tidak akan mengganggu kompatibilitas
-                        "faces_detected": face_count,
-                        "confidence_scores": [float(score) for _, score in face_details]
-                    }
-                    
-                    # Cetak informasi tentang wajah yang terdeteksi
-                    if face_count > 1:
-                        print(f" - {face_count} wajah terdeteksi (conf: {confidence_info})")
-                    elif face_count == 1:
-                        print(f" - 1 wajah terdeteksi (conf: {confidence_info})")
-                    else:
-                        print(f" - Tidak ada wajah terdeteksi")
-                        
+                    # Embedding dari cache langsung ditambahkan tanpa deteksi ulang
+                    cached = embedding_cache.get(image_hash) if embedding_cache is not None else None
+                    if cached is not None:
+                        image_embeddings, confidence_scores = cached
+                        record_image(person_name, image_name, image_hash, image_signature, len(image_embeddings), confidence_scores)
+                        add_image_embeddings(person_name, image_name, image_embeddings)
+                        print(f" - {describe_faces(len(image_embeddings), confidence_scores)} (cache)")
+                        continue
                 except Exception as e:
                     print(f" - ERROR: {e}")
-                    # Tetap catat dalam metadata bahwa file ini bermasalah (dengan format yang kompatibel)
-                    metadata[person_name][image_name] = {
-                        "hash": get_image_hash(image_path),
-                        "embedding_indices": [],
-                        "faces_detected": 0,
-                        "error": str(e)
-                    }
-
-# Simpan embeddings ke file .pkl (format aslinya tetap dipertahankan)
-with open(output_path, "wb") as f:
-    pickle.dump(embeddings, f)
+                    record_image_error(person_name, image_name, image_hash, image_signature, e)
+                    continue
+                
+                # Deteksi wajah dengan YOLOv8 per batch (atau filter cache deteksi); hasilnya dicetak saat batch selesai
+                print(" - diantrikan")
+                store_processed_images(face_batcher.add((person_name, image_name, image_hash, image_signature), image_hash,
+                                                        partial(preprocess_image, image_path)))
+
+# Proses sisa gambar dan crop yang belum mengisi satu batch penuh
+store_processed_images(face_batcher.flush())
+print(face_batcher.summary())
+
+# Simpan embeddings sesuai EMBEDDING_FORMAT (store columnar atau file .pkl lama), dikelompokkan per gambar
+save_embeddings(output_path, embeddings, metadata)
 
 # Simpan metadata ke file terpisah
-with open(metadata_path, "wb") as f:
-    pickle.dump(metadata, f)
+save_metadata(metadata_path, metadata)
+
+# Hitung centroid semua orang, galeri ringkas, dan indeks ANN (jika dipakai)
+update_person_centroids(centroids_path_for(output_path), embeddings)
+gallery = gallery_from_saved(output_path)
+write_compact_gallery(output_path, gallery)
+ann_index.refresh_index(ann_index.index_path_for(output_path), gallery)
 
 print(f"\nDatabase embedding telah dibuat dan disimpan di {output_path}")
 print(f"Metadata embedding telah disimpan di {metadata_path}")
+if embedding_cache is not None:
+    print(embedding_cache.summary())
+prune_caches()
 
 # Buat ringkasan
 print("\nRingkasan:")
@@ -1,20 +1,31 @@
 import os
 import numpy as np
 import pickle
+import copy
 import argparse
-from keras_facenet import FaceNet
-from ultralytics import YOLO
 from PIL import Image
-import cv2
-import hashlib
 import time
 from datetime import datetime
 from collections import defaultdict
+import sys
+from functools import partial
+
+# Agar modul di root project bisa diimport saat skrip dijalankan langsung
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gallery import refresh_derived_files
+from embedding_store import embeddings_exist, apply_embedding_changes, save_metadata
+from embedding_cache import EmbeddingCache, DetectionCache, prune_caches
+from model_registry import get_yolo_model, get_face_embedder
+from face_batching import FaceEnrollmentBatcher
+from image_hashing import file_signature, hash_file
 
 def reprocess_problem_faces(database_dir="database", 
                            embeddings_path="face_embeddings.pkl",
                            metadata_path="face_embeddings_metadata.pkl",
-                           confidence_threshold=0.6):
+                           confidence_threshold=0.6,
+                           embed_batch_size=None,
+                           detect_batch_size=None):
 
     print("\n" + "=" * 60)
     print(f"MEMPROSES ULANG WAJAH BERMASALAH (Batas Kepercayaan: {confidence_threshold})")
@@ -28,7 +39,7 @@ def reprocess_problem_faces(database_dir="database",
         # Lanjutkan tanpa konfirmasi karena ini web app
     
     # Periksa apakah file yang diperlukan ada
-    if not os.path.exists(embeddings_path):
+    if not embeddings_exist(embeddings_path):
         print(f"Error: File embeddings {embeddings_path} tidak ditemukan.")
         return {
             "status": "error",
@@ -49,14 +60,12 @@ def reprocess_problem_faces(database_dir="database",
             "message": f"Direktori database {database_dir} tidak ditemukan."
         }
     
-    # Muat data yang ada
-    print("Memuat embeddings dan metadata yang ada...")
+    # Muat metadata yang ada; embeddings tidak perlu dimuat karena hanya gambar bermasalah yang diganti
+    print("Memuat metadata yang ada...")
     try:
-        with open(embeddings_path, "rb") as f:
-            embeddings = pickle.load(f)
-            
         with open(metadata_path, "rb") as f:
             metadata = pickle.load(f)
+        previous_metadata = copy.deepcopy(metadata)
     except Exception as e:
         print(f"Error saat memuat data: {e}")
         return {
@@ -64,15 +73,8 @@ def reprocess_problem_faces(database_dir="database",
             "message": f"Error saat memuat data: {e}"
         }
     
-    # Inisialisasi model (hanya ketika kita yakin membutuhkannya)
-    print("Menginisialisasi model deteksi wajah dan embedding...")
-    yolo_model = YOLO("yolov8m-face.pt")
-    embedder = FaceNet()
-    
-    # Fungsi untuk mendapatkan hash gambar
-    def get_image_hash(image_path):
-        with open(image_path, "rb") as f:
-            return hashlib.md5(f.read()).hexdigest()
+    # Cache embeddings berdasarkan isi gambar untuk batas kepercayaan ini
+    embedding_cache = EmbeddingCache.for_confidence(confidence_threshold)
     
     # Fungsi untuk pra-pemrosesan gambar
     def preprocess_image(image_path):
@@ -83,27 +85,6 @@ def reprocess_problem_faces(database_dir="database",
         except Exception as e:
             raise ValueError(f"Error saat memuat gambar {image_path}: {e}")
     
-    # Fungsi untuk mendeteksi wajah dengan batas kepercayaan
-    def detect_faces(image, conf_threshold):
-        results = yolo_model(image)
-        
-        # Dapatkan kotak pembatas dan skor kepercayaan
-        detections = results[0].boxes.xyxy.numpy()  # koordinat kotak pembatas
-        confidences = results[0].boxes.conf.numpy()  # skor kepercayaan
-        
-        faces = []
-        # Loop melalui deteksi dan filter berdasarkan skor kepercayaan
-        for i, (box, conf) in enumerate(zip(detections, confidences)):
-            if conf >= conf_threshold:
-                x1, y1, x2, y2 = map(int, box)
-                face = image[y1:y2, x1:x2]  # crop wajah
-                face = cv2.resize(face, (160, 160))
-                faces.append(face)
-            else:
-                print(f"    Mengabaikan deteksi wajah dengan kepercayaan rendah: {conf:.2f} < {conf_threshold}")
-                
-        return faces
-    
     # Identifikasi gambar bermasalah
     problem_images = []
     
@@ -194,133 +175,117 @@ def reprocess_problem_faces(database_dir="database",
             "error_count": 0
         }
     
+    # Gambar dideteksi YOLO per batch (DETECT_BATCH_SIZE), lalu crop wajah dari banyak gambar di-embed
+    # FaceNet dalam batch berukuran tetap (EMBED_BATCH_SIZE). Gambar yang deteksi mentahnya sudah ada di
+    # cache deteksi tidak dideteksi ulang: box difilter dengan batas kepercayaan baru, dan hanya wajah
+    # yang baru lolos batas yang di-embed
+    # Model diambil dari registry proses hanya jika ada gambar yang benar-benar perlu dideteksi / di-embed
+    face_batcher = FaceEnrollmentBatcher(get_yolo_model, get_face_embedder, confidence_threshold,
+                                         DetectionCache.for_detector(), detect_batch_size, embed_batch_size)
+    
     # Penghitung statistik
     reprocessed_count = 0
+    changed_persons = set()
+    puts = []
+    deletes = []
     success_count = 0
     error_count = 0
     
+    # Catat metadata hasil pemrosesan ulang satu gambar
+    def record_image_result(person_name, filename, image_hash, image_signature, face_confidences, face_count):
+        nonlocal reprocessed_count, success_count
+        # embedding_indices disesuaikan setelah perubahan diterapkan ke store
+        metadata[person_name][filename] = {
+            "hash": image_hash,
+            "stat": image_signature,
+            "embedding_indices": [],
+            "faces_detected": face_count,
+            "confidence_scores": face_confidences,
+            "reprocessed_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "confidence": confidence_threshold
+        }
+        print(f"  Berhasil: {person_name}/{filename} - Terdeteksi {face_count} wajah dengan batas kepercayaan {confidence_threshold}")
+        reprocessed_count += 1
+        success_count += 1
+    
+    # Catat error dalam metadata; embeddings lama gambar ini dihapus
+    def record_image_error(person_name, filename, image_hash, image_signature, error):
+        nonlocal error_count
+        print(f"  Error saat memproses {person_name}/{filename}: {error}")
+        deletes.append((person_name, filename))
+        metadata[person_name][filename] = {
+            "hash": image_hash,
+            "stat": image_signature,
+            "embedding_indices": [],
+            "faces_detected": 0,
+            "error": str(error),
+            "reprocessed_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "confidence": confidence_threshold
+        }
+        error_count += 1
+    
+    # Gambar yang selesai dideteksi dan di-embed: catat metadata lalu simpan embeddings-nya
+    def store_processed_images(completed):
+        for (person_name, filename, image_hash, image_signature), valid_embeddings, face_confidences, error in completed:
+            if error is not None:
+                record_image_error(person_name, filename, image_hash, image_signature, error)
+                continue
+            record_image_result(person_name, filename, image_hash, image_signature, face_confidences, len(valid_embeddings))
+            if embedding_cache is not None:
+                embedding_cache.put(image_hash, valid_embeddings, face_confidences)
+            puts.append((person_name, filename, valid_embeddings))
+    
     # Proses ulang gambar bermasalah - Tidak ada konfirmasi untuk web app
     print("\nMemproses ulang gambar bermasalah...")
     for idx, (person_name, filename, image_path, issue) in enumerate(problem_images):
         print(f"\n[{idx+1}/{len(problem_images)}] Memproses: {person_name}/{filename}")
         print(f"  Masalah: {issue}")
+        image_hash = image_signature = None
         
         try:
-            # Inisialisasi orang dalam kamus jika diperlukan
-            if person_name not in embeddings:
-                embeddings[person_name] = []
-                
+            # Inisialisasi orang dalam metadata jika diperlukan
             if person_name not in metadata:
                 metadata[person_name] = {}
             
-            # Dapatkan hash saat ini
-            image_hash = get_image_hash(image_path)
+            # Dapatkan hash dan tanda tangan stat saat ini
+            image_signature = file_signature(image_path)
+            image_hash = hash_file(image_path)
             
-            # Hapus embeddings yang ada untuk gambar ini jika ada
+            # Embeddings lama gambar ini akan diganti (atau dihapus jika pemrosesan gagal)
+            changed_persons.add(person_name)
             if filename in metadata[person_name] and "embedding_indices" in metadata[person_name][filename]:
-                # Dapatkan indeks embeddings yang ada
                 old_indices = metadata[person_name][filename]["embedding_indices"]
-                
-                # Nanti kita perlu memetakan ulang semua indeks untuk memperhitungkan embeddings yang dihapus
-                # Untuk sekarang, tandai saja sebagai None untuk disaring nanti
-                for idx in old_indices:
-                    if idx < len(embeddings[person_name]):
-                        embeddings[person_name][idx] = None
-                
-                print(f"  Menghapus {len(old_indices)} embeddings yang ada")
+                print(f"  Mengganti {len(old_indices)} embeddings yang ada")
             
-            # Proses gambar dengan batas kepercayaan baru
-            image = preprocess_image(image_path)
-            faces = detect_faces(image, confidence_threshold)
-            
-            # Hasilkan embeddings untuk wajah yang terdeteksi
-            valid_embeddings = []
-            for face in faces:
-                embedding = embedder.embeddings([face])[0]
-                valid_embeddings.append(embedding)
-            
-            # Simpan indeks di mana embeddings baru akan ditempatkan
-            new_indices = []
-            
-            # Tambahkan embeddings baru (menambahkan ke akhir)
-            for embedding in valid_embeddings:
-                embeddings[person_name].append(embedding)
-                new_indices.append(len(embeddings[person_name]) - 1)
+            # Gambar dengan isi sama yang sudah diproses dengan batas kepercayaan ini diambil dari cache
+            cached = embedding_cache.get(image_hash) if embedding_cache is not None else None
+            if cached is not None:
+                valid_embeddings, face_confidences = cached
+                print("  Menggunakan embeddings dari cache")
                 
-            # Perbarui metadata
-            metadata[person_name][filename] = {
-                "hash": image_hash,
-                "embedding_indices": new_indices,
-                "faces_detected": len(faces),
-                "reprocessed_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                "confidence": confidence_threshold
-            }
-            
-            print(f"  Berhasil: Terdeteksi {len(faces)} wajah dengan batas kepercayaan {confidence_threshold}")
-            reprocessed_count += 1
-            success_count += 1
-            
+                # Embeddings baru menggantikan embeddings lama gambar ini
+                puts.append((person_name, filename, valid_embeddings))
+                record_image_result(person_name, filename, image_hash, image_signature, face_confidences, len(valid_embeddings))
+                continue
         except Exception as e:
-            print(f"  Error saat memproses {image_path}: {e}")
-            
-            # Catat error dalam metadata
-            metadata[person_name][filename] = {
-                "hash": image_hash,
-                "embedding_indices": [],
-                "faces_detected": 0,
-                "error": str(e),
-                "reprocessed_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                "confidence": confidence_threshold
-            }
-            
-            error_count += 1
-    
-    # Bersihkan embeddings dengan menghapus nilai None dan memperbarui indeks
-    print("\nMembersihkan embeddings...")
-    new_embeddings = {}
-    new_metadata = {}
-    
-    for person_name, person_embeddings in embeddings.items():
-        # Buat pemetaan dari indeks lama ke indeks baru
-        old_to_new = {}
-        new_idx = 0
-        
-        # Filter nilai None dan bangun pemetaan indeks
-        filtered_embeddings = []
-        for old_idx, emb in enumerate(person_embeddings):
-            if emb is not None:
-                filtered_embeddings.append(emb)
-                old_to_new[old_idx] = new_idx
-                new_idx += 1
-        
-        # Simpan embeddings yang difilter
-        new_embeddings[person_name] = filtered_embeddings
+            record_image_error(person_name, filename, image_hash, image_signature, e)
+            continue
         
-        # Perbarui metadata dengan indeks baru
-        new_metadata[person_name] = {}
-        for filename, file_metadata in metadata[person_name].items():
-            new_file_metadata = file_metadata.copy()
-            
-            if "embedding_indices" in file_metadata:
-                # Petakan indeks lama ke indeks baru
-                new_indices = []
-                for idx in file_metadata["embedding_indices"]:
-                    if idx in old_to_new:
-                        new_indices.append(old_to_new[idx])
-                
-                new_file_metadata["embedding_indices"] = new_indices
-            
-            new_metadata[person_name][filename] = new_file_metadata
+        # Proses gambar dengan batas kepercayaan baru: filter dari cache deteksi, atau deteksi per batch YOLO;
+        # embedding per batch FaceNet
+        store_processed_images(face_batcher.add((person_name, filename, image_hash, image_signature), image_hash,
+                                                partial(preprocess_image, image_path)))
     
-    # Simpan embeddings dan metadata yang diperbarui langsung tanpa membuat cadangan
-    print("\nMenyimpan data yang diperbarui...")
+    # Proses sisa gambar dan crop yang belum mengisi satu batch penuh
+    store_processed_images(face_batcher.flush())
     
-    # Simpan file yang diperbarui
-    with open(embeddings_path, "wb") as f:
-        pickle.dump(new_embeddings, f)
+    # Terapkan perubahan ke store (hanya gambar yang diproses ulang) lalu simpan metadata
+    print("\nMenyimpan data yang diperbarui...")
+    apply_embedding_changes(embeddings_path, puts, deletes, metadata, previous_metadata=previous_metadata)
+    save_metadata(metadata_path, metadata)
     
-    with open(metadata_path, "wb") as f:
-        pickle.dump(new_metadata, f)
+    # Perbarui centroid per orang yang berubah, galeri ringkas, dan indeks ANN (hanya jika dipakai)
+    refresh_derived_files(embeddings_path, changed_persons)
     
     end_time = time.time()
     processing_time = end_time - start_time
@@ -333,6 +298,10 @@ def reprocess_problem_faces(database_dir="database",
     print(f"Gambar berhasil diproses ulang: {success_count}")
     print(f"Error selama pemrosesan ulang: {error_count}")
     print(f"Waktu pemrosesan: {processing_time:.2f} detik")
+    if embedding_cache is not None:
+        print(embedding_cache.summary())
+    print(face_batcher.summary())
+    prune_caches()
     print("\nFile yang diperbarui disimpan:")
     print(f"  {embeddings_path}")
     print(f"  {metadata_path}")
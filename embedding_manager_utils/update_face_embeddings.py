@@ -1,48 +1,56 @@
 import os
 import numpy as np
 import pickle
-from keras_facenet import FaceNet
-from ultralytics import YOLO
 from PIL import Image
-import cv2
 import time
 from datetime import datetime
-import hashlib
+import sys
+from functools import partial
+
+# Agar modul di root project bisa diimport saat skrip dijalankan langsung
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gallery import refresh_derived_files
+from embedding_store import embeddings_exist, load_embeddings, apply_embedding_changes, save_metadata, saved_person_count
+from embedding_cache import EmbeddingCache, DetectionCache, prune_caches
+from model_registry import get_yolo_model, get_face_embedder
+from face_batching import FaceEnrollmentBatcher
+from image_hashing import file_signature, hash_files, hash_algorithm_of, HASH_ALGORITHM
 
 # Fungsi utama untuk memperbarui embeddings wajah dari database foto
 def update_face_embeddings(database_dir="database", output_path="face_embeddings.pkl", 
-                          metadata_path="face_embeddings_metadata.pkl", confidence_threshold=0.6):
+                          metadata_path="face_embeddings_metadata.pkl", confidence_threshold=0.6,
+                          hash_workers=None, embed_batch_size=None, detect_batch_size=None):
  
     print(f"Starting update process at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     start_time = time.time()
     
-    # Inisialisasi model YOLO untuk deteksi wajah dan FaceNet untuk embeddings
-    yolo_model = YOLO("yolov8m-face.pt")
-    embedder = FaceNet()
+    # Cache embeddings berdasarkan isi gambar (rename / pindah foto tidak memanggil model)
+    embedding_cache = EmbeddingCache.for_confidence(confidence_threshold)
     
-    # Memuat embeddings dan metadata yang sudah ada jika tersedia
-    existing_embeddings = {}
+    # Memuat metadata yang sudah ada jika tersedia
+    # Embeddings tidak perlu dimuat: hanya gambar yang berubah yang ditulis ke store
     image_metadata = {}
+    metadata_loaded = False
     
-    if os.path.exists(output_path) and os.path.exists(metadata_path):
+    if embeddings_exist(output_path) and os.path.exists(metadata_path):
         try:
-            with open(output_path, "rb") as f:
-                existing_embeddings = pickle.load(f)
             with open(metadata_path, "rb") as f:
                 image_metadata = pickle.load(f)
-            print(f"Loaded existing embeddings with {len(existing_embeddings)} persons")
+            metadata_loaded = True
+            print(f"Loaded existing metadata with {len(image_metadata)} persons")
         except Exception as e:
             print(f"Error loading existing data: {e}")
             print("Starting with empty dictionaries")
     
-    # Inisialisasi dictionary baru untuk menyimpan data yang telah diperbarui
-    updated_embeddings = {}
+    # Metadata baru dan daftar perubahan embeddings per gambar
     updated_metadata = {}
+    puts = []
+    deletes = []
     
-    # Fungsi untuk menghitung hash MD5 dari file gambar
-    def get_image_hash(image_path):
-        with open(image_path, "rb") as f:
-            return hashlib.md5(f.read()).hexdigest()
+    # Tanpa metadata, asal embeddings lama tidak diketahui: hapus semua orang lalu proses ulang
+    if not metadata_loaded and embeddings_exist(output_path):
+        deletes.extend((person_name, None) for person_name in load_embeddings(output_path))
     
     # Fungsi untuk memproses gambar menjadi format yang siap untuk deteksi wajah
     def preprocess_image(image_path):
@@ -53,33 +61,60 @@ def update_face_embeddings(database_dir="database", output_path="face_embeddings
         except Exception as e:
             raise ValueError(f"Error loading image {image_path}: {e}")
     
-    # Fungsi untuk mendeteksi wajah dengan ambang batas kepercayaan
-    def detect_faces(image, conf_threshold=0.6):
-        results = yolo_model(image)
-        
-        # Mendapatkan koordinat bounding box dan skor kepercayaan
-        detections = results[0].boxes.xyxy.numpy()  # koordinat bounding box
-        confidences = results[0].boxes.conf.numpy()  # skor kepercayaan
-        
-        faces = []
-        # Loop melalui deteksi dan filter berdasarkan skor kepercayaan
-        for i, (box, conf) in enumerate(zip(detections, confidences)):
-            if conf >= conf_threshold:
-                x1, y1, x2, y2 = map(int, box)
-                face = image[y1:y2, x1:x2]  # crop wajah
-                face = cv2.resize(face, (160, 160))
-                faces.append(face)
-            else:
-                print(f"    Ignoring face detection with low confidence: {conf:.2f} < {conf_threshold}")
-                
-        return faces
+    # Embeddings gambar dengan isi yang sama (rename atau dipindah) hanya diambil dari cache, yang kuncinya
+    # memuat threshold dan detektor / embedder; baris lama di store bisa dibuat dengan parameter lain
+    def find_known_embeddings(image_hash):
+        return embedding_cache.get(image_hash) if embedding_cache is not None else None
+    
+    # Gambar dideteksi YOLO per batch (DETECT_BATCH_SIZE), lalu crop wajah dari banyak gambar di-embed
+    # FaceNet dalam batch berukuran tetap (EMBED_BATCH_SIZE). Deteksi mentah hingga DETECTION_FLOOR disimpan
+    # per isi gambar, sehingga gambar yang pernah dideteksi hanya difilter dengan threshold ini
+    # Model diambil dari registry proses saat benar-benar dibutuhkan (tidak dimuat ulang per update)
+    face_batcher = FaceEnrollmentBatcher(get_yolo_model, get_face_embedder, confidence_threshold,
+                                         DetectionCache.for_detector(), detect_batch_size, embed_batch_size)
+    
+    # Mencatat gambar yang gagal diproses: embeddings lamanya dihapus dan error masuk metadata
+    def record_image_error(person_name, image_filename, image_hash, image_signature, error):
+        print(f"  Error processing {person_name}/{image_filename}: {error}")
+        changed_persons.add(person_name)
+        deletes.append((person_name, image_filename))
+        updated_metadata[person_name][image_filename] = {
+            "hash": image_hash,
+            "stat": image_signature,
+            "embedding_indices": [],
+            "faces_detected": 0,
+            "error": str(error)
+        }
+    
+    # Mencatat hasil deteksi dan menyimpan embeddings gambar yang seluruh wajahnya sudah di-embed
+    def store_processed_images(completed):
+        nonlocal new_images_processed
+        for (person_name, image_filename, image_hash, image_signature), image_embeddings, face_confidences, error in completed:
+            if error is not None:
+                record_image_error(person_name, image_filename, image_hash, image_signature, error)
+                continue
+            
+            print(f"  Processed: {person_name}/{image_filename} - Found {len(image_embeddings)} faces")
+            # (embedding_indices disesuaikan setelah perubahan diterapkan ke store)
+            updated_metadata[person_name][image_filename] = {
+                "hash": image_hash,
+                "stat": image_signature,
+                "embedding_indices": [],
+                "faces_detected": len(image_embeddings),  # Menambahkan info jumlah wajah
+                "confidence_scores": face_confidences
+            }
+            new_images_processed += len(image_embeddings)
+            if embedding_cache is not None:
+                embedding_cache.put(image_hash, image_embeddings, face_confidences)
+            puts.append((person_name, image_filename, image_embeddings))
     
     # Statistik
     new_images_processed = 0
     retained_embeddings = 0
+    cached_embeddings = 0
     
-    # Melacak embeddings mana dari data yang ada yang sedang dipertahankan
-    retained_embedding_tracker = {person: set() for person in existing_embeddings}
+    # Melacak orang yang embeddings-nya berubah agar hanya centroid mereka yang dihitung ulang
+    changed_persons = set()
     
     # Memindai struktur database saat ini
     current_db_files = {}
@@ -101,39 +136,61 @@ def update_face_embeddings(database_dir="database", output_path="face_embeddings
             full_path = os.path.join(person_path, img_file)
             current_db_files[person_name].append(full_path)
     
+    # Deteksi perubahan cepat: file dengan (inode, ukuran, mtime_ns) yang sama dengan metadata
+    # tidak dibaca ulang. File yang di-rename / dipindah tetap punya inode yang sama.
+    hash_start = time.time()
+    known_signatures = {}
+    for person_metadata in image_metadata.values():
+        for info in person_metadata.values():
+            if isinstance(info, dict) and info.get("stat") and info.get("hash"):
+                known_signatures[tuple(info["stat"])] = info["hash"]
+    
+    image_signatures = {}
+    image_hashes = {}
+    hash_jobs = []
+    for person_name, image_paths in current_db_files.items():
+        for image_path in image_paths:
+            signature = file_signature(image_path)
+            image_signatures[image_path] = signature
+            old_info = image_metadata.get(person_name, {}).get(os.path.basename(image_path))
+            
+            if isinstance(old_info, dict) and old_info.get("stat") and tuple(old_info["stat"]) == signature:
+                image_hashes[image_path] = old_info["hash"]
+            elif old_info is None and signature in known_signatures:
+                image_hashes[image_path] = known_signatures[signature]
+            elif isinstance(old_info, dict) and old_info.get("hash") and not old_info.get("stat"):
+                # Metadata lama tanpa stat: hash dengan algoritma yang sama (md5) agar bisa dibandingkan
+                hash_jobs.append((image_path, hash_algorithm_of(old_info["hash"])))
+            else:
+                hash_jobs.append((image_path, HASH_ALGORITHM))
+    
+    image_hashes.update(hash_files(hash_jobs, hash_workers))
+    print(f"Change detection: {len(image_signatures)} images, {len(hash_jobs)} hashed "
+          f"in {time.time() - hash_start:.2f} seconds")
+    
     # Memproses direktori setiap orang
     for person_name, image_paths in current_db_files.items():
         print(f"\nProcessing person: {person_name}")
         print(f"Using confidence threshold: {confidence_threshold}")
         
-        # Inisialisasi orang dalam dictionary yang diperbarui
-        if person_name not in updated_embeddings:
-            updated_embeddings[person_name] = []
+        # Inisialisasi orang dalam metadata yang diperbarui
+        if person_name not in updated_metadata:
             updated_metadata[person_name] = {}
         
         # Memproses setiap gambar
         for image_path in image_paths:
             image_filename = os.path.basename(image_path)
-            image_hash = get_image_hash(image_path)
+            image_hash = image_hashes[image_path]
+            image_signature = image_signatures[image_path]
             
             # Cek apakah kita sudah memproses gambar yang sama persis ini
             if (person_name in image_metadata and 
                 image_filename in image_metadata[person_name] and 
                 image_metadata[person_name][image_filename]["hash"] == image_hash):
                 
-                # Gambar sudah diproses, ambil embeddings
+                # Gambar sudah diproses, embeddings-nya tetap di store
                 embedding_indices = image_metadata[person_name][image_filename]["embedding_indices"]
-                
-                # Melacak embeddings asli mana yang kita pertahankan
-                if person_name in retained_embedding_tracker:
-                    for idx in embedding_indices:
-                        retained_embedding_tracker[person_name].add(idx)
-                
-                # Menyalin embeddings yang ada ke dictionary yang diperbarui
-                for idx in embedding_indices:
-                    if idx < len(existing_embeddings[person_name]):
-                        updated_embeddings[person_name].append(existing_embeddings[person_name][idx])
-                        retained_embeddings += 1
+                retained_embeddings += len(embedding_indices)
                 
                 # Menyalin metadata tambahan dari yang asli jika ada
                 additional_metadata = {}
@@ -142,19 +199,15 @@ def update_face_embeddings(database_dir="database", output_path="face_embeddings
                     isinstance(image_metadata[person_name][image_filename], dict)):
                     # Menyalin metadata tambahan seperti faces_detected (jika ada)
                     for key, value in image_metadata[person_name][image_filename].items():
-                        if key not in ["hash", "embedding_indices"]:
+                        if key not in ["hash", "embedding_indices", "stat"]:
                             additional_metadata[key] = value
 
-                # Memperbarui metadata
-                new_indices = list(range(
-                    len(updated_embeddings[person_name]) - len(embedding_indices),
-                    len(updated_embeddings[person_name])
-                ))
-                
                 # Menggabungkan metadata dasar dengan tambahan
+                # (embedding_indices disesuaikan setelah perubahan diterapkan ke store)
                 metadata_entry = {
                     "hash": image_hash,
-                    "embedding_indices": new_indices
+                    "stat": image_signature,
+                    "embedding_indices": embedding_indices
                 }
                 metadata_entry.update(additional_metadata)  # Menambahkan metadata tambahan jika ada
                 updated_metadata[person_name][image_filename] = metadata_entry
@@ -162,64 +215,63 @@ def update_face_embeddings(database_dir="database", output_path="face_embeddings
                 print(f"  Reusing embeddings for: {image_filename}")
                 
             else:
-                # Gambar baru atau yang dimodifikasi, proses itu
+                # Gambar baru, dimodifikasi, di-rename, atau dipindah
                 try:
-                    # Proses dan deteksi wajah dengan ambang batas kepercayaan
-                    image = preprocess_image(image_path)
-                    faces = detect_faces(image, conf_threshold=confidence_threshold)
-                    
-                    # Mencatat indeks awal untuk embeddings baru ini
-                    start_idx = len(updated_embeddings[person_name])
-                    
-                    # Menghasilkan embeddings untuk setiap wajah yang terdeteksi
-                    for face in faces:
-                        embedding = embedder.embeddings([face])[0]
-                        updated_embeddings[person_name].append(embedding)
-                        new_images_processed += 1
-                    
-                    # Memperbarui metadata
-                    end_idx = len(updated_embeddings[person_name])
-                    new_indices = list(range(start_idx, end_idx))
-                    updated_metadata[person_name][image_filename] = {
-                        "hash": image_hash,
-                        "embedding_indices": new_indices,
-                        "faces_detected": len(faces)  # Menambahkan info jumlah wajah
-                    }
-                    
-                    print(f"  Processed: {image_filename} - Found {len(faces)} faces")
+                    changed_persons.add(person_name)
+                    known = find_known_embeddings(image_hash)
                     
+                    if known is not None:
+                        # Isi gambar sudah pernah diproses dengan threshold dan model yang sama
+                        image_embeddings, face_confidences = known
+                        cached_embeddings += len(image_embeddings)
+                        print(f"  Cached: {image_filename} - {len(image_embeddings)} faces")
+                        
+                        # Embeddings gambar ini menggantikan embeddings lamanya (jika ada)
+                        puts.append((person_name, image_filename, image_embeddings))
+                        updated_metadata[person_name][image_filename] = {
+                            "hash": image_hash,
+                            "stat": image_signature,
+                            "embedding_indices": [],
+                            "faces_detected": len(image_embeddings),  # Menambahkan info jumlah wajah
+                            "confidence_scores": face_confidences
+                        }
+                        continue
                 except Exception as e:
-                    print(f"  Error processing {image_path}: {e}")
-                    # Mencatat error dalam metadata
-                    updated_metadata[person_name][image_filename] = {
-                        "hash": image_hash,
-                        "embedding_indices": [],
-                        "faces_detected": 0,
-                        "error": str(e)
-                    }
+                    record_image_error(person_name, image_filename, image_hash, image_signature, e)
+                    continue
+                
+                # Gambar diantrikan ke YOLO (atau difilter dari cache deteksi); deteksi dan embedding per batch
+                # Gambar hanya dibaca jika deteksinya belum ada di cache
+                store_processed_images(face_batcher.add(
+                    (person_name, image_filename, image_hash, image_signature), image_hash,
+                    partial(preprocess_image, image_path)))
+    
+    # Proses sisa gambar dan crop yang belum mengisi satu batch penuh
+    store_processed_images(face_batcher.flush())
     
-    # Menghitung berapa banyak embeddings yang dihapus
+    # Menghitung berapa banyak embeddings yang dihapus: gambar lama yang tidak dipertahankan
     deleted_embeddings = 0
-    for person_name in existing_embeddings:
-        # Menghitung total embeddings asli untuk orang ini
-        original_count = len(existing_embeddings[person_name])
-        
-        # Menghitung embeddings yang dipertahankan untuk orang ini
-        if person_name in retained_embedding_tracker:
-            retained_count = len(retained_embedding_tracker[person_name])
-        else:
-            retained_count = 0
-            
-        # Perbedaannya adalah jumlah embeddings yang dihapus untuk orang ini
-        person_deleted = original_count - retained_count
-        deleted_embeddings += person_deleted
+    for person_name, person_metadata in image_metadata.items():
+        if person_name not in current_db_files:
+            deletes.append((person_name, None))
+        for image_filename, info in person_metadata.items():
+            if image_filename in updated_metadata.get(person_name, {}) and \
+                    updated_metadata[person_name][image_filename]["hash"] == info.get("hash"):
+                continue
+            if person_name in current_db_files and image_filename not in updated_metadata.get(person_name, {}):
+                deletes.append((person_name, image_filename))
+            person_deleted = len(info.get("embedding_indices", []))
+            deleted_embeddings += person_deleted
+            if person_deleted:
+                changed_persons.add(person_name)
     
-    # Menyimpan embeddings dan metadata yang diperbarui
-    with open(output_path, "wb") as f:
-        pickle.dump(updated_embeddings, f)
+    # Menerapkan perubahan ke store (hanya gambar yang berubah) lalu menyimpan metadata
+    apply_embedding_changes(output_path, puts, deletes, updated_metadata, previous_metadata=image_metadata)
+    save_metadata(metadata_path, updated_metadata)
     
-    with open(metadata_path, "wb") as f:
-        pickle.dump(updated_metadata, f)
+    # Perbarui centroid per orang yang berubah, galeri ringkas, dan indeks ANN (hanya jika dipakai)
+    refresh_derived_files(output_path, changed_persons)
+    total_persons = saved_person_count(output_path)
     
     end_time = time.time()
     processing_time = end_time - start_time
@@ -228,20 +280,26 @@ def update_face_embeddings(database_dir="database", output_path="face_embeddings
     print("\n" + "=" * 50)
     print("UPDATE SUMMARY")
     print("=" * 50)
-    print(f"Total persons in database: {len(updated_embeddings)}")
+    print(f"Total persons in database: {total_persons}")
     print(f"New embeddings processed: {new_images_processed}")
     print(f"Retained embeddings: {retained_embeddings}")
+    print(f"Embeddings reused by image content: {cached_embeddings}")
     print(f"Removed embeddings: {deleted_embeddings}")
     print(f"Processing time: {processing_time:.2f} seconds")
+    if embedding_cache is not None:
+        print(embedding_cache.summary())
+    print(face_batcher.summary())
+    prune_caches()
     print("=" * 50)
     print(f"Updated embeddings saved to {output_path}")
     print(f"Metadata saved to {metadata_path}")
     
     # Mengembalikan statistik
     return {
-        "total_persons": len(updated_embeddings),
+        "total_persons": total_persons,
         "new_embeddings": new_images_processed,
         "retained_embeddings": retained_embeddings,
+        "cached_embeddings": cached_embeddings,
         "removed_embeddings": deleted_embeddings
     }
 
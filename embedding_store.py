@@ -0,0 +1,616 @@
+import os
+import json
+import glob
+import shutil
+import pickle
+import uuid
+import threading
+from contextlib import contextmanager
+import numpy as np
+import embedding_log
+from env_settings import env_float
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Format penyimpanan embeddings: "columnar" (direktori .npy + tabel, di-mmap) atau "pickle" (format lama)
+EMBEDDING_FORMATS = ("columnar", "pickle")
+DEFAULT_EMBEDDING_FORMAT = "columnar"
+
+STORE_FORMAT_NAME = "face-embeddings-columnar"
+STORE_VERSION = 2
+SUPPORTED_STORE_VERSIONS = (1, 2)
+HEADER_FILENAME = "header.json"
+LOCK_FILENAME = "store.lock"
+
+# Embedding lama yang belum diketahui asal gambarnya (store versi 1 / pickle tanpa metadata)
+UNATTRIBUTED_IMAGE = ""
+
+# Kompaksi log dijalankan jika ukuran log melebihi rasio ini terhadap ukuran matriks dasar
+DEFAULT_COMPACT_RATIO = 0.25
+COMPACT_MIN_LOG_BYTES = 1 << 20
+
+# Membaca format penyimpanan embeddings dari environment
+def embedding_format():
+    fmt = os.environ.get("EMBEDDING_FORMAT", DEFAULT_EMBEDDING_FORMAT).lower()
+    if fmt not in EMBEDDING_FORMATS:
+        print(f"Warning: EMBEDDING_FORMAT {fmt} tidak dikenal. Menggunakan default: {DEFAULT_EMBEDDING_FORMAT}")
+        fmt = DEFAULT_EMBEDDING_FORMAT
+    return fmt
+
+# Membaca rasio kompaksi log dari environment
+def compact_ratio():
+    return env_float("EMBEDDING_LOG_COMPACT_RATIO", DEFAULT_COMPACT_RATIO, minimum=0.0)
+
+# Normalisasi L2 per baris, vektor nol dibiarkan nol agar skornya 0
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1) if matrix.size else matrix.reshape(0, 0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+# Direktori store columnar untuk path embeddings (face_embeddings.pkl -> face_embeddings_store)
+def store_path_for(embeddings_path):
+    if os.path.isdir(embeddings_path):
+        return embeddings_path
+    return os.path.splitext(embeddings_path)[0] + "_store"
+
+# Path pickle lama untuk path embeddings (path direktori store tidak punya pasangan pickle)
+def pickle_path_for(embeddings_path):
+    return embeddings_path
+
+def fsync_write(path, write_fn, mode="wb"):
+    with open(path, mode) as f:
+        write_fn(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+# Satu penulis per store: thread lock di dalam proses ini ditambah lock file di direktori store, karena
+# admin Flask dan skrip update / reprocess / rebuild adalah proses terpisah yang menulis store yang sama.
+# Append log, kompaksi, dan penggantian generasi tidak pernah berjalan bersamaan.
+store_locks = {}
+store_locks_lock = threading.Lock()
+
+def lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    # Windows: LK_LOCK menyerah setelah sekitar 10 detik, ulangi sampai lock didapat
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+def unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def store_lock(store_path):
+    key = os.path.abspath(store_path)
+    with store_locks_lock:
+        thread_lock = store_locks.setdefault(key, threading.Lock())
+    with thread_lock:
+        os.makedirs(store_path, exist_ok=True)
+        with open(os.path.join(store_path, LOCK_FILENAME), "a+b") as f:
+            lock_file(f)
+            try:
+                yield
+            finally:
+                unlock_file(f)
+
+# Layout embeddings: {nama: {nama_gambar: matriks (baris x dim)}}, urutan dict = urutan baris di galeri.
+# "put" mengganti embedding gambar di posisinya, gambar / orang baru ditambahkan di akhir.
+def apply_record(layout, record):
+    """Menerapkan satu record log ke layout; mengembalikan False jika record tidak mengubah apa pun"""
+    person_name = record["person"]
+    op = record["op"]
+    if op == "put":
+        layout.setdefault(person_name, {})[record["image"]] = record["vectors"]
+        return True
+    if op == "delete":
+        images = layout.get(person_name)
+        if images is None or record["image"] not in images:
+            return False
+        del images[record["image"]]
+        return True
+    if op == "delete_person":
+        return layout.pop(person_name, None) is not None
+    raise ValueError(f"Operasi log tidak dikenal: {op}")
+
+def layout_from_embeddings(embeddings):
+    layout = {}
+    for person_name, embeddings_list in embeddings.items():
+        valid = [e for e in embeddings_list if e is not None]
+        layout[person_name] = {UNATTRIBUTED_IMAGE: normalize_rows(np.stack(valid))} if valid else {}
+    return layout
+
+def has_unattributed(layout):
+    return any(UNATTRIBUTED_IMAGE in images for images in layout.values())
+
+# Memecah baris tanpa asal gambar menurut embedding_indices di metadata.
+# Baris yang tidak dirujuk metadata mana pun tidak lagi terjangkau dan dibuang.
+def attribute_rows(layout, metadata):
+    for person_name, images in layout.items():
+        if UNATTRIBUTED_IMAGE not in images:
+            continue
+        rows = images.pop(UNATTRIBUTED_IMAGE)
+        for image_name, info in metadata.get(person_name, {}).items():
+            if not isinstance(info, dict):
+                continue
+            indices = [idx for idx in info.get("embedding_indices", []) if idx < len(rows)]
+            if indices and image_name not in images:
+                images[image_name] = rows[indices]
+
+# Indeks embedding per gambar sesuai urutan baris layout: {nama: {nama_gambar: [indeks, ...]}}
+def layout_indices(layout):
+    indices = {}
+    for person_name, images in layout.items():
+        offset = 0
+        indices[person_name] = {}
+        for image_name, rows in images.items():
+            indices[person_name][image_name] = list(range(offset, offset + len(rows)))
+            offset += len(rows)
+    return indices
+
+# Menulis ulang embedding_indices di metadata agar sesuai dengan layout yang tersimpan
+def set_embedding_indices(metadata, layout):
+    indices = layout_indices(layout)
+    for person_name, person_metadata in metadata.items():
+        for image_name, info in person_metadata.items():
+            if isinstance(info, dict):
+                info["embedding_indices"] = indices.get(person_name, {}).get(image_name, [])
+
+def layout_to_dict(layout):
+    return {person_name: [row for rows in images.values() for row in rows] for person_name, images in layout.items()}
+
+class EmbeddingStore:
+    """Store embeddings columnar yang dibuka read-only lewat memory map.
+
+    Isi direktori store:
+      header.json            header kecil: versi, generasi, dim, jumlah baris, nama file aktif
+      embeddings-<gen>.npy   matriks dasar float32 (jumlah embedding x dim), baris sudah dinormalisasi L2
+      persons-<gen>.json     tabel orang: [{"name", "offset", "count", "images": [[gambar, jumlah], ...]}, ...]
+      log-<gen>.bin          log append-only perubahan per gambar sejak generasi ini (lihat embedding_log)
+      store.lock             lock file penulis (append log / kompaksi) lintas proses
+
+    Baris milik satu orang selalu berurutan, dikelompokkan per gambar. Header
+    ditulis terakhir dan diganti secara atomik sehingga pembaca tidak pernah
+    melihat store yang setengah jadi; record log yang belum lengkap diabaikan.
+    Selama log kosong, matriks galeri adalah mmap dasar tanpa salinan.
+    """
+
+    def __init__(self, path, header, base, layout, log_records=0, log_size=0):
+        self.path = path
+        self.header = header
+        self.base = base
+        self.layout = layout
+        self.log_records = log_records
+        self.log_size = log_size
+        self._matrix = base if log_records == 0 else None
+
+    @classmethod
+    def open(cls, path, attempts=3):
+        # Kompaksi bisa menghapus file generasi lama di antara membaca header dan membuka file
+        for attempt in range(attempts):
+            try:
+                return cls._open(path)
+            except FileNotFoundError:
+                if attempt == attempts - 1:
+                    raise
+
+    @classmethod
+    def _open(cls, path):
+        with open(os.path.join(path, HEADER_FILENAME)) as f:
+            header = json.load(f)
+        if header.get("format") != STORE_FORMAT_NAME or header.get("version") not in SUPPORTED_STORE_VERSIONS:
+            raise ValueError(f"Format store tidak dikenal di {path}: {header.get('format')} v{header.get('version')}")
+
+        with open(os.path.join(path, header["table"])) as f:
+            persons = json.load(f)
+
+        if header["count"]:
+            base = np.load(os.path.join(path, header["matrix"]), mmap_mode="r")
+        else:
+            base = np.zeros((0, header["dim"]), dtype=np.float32)
+
+        layout = {}
+        for person in persons:
+            images = layout[person["name"]] = {}
+            offset = person["offset"]
+            for image_name, count in person.get("images", [[UNATTRIBUTED_IMAGE, person["count"]]]):
+                if count:
+                    images[image_name] = base[offset:offset + count]
+                offset += count
+
+        log_records, log_size = [], 0
+        if header.get("log"):
+            log_path = os.path.join(path, header["log"])
+            if not os.path.exists(log_path):
+                raise FileNotFoundError(log_path)
+            log_records, log_size = embedding_log.read_records(log_path)
+            for record in log_records:
+                apply_record(layout, record)
+
+        return cls(path, header, base, layout, len(log_records), log_size)
+
+    @property
+    def matrix(self):
+        if self._matrix is None:
+            blocks = [rows for images in self.layout.values() for rows in images.values() if len(rows)]
+            self._matrix = np.concatenate(blocks).astype(np.float32, copy=False) if blocks else \
+                np.zeros((0, self.header["dim"]), dtype=np.float32)
+        return self._matrix
+
+    def __len__(self):
+        return sum(len(rows) for images in self.layout.values() for rows in images.values())
+
+    @property
+    def generation(self):
+        return self.header["generation"]
+
+    # Versi isi store: id store (baru di setiap tulis ulang penuh) + jumlah perubahan sejak itu.
+    # Kompaksi tidak mengubah isi sehingga versinya tetap; setiap record log menaikkannya.
+    @property
+    def revision(self):
+        return self.header.get("revision", 0) + self.log_records
+
+    @property
+    def content_version(self):
+        store_id = self.header.get("store_id") or f"generation-{self.generation}"
+        return f"{store_id}-{self.revision}"
+
+    @property
+    def log_path(self):
+        return os.path.join(self.path, self.header["log"]) if self.header.get("log") else None
+
+    @property
+    def names(self):
+        return list(self.layout)
+
+    def person_counts(self):
+        return [(person_name, sum(len(rows) for rows in images.values())) for person_name, images in self.layout.items()]
+
+    def to_dict(self):
+        """Dictionary {nama: [np.ndarray, ...]} seperti pickle lama; setiap vektor adalah view read-only ke matriks"""
+        matrix = self.matrix
+        embeddings = {}
+        offset = 0
+        for person_name, count in self.person_counts():
+            embeddings[person_name] = [matrix[row] for row in range(offset, offset + count)]
+            offset += count
+        return embeddings
+
+# Menulis layout ke store columnar (generasi baru dengan log kosong, lalu header diganti secara atomik)
+# Kompaksi meneruskan store_id dan revision lama karena isinya tidak berubah; tulis ulang penuh mendapat id baru
+def write_store(path, layout, store_id=None, revision=0):
+    os.makedirs(path, exist_ok=True)
+
+    generation = 1
+    header_path = os.path.join(path, HEADER_FILENAME)
+    if os.path.exists(header_path):
+        try:
+            with open(header_path) as f:
+                generation = json.load(f)["generation"] + 1
+        except Exception:
+            pass
+
+    persons = []
+    blocks = []
+    offset = 0
+    for person_name, images in layout.items():
+        image_counts = [[image_name, len(rows)] for image_name, rows in images.items() if len(rows)]
+        count = sum(c for _, c in image_counts)
+        persons.append({"name": person_name, "offset": offset, "count": count, "images": image_counts})
+        blocks.extend(rows for rows in images.values() if len(rows))
+        offset += count
+
+    matrix = np.ascontiguousarray(np.concatenate(blocks), dtype=np.float32) if blocks else np.zeros((0, 0), dtype=np.float32)
+    matrix_name = f"embeddings-{generation}.npy"
+    table_name = f"persons-{generation}.json"
+    log_name = f"log-{generation}.bin"
+
+    fsync_write(os.path.join(path, matrix_name + ".tmp"), lambda f: np.save(f, matrix))
+    os.replace(os.path.join(path, matrix_name + ".tmp"), os.path.join(path, matrix_name))
+    fsync_write(os.path.join(path, table_name + ".tmp"), lambda f: json.dump(persons, f, ensure_ascii=False), mode="w")
+    os.replace(os.path.join(path, table_name + ".tmp"), os.path.join(path, table_name))
+    embedding_log.create_segment(os.path.join(path, log_name))
+
+    header = {
+        "format": STORE_FORMAT_NAME,
+        "version": STORE_VERSION,
+        "generation": generation,
+        "dim": int(matrix.shape[1]),
+        "dtype": "float32",
+        "normalized": True,
+        "count": int(matrix.shape[0]),
+        "persons": len(persons),
+        "store_id": store_id or uuid.uuid4().hex,
+        "revision": revision,
+        "matrix": matrix_name,
+        "table": table_name,
+        "log": log_name
+    }
+    fsync_write(header_path + ".tmp", lambda f: json.dump(header, f, indent=2), mode="w")
+    os.replace(header_path + ".tmp", header_path)
+
+    remove_old_generations(path, generation)
+    return header
+
+# Menghapus file generasi lama; di Linux pembaca yang masih me-mmap file lama tetap aman
+def remove_old_generations(path, current_generation):
+    for pattern in ("embeddings-*.npy", "persons-*.json", "log-*.bin"):
+        for file_path in glob.glob(os.path.join(path, pattern)):
+            name = os.path.basename(file_path)
+            generation = name.split("-", 1)[1].split(".", 1)[0]
+            if generation.isdigit() and int(generation) < current_generation:
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    # Windows tidak mengizinkan hapus file yang sedang di-mmap, coba lagi di penulisan berikutnya
+                    pass
+
+def store_exists(embeddings_path):
+    return os.path.exists(os.path.join(store_path_for(embeddings_path), HEADER_FILENAME))
+
+# Membuka store untuk path embeddings, None jika format aktif bukan columnar atau store belum ada
+def open_store(embeddings_path):
+    if resolved_format(embeddings_path) != "columnar":
+        return None
+    return EmbeddingStore.open(store_path_for(embeddings_path))
+
+# Format yang benar-benar dipakai: format aktif jika filenya ada, jika tidak format lain yang tersedia
+def resolved_format(embeddings_path):
+    fmt = embedding_format()
+    has_store = store_exists(embeddings_path)
+    has_pickle = os.path.isfile(pickle_path_for(embeddings_path))
+    if fmt == "columnar" and (has_store or not has_pickle):
+        return "columnar" if has_store else None
+    if fmt == "pickle" and (has_pickle or not has_store):
+        return "pickle" if has_pickle else None
+    return "pickle" if has_pickle else "columnar"
+
+def embeddings_exist(embeddings_path):
+    return resolved_format(embeddings_path) is not None
+
+# File yang menandai versi embeddings saat ini (header + log store, atau file pickle), untuk cek perubahan
+def embeddings_marker_paths(embeddings_path):
+    if resolved_format(embeddings_path) != "columnar":
+        return [pickle_path_for(embeddings_path)]
+    store_path = store_path_for(embeddings_path)
+    header_path = os.path.join(store_path, HEADER_FILENAME)
+    try:
+        with open(header_path) as f:
+            log_name = json.load(f).get("log")
+    except (OSError, ValueError):
+        log_name = None
+    return [header_path] + ([os.path.join(store_path, log_name)] if log_name else [])
+
+def embeddings_mtime(embeddings_path):
+    mtimes = [os.path.getmtime(p) for p in embeddings_marker_paths(embeddings_path) if os.path.exists(p)]
+    return max(mtimes) if mtimes else None
+
+# Membaca dictionary embeddings {nama: [np.ndarray, ...]} dari store columnar atau pickle lama
+def load_embeddings(embeddings_path):
+    fmt = resolved_format(embeddings_path)
+    if fmt is None:
+        print(f"Warning: Embedding file {embeddings_path} tidak ditemukan!")
+        return {}
+    if fmt == "columnar":
+        store_path = store_path_for(embeddings_path)
+        print(f"Loading embeddings from {store_path}")
+        return EmbeddingStore.open(store_path).to_dict()
+
+    pickle_path = pickle_path_for(embeddings_path)
+    print(f"Loading embeddings from {pickle_path}")
+    with open(pickle_path, "rb") as f:
+        return pickle.load(f)
+
+# Embeddings tersimpan untuk sebagian orang {nama: [np.ndarray, ...]}; orang yang tidak ada bernilai []
+# Store columnar hanya membaca baris orang-orang tersebut dari mmap, bukan seluruh matriks
+def load_person_embeddings(embeddings_path, person_names):
+    store = open_store(embeddings_path)
+    if store is None:
+        embeddings = load_embeddings(embeddings_path)
+        return {person_name: embeddings.get(person_name, []) for person_name in person_names}
+    return {person_name: [row for rows in store.layout.get(person_name, {}).values() for row in rows]
+            for person_name in person_names}
+
+# Jumlah orang di embeddings tersimpan (store columnar cukup membaca tabel orang)
+def saved_person_count(embeddings_path):
+    store = open_store(embeddings_path)
+    if store is None:
+        return len(load_embeddings(embeddings_path))
+    return len(store.names)
+
+# Menyimpan layout secara penuh sesuai EMBEDDING_FORMAT
+def write_layout(embeddings_path, layout):
+    if embedding_format() == "columnar":
+        store_path = store_path_for(embeddings_path)
+        with store_lock(store_path):
+            write_store(store_path, layout)
+    else:
+        pickle_path = pickle_path_for(embeddings_path)
+        embeddings = layout_to_dict(layout)
+        fsync_write(pickle_path + ".tmp", lambda f: pickle.dump(embeddings, f))
+        os.replace(pickle_path + ".tmp", pickle_path)
+
+# Menyimpan seluruh dictionary embeddings (dipakai saat rebuild total)
+# Jika metadata diberikan, baris dikelompokkan per gambar dan embedding_indices di metadata disesuaikan
+def save_embeddings(embeddings_path, embeddings, metadata=None):
+    layout = layout_from_embeddings(embeddings)
+    if metadata is not None:
+        attribute_rows(layout, metadata)
+        set_embedding_indices(metadata, layout)
+    write_layout(embeddings_path, layout)
+
+# Menyimpan metadata gambar secara atomik
+def save_metadata(metadata_path, metadata):
+    fsync_write(metadata_path + ".tmp", lambda f: pickle.dump(metadata, f))
+    os.replace(metadata_path + ".tmp", metadata_path)
+
+def change_records(puts, deletes):
+    records = []
+    for person_name, image_name in deletes:
+        if image_name is None:
+            records.append({"op": "delete_person", "person": person_name, "image": None})
+        else:
+            records.append({"op": "delete", "person": person_name, "image": image_name})
+    for person_name, image_name, vectors in puts:
+        valid = [v for v in vectors if v is not None]
+        if valid:
+            records.append({"op": "put", "person": person_name, "image": image_name,
+                            "vectors": normalize_rows(np.stack(valid))})
+        else:
+            records.append({"op": "delete", "person": person_name, "image": image_name})
+    return records
+
+def apply_embedding_changes(embeddings_path, puts=(), deletes=(), metadata=None, previous_metadata=None):
+    """Menerapkan perubahan embeddings per gambar.
+
+    puts: [(nama, nama_gambar, [embedding, ...])] mengganti embedding gambar tersebut.
+    deletes: [(nama, nama_gambar)] menghapus gambar; nama_gambar None menghapus orangnya.
+
+    Pada store columnar perubahan ditambahkan ke log (biaya sebanding dengan perubahan,
+    bukan ukuran galeri). Pickle lama dan store versi 1 ditulis ulang penuh; baris lamanya
+    dipetakan ke gambar memakai embedding_indices di previous_metadata. Jika metadata
+    diberikan, embedding_indices-nya disesuaikan dengan urutan baris yang tersimpan.
+    Mengembalikan jumlah record yang ditulis ke log (0 jika ditulis ulang penuh).
+    """
+    records = change_records(puts, deletes)
+    appended = 0
+
+    if embedding_format() == "columnar" and store_exists(embeddings_path):
+        store_path = store_path_for(embeddings_path)
+        with store_lock(store_path):
+            store = EmbeddingStore.open(store_path)
+            layout = store.layout
+            if store.log_path is None or has_unattributed(layout):
+                if previous_metadata is not None:
+                    attribute_rows(layout, previous_metadata)
+                for record in records:
+                    apply_record(layout, record)
+                write_store(store_path, layout)
+            else:
+                # Record yang tidak mengubah apa pun (misal hapus gambar yang tidak punya embedding) tidak ditulis
+                changed = [record for record in records if apply_record(layout, record)]
+                if changed:
+                    embedding_log.append_records(store.log_path, [
+                        embedding_log.encode_record(r["op"], r["person"], r["image"], r.get("vectors"))
+                        for r in changed
+                    ], valid_size=store.log_size)
+                appended = len(changed)
+    else:
+        layout = layout_from_embeddings(load_embeddings(embeddings_path))
+        if previous_metadata is not None:
+            attribute_rows(layout, previous_metadata)
+        for record in records:
+            apply_record(layout, record)
+        write_layout(embeddings_path, layout)
+
+    if metadata is not None:
+        set_embedding_indices(metadata, layout)
+    if appended:
+        compact_in_background(embeddings_path)
+    return appended
+
+def should_compact(store):
+    base_bytes = store.base.nbytes
+    return store.log_records > 0 and store.log_size > max(COMPACT_MIN_LOG_BYTES, compact_ratio() * base_bytes)
+
+# Melipat log ke matriks dasar generasi baru; pembaca lama tetap memegang generasi sebelumnya
+def compact_store(embeddings_path, force=False):
+    store_path = store_path_for(embeddings_path)
+    if not store_exists(embeddings_path):
+        return None
+    with store_lock(store_path):
+        store = EmbeddingStore.open(store_path)
+        if store.log_records == 0 or not (force or should_compact(store)):
+            return None
+        print(f"Compacting embedding log: {store.log_records} records, {store.log_size / 1e6:.2f} MB")
+        return write_store(store_path, store.layout, store.header.get("store_id"), store.revision)
+
+compaction_threads = {}
+
+def compact_in_background(embeddings_path):
+    """Menjalankan kompaksi di thread terpisah jika log sudah cukup besar (paling banyak satu per store)"""
+    key = os.path.abspath(store_path_for(embeddings_path))
+    thread = compaction_threads.get(key)
+    if thread is not None and thread.is_alive():
+        return thread
+
+    def run():
+        try:
+            compact_store(embeddings_path)
+        except Exception as e:
+            print(f"Warning: Kompaksi log embeddings gagal: {e}")
+
+    # Bukan daemon: skrip CLI menunggu kompaksi selesai sebelum keluar
+    thread = threading.Thread(target=run)
+    compaction_threads[key] = thread
+    thread.start()
+    return thread
+
+# Menghapus embeddings di kedua format (dipakai saat rebuild total)
+def remove_embeddings(embeddings_path):
+    removed = []
+    pickle_path = pickle_path_for(embeddings_path)
+    if os.path.isfile(pickle_path):
+        os.remove(pickle_path)
+        removed.append(pickle_path)
+    store_path = store_path_for(embeddings_path)
+    if os.path.isdir(store_path):
+        shutil.rmtree(store_path, ignore_errors=True)
+        removed.append(store_path)
+    return removed
+
+# Migrasi satu kali dari pickle lama ke store columnar
+# Jika metadata tersedia, baris dikelompokkan per gambar agar perubahan berikutnya cukup ditulis ke log
+def migrate_pickle_to_store(pickle_path, store_path=None, metadata_path=None):
+    store_path = store_path or store_path_for(pickle_path)
+    with open(pickle_path, "rb") as f:
+        embeddings = pickle.load(f)
+
+    metadata = None
+    if metadata_path and os.path.exists(metadata_path):
+        with open(metadata_path, "rb") as f:
+            metadata = pickle.load(f)
+
+    layout = layout_from_embeddings(embeddings)
+    if metadata is not None:
+        attribute_rows(layout, metadata)
+    with store_lock(store_path):
+        header = write_store(store_path, layout)
+
+    # Verifikasi: daftar orang sama, setiap embedding yang dirujuk metadata ada di store
+    store = EmbeddingStore.open(store_path)
+    if store.names != list(embeddings):
+        raise ValueError("Urutan / daftar orang hasil migrasi tidak sama dengan pickle")
+    for person_name, vectors in embeddings.items():
+        valid = [v for v in vectors if v is not None]
+        migrated = store.layout[person_name]
+        if metadata is None:
+            expected = normalize_rows(np.stack(valid)) if valid else np.zeros((0, 0), dtype=np.float32)
+            actual = migrated.get(UNATTRIBUTED_IMAGE, expected[:0])
+            if len(expected) != len(actual) or (len(expected) and not np.allclose(expected, actual, atol=1e-6)):
+                raise ValueError(f"Isi embedding {person_name} tidak sama setelah migrasi")
+            continue
+        for image_name, info in metadata.get(person_name, {}).items():
+            indices = [idx for idx in info.get("embedding_indices", []) if idx < len(valid)]
+            if not indices:
+                continue
+            expected = normalize_rows(np.stack([valid[idx] for idx in indices]))
+            if image_name not in migrated or not np.allclose(expected, migrated[image_name], atol=1e-6):
+                raise ValueError(f"Embedding {person_name}/{image_name} tidak sama setelah migrasi")
+    return header
@@ -0,0 +1,50 @@
+import os
+
+# Pembacaan variabel environment bersama untuk semua knob angka / flag. Nilai dibaca setiap kali
+# dipanggil (.env bisa dimuat setelah import). Nilai kosong memakai default; nilai yang tidak bisa
+# dibaca memakai default dengan peringatan, sehingga satu nilai .env yang salah tidak pernah
+# membuat sebagian jalur kode gagal sementara jalur lain tetap berjalan.
+TRUE_VALUES = ("1", "true", "yes", "on")
+FALSE_VALUES = ("0", "false", "no", "off")
+
+def env_number(name, default, cast=int, minimum=None, maximum=None):
+    value = os.environ.get(name)
+    if value is None or not value.strip():
+        number = default
+    else:
+        try:
+            number = cast(value.strip())
+        except (ValueError, TypeError):
+            print(f"Warning: {name}={value!r} tidak valid. Menggunakan default: {default}")
+            number = default
+    if minimum is not None:
+        number = max(number, minimum)
+    if maximum is not None:
+        number = min(number, maximum)
+    return number
+
+def env_int(name, default, minimum=None, maximum=None):
+    return env_number(name, default, int, minimum, maximum)
+
+def env_float(name, default, minimum=None, maximum=None):
+    return env_number(name, default, float, minimum, maximum)
+
+# Flag dengan default True hanya mati oleh nilai "false"; default False hanya hidup oleh nilai "true"
+def env_flag(name, default):
+    value = os.environ.get(name, "").strip().lower()
+    if not value:
+        return default
+    return value not in FALSE_VALUES if default else value in TRUE_VALUES
+
+# Daftar bilangan bulat dipisah koma ("1,2,4"); kosong / nilai "false" berarti daftar kosong
+def env_int_list(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return list(default)
+    if value.strip().lower() in ("", "none") + FALSE_VALUES:
+        return []
+    try:
+        return [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        print(f"Warning: {name}={value!r} tidak valid. Menggunakan default: {','.join(map(str, default))}")
+        return list(default)
@@ -0,0 +1,245 @@
+import time
+import cv2
+from env_settings import env_int
+
+# Batching lintas gambar untuk enrollment: gambar dideteksi YOLO per batch, lalu crop wajah dari
+# banyak gambar di-embed FaceNet dalam batch berukuran tetap, bukan satu panggilan model per gambar / wajah.
+DEFAULT_DETECT_BATCH_SIZE = 8
+DEFAULT_EMBED_BATCH_SIZE = 32
+FACE_SIZE = 160
+
+# Membaca ukuran batch YOLO dari environment
+def detect_batch_size():
+    return env_int("DETECT_BATCH_SIZE", DEFAULT_DETECT_BATCH_SIZE, minimum=1)
+
+# Membaca ukuran batch FaceNet dari environment
+def embed_batch_size():
+    return env_int("EMBED_BATCH_SIZE", DEFAULT_EMBED_BATCH_SIZE, minimum=1)
+
+# Crop wajah dari bounding box (x1, y1, x2, y2) lalu resize ke ukuran input FaceNet
+def crop_faces(image, boxes, face_size=FACE_SIZE):
+    faces = []
+    for box in boxes:
+        x1, y1, x2, y2 = map(int, box)
+        faces.append(cv2.resize(image[y1:y2, x1:x2], (face_size, face_size)))
+    return faces
+
+class FaceDetectionBatcher:
+    """Mengumpulkan gambar dan mendeteksi wajahnya dengan satu panggilan YOLO per batch.
+
+    Ambang batas kepercayaan diteruskan ke model (conf=...), jadi deteksi di bawah ambang
+    tidak pernah dikembalikan. add(key, image) dan flush() mengembalikan
+    [(key, faces, confidences, error)] per gambar dalam urutan add(); error berisi exception
+    jika gambar itu gagal diproses (faces dan confidences None). Dengan with_boxes=True
+    setiap tuple diakhiri bounding box (x1, y1, x2, y2) wajah-wajahnya.
+    """
+
+    def __init__(self, get_detector, conf_threshold, batch_size=None, verbose=True, with_boxes=False):
+        self.get_detector = get_detector
+        self.conf_threshold = conf_threshold
+        self.batch_size = batch_size or detect_batch_size()
+        self.verbose = verbose
+        self.with_boxes = with_boxes
+        self.keys = []
+        self.images = []
+        self.batches = 0
+        self.images_detected = 0
+        self.seconds = 0.0
+
+    def add(self, key, image):
+        self.keys.append(key)
+        self.images.append(image)
+        if len(self.images) >= self.batch_size:
+            return self._run()
+        return []
+
+    def flush(self):
+        """Mendeteksi sisa gambar (batch terakhir boleh lebih kecil)"""
+        return self._run() if self.images else []
+
+    def _predict(self, images):
+        return self.get_detector().predict(images, conf=self.conf_threshold, verbose=False)
+
+    def _run(self):
+        keys, images = self.keys, self.images
+        self.keys, self.images = [], []
+
+        start_time = time.perf_counter()
+        try:
+            results = self._predict(images)
+        except Exception as e:
+            # Satu gambar rusak tidak boleh menggagalkan seluruh batch: ulangi per gambar
+            if len(images) == 1:
+                results = [e]
+            else:
+                results = []
+                for image in images:
+                    try:
+                        results.append(self._predict([image])[0])
+                    except Exception as image_error:
+                        results.append(image_error)
+        elapsed = time.perf_counter() - start_time
+        self.batches += 1
+        self.images_detected += len(images)
+        self.seconds += elapsed
+        if self.verbose:
+            print(f"    Detection batch {self.batches}: {len(images)} images in {elapsed:.2f} seconds")
+
+        completed = []
+        for key, image, result in zip(keys, images, results):
+            if isinstance(result, Exception):
+                completed.append((key, None, None, result) + ((None,) if self.with_boxes else ()))
+                continue
+            try:
+                boxes = result.boxes.xyxy.cpu().numpy()
+                confidences = [float(conf) for conf in result.boxes.conf.cpu().numpy()]
+                completed.append((key, crop_faces(image, boxes), confidences, None)
+                                 + ((boxes,) if self.with_boxes else ()))
+            except Exception as e:
+                completed.append((key, None, None, e) + ((None,) if self.with_boxes else ()))
+        return completed
+
+    def summary(self):
+        rate = self.images_detected / self.seconds if self.seconds > 0 else 0
+        return (f"YOLO: {self.images_detected} images in {self.batches} batches of {self.batch_size} "
+                f"({self.seconds:.2f} seconds, {rate:.1f} images/s)")
+
+class FaceEmbeddingBatcher:
+    """Mengumpulkan crop wajah per gambar dan meng-embed-nya dalam batch berukuran tetap.
+
+    add(key, faces) mendaftarkan crop satu gambar; key adalah penanda pemilik (misal
+    (orang, nama file)). Setiap kali crop terkumpul satu batch penuh, batch itu di-embed.
+    add() dan flush() mengembalikan [(key, embeddings)] untuk gambar yang seluruh wajahnya
+    sudah di-embed, selalu dalam urutan add() (gambar tanpa wajah ikut diurutkan).
+    Dengan tuner (batch_tuning.BatchSizeTuner) ukuran batch berikutnya mengikuti hasil tuner.
+    """
+
+    def __init__(self, get_embedder, batch_size=None, tuner=None):
+        self.get_embedder = get_embedder
+        self.tuner = tuner
+        self.batch_size = tuner.size if tuner is not None else batch_size or embed_batch_size()
+        self.pending = []   # [(key, jumlah wajah)] untuk gambar yang belum selesai
+        self.crops = []     # crop yang belum di-embed
+        self.embedded = []  # embeddings untuk crop gambar terdepan di pending
+        self.batches = 0
+        self.faces = 0
+        self.seconds = 0.0
+
+    def add(self, key, faces):
+        self.pending.append((key, len(faces)))
+        self.crops.extend(faces)
+        return self._run(full_only=True)
+
+    def flush(self):
+        """Meng-embed sisa crop (batch terakhir boleh lebih kecil) dan mengembalikan semua gambar"""
+        return self._run(full_only=False)
+
+    def _run(self, full_only):
+        while len(self.crops) >= self.batch_size or (not full_only and self.crops):
+            batch = self.crops[:self.batch_size]
+            del self.crops[:self.batch_size]
+
+            start_time = time.perf_counter()
+            self.embedded.extend(self.get_embedder().embeddings(batch))
+            elapsed = time.perf_counter() - start_time
+            self.seconds += elapsed
+            self.batches += 1
+            self.faces += len(batch)
+            if self.tuner is not None:
+                self.batch_size = self.tuner.observe(len(batch), elapsed)
+
+        completed = []
+        while self.pending and self.pending[0][1] <= len(self.embedded):
+            key, face_count = self.pending.pop(0)
+            completed.append((key, self.embedded[:face_count]))
+            del self.embedded[:face_count]
+        return completed
+
+    def summary(self):
+        rate = self.faces / self.seconds if self.seconds > 0 else 0
+        return (f"FaceNet: {self.faces} faces in {self.batches} batches of {self.batch_size} "
+                f"({self.seconds:.2f} seconds, {rate:.1f} faces/s)")
+
+class FaceEnrollmentBatcher:
+    """Deteksi + embedding untuk enrollment dengan cache deteksi mentah (embedding_cache.DetectionCache).
+
+    add(key, image_hash, load_image) mengembalikan [(key, embeddings, confidences, error)]
+    untuk gambar yang sudah selesai. Jika deteksi mentah gambar ini ada di cache, box difilter
+    dengan confidence_threshold dan hanya wajah yang belum punya embedding yang di-embed
+    (load_image tidak dipanggil). Jika tidak, gambar dideteksi hingga batas bawah cache lalu
+    semua box disimpan. Tanpa cache perilakunya sama dengan FaceDetectionBatcher + FaceEmbeddingBatcher.
+    """
+
+    def __init__(self, get_detector, get_embedder, confidence_threshold, detection_cache=None,
+                 detect_batch_size=None, embed_batch_size=None):
+        from embedding_cache import detection_floor
+
+        self.confidence_threshold = confidence_threshold
+        self.detection_cache = detection_cache
+        self.floor = min(detection_floor(), confidence_threshold) if detection_cache is not None else confidence_threshold
+        self.detection_batcher = FaceDetectionBatcher(get_detector, self.floor, detect_batch_size, with_boxes=True)
+        self.embedding_batcher = FaceEmbeddingBatcher(get_embedder, embed_batch_size)
+        self.reused_faces = 0
+        self.embedded_faces = 0
+
+    def add(self, key, image_hash, load_image):
+        entry = self.detection_cache.get(image_hash, self.confidence_threshold) if self.detection_cache is not None else None
+        if entry is not None:
+            return self._embed(key, image_hash, entry, False)
+
+        try:
+            image = load_image()
+        except Exception as e:
+            return [(key, None, None, e)]
+        return self._detected(self.detection_batcher.add((key, image_hash), image))
+
+    def flush(self):
+        completed = self._detected(self.detection_batcher.flush())
+        return completed + self._finish(self.embedding_batcher.flush())
+
+    def _detected(self, detected):
+        completed = []
+        for (key, image_hash), faces, confidences, error, boxes in detected:
+            if error is not None:
+                completed.append((key, None, None, error))
+                continue
+            # Semua box di atas batas bawah disimpan dengan crop-nya; embedding diisi saat selesai
+            entry = self._new_entry(boxes, confidences, faces)
+            completed.extend(self._embed(key, image_hash, entry, True))
+        return completed
+
+    def _new_entry(self, boxes, confidences, faces):
+        from embedding_cache import DetectionEntry
+        return DetectionEntry(self.floor, boxes, confidences, crops=dict(enumerate(faces)))
+
+    # Mengantrikan crop wajah di atas threshold yang belum punya embedding ke FaceNet
+    def _embed(self, key, image_hash, entry, is_new):
+        rows = entry.rows_above(self.confidence_threshold)
+        missing = entry.missing_rows(rows)
+        if not is_new:
+            self.reused_faces += len(rows) - len(missing)
+        crops = [entry.crops[row] for row in missing]
+        return self._finish(self.embedding_batcher.add((key, image_hash, entry, rows, missing, is_new), crops))
+
+    # Entri baru atau entri yang mendapat embedding baru ditulis ulang ke cache
+    def _finish(self, embedded):
+        completed = []
+        for (key, image_hash, entry, rows, missing, is_new), embeddings in embedded:
+            if missing:
+                self.embedded_faces += len(missing)
+                entry.set_embeddings(missing, embeddings)
+            if self.detection_cache is not None and (is_new or missing):
+                self.detection_cache.put(image_hash, entry)
+            confidences = [float(entry.confidences[row]) for row in rows]
+            completed.append((key, [entry.embeddings[row] for row in rows], confidences, None))
+        return completed
+
+    def summary(self):
+        lines = [self.detection_batcher.summary(), self.embedding_batcher.summary()]
+        # Embedder hanya ditanya jika sudah dipakai, agar run yang seluruhnya dari cache tidak memuat FaceNet
+        if self.embedding_batcher.batches:
+            lines.append(self.embedding_batcher.get_embedder().summary())
+        if self.detection_cache is not None:
+            lines.append(f"{self.detection_cache.summary()}, {self.reused_faces} faces reused, "
+                         f"{self.embedded_faces} faces embedded (floor {self.floor})")
+        return "\n".join(lines)
@@ -0,0 +1,372 @@
+import os
+import hashlib
+import numpy as np
+from embedding_store import normalize_rows, open_store, load_embeddings, load_person_embeddings, embeddings_mtime
+
+# Ambang batas default kecocokan wajah (sama dengan utils.find_match)
+DEFAULT_MATCH_THRESHOLD = 0.8
+
+# Mode pencocokan: "exact" (brute force seluruh galeri), "ivf" (indeks ANN), atau
+# "centroid" (prefilter centroid per orang lalu rerank exact)
+MATCH_MODES = ("exact", "ivf", "centroid")
+DEFAULT_MATCH_MODE = "exact"
+
+# Jumlah baris query maksimum per perkalian matriks agar memori tetap terkendali
+DEFAULT_CHUNK_SIZE = 1024
+
+# Jumlah baris galeri yang di-dekuantisasi sekaligus untuk storage float16/int8
+DEFAULT_BLOCK_ROWS = 4096
+
+# Tipe penyimpanan embedding galeri yang didukung
+EMBEDDING_STORAGES = ("float32", "float16", "int8")
+DEFAULT_EMBEDDING_STORAGE = "float32"
+
+# Membaca mode pencocokan dari environment setiap kali dipanggil (.env bisa dimuat setelah import)
+def match_mode():
+    mode = os.environ.get("MATCH_MODE", DEFAULT_MATCH_MODE).lower()
+    if mode not in MATCH_MODES:
+        print(f"Warning: MATCH_MODE {mode} tidak dikenal. Menggunakan default: {DEFAULT_MATCH_MODE}")
+        mode = DEFAULT_MATCH_MODE
+    return mode
+
+# Membaca tipe penyimpanan embedding galeri dari environment
+def embedding_storage():
+    storage = os.environ.get("EMBEDDING_STORAGE", DEFAULT_EMBEDDING_STORAGE).lower()
+    if storage not in EMBEDDING_STORAGES:
+        print(f"Warning: EMBEDDING_STORAGE {storage} tidak dikenal. Menggunakan default: {DEFAULT_EMBEDDING_STORAGE}")
+        storage = DEFAULT_EMBEDDING_STORAGE
+    return storage
+
+# Kuantisasi baris float32: float16 langsung, int8 simetris dengan skala per baris
+def quantize_rows(matrix, storage):
+    if storage == "float32":
+        return matrix, None
+    if storage == "float16":
+        return np.ascontiguousarray(matrix, dtype=np.float16), None
+    if storage == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        data = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return np.ascontiguousarray(data), scales.astype(np.float32)
+    raise ValueError(f"Storage embedding tidak dikenal: {storage}")
+
+# Path file galeri ringkas diletakkan di samping file embeddings
+def compact_path_for(embeddings_path, storage):
+    return os.path.splitext(embeddings_path)[0] + f"_{storage}.npz"
+
+# Menulis galeri ringkas jika EMBEDDING_STORAGE bukan float32
+# File ringkas storage lain yang tertinggal diabaikan load_gallery karena lebih lama dari embeddings
+def write_compact_gallery(embeddings_path, gallery):
+    storage = embedding_storage()
+    if storage != "float32":
+        gallery.quantized(storage).save(compact_path_for(embeddings_path, storage))
+
+# Membangun galeri float32 dari embeddings yang tersimpan di disk
+# Store columnar di-mmap langsung tanpa salinan; pickle lama dibaca lalu dinormalisasi
+def gallery_from_saved(embeddings_path):
+    store = open_store(embeddings_path)
+    if store is not None:
+        return FaceGallery.from_store(store)
+    return FaceGallery.from_embeddings(load_embeddings(embeddings_path))
+
+# Memuat galeri dengan storage sesuai EMBEDDING_STORAGE
+# File ringkas dipakai jika tidak lebih lama dari embeddings; jika tidak, galeri dibangun dari embeddings di disk
+def load_gallery(embeddings_path):
+    storage = embedding_storage()
+    if storage != "float32":
+        path = compact_path_for(embeddings_path, storage)
+        saved_mtime = embeddings_mtime(embeddings_path)
+        if os.path.exists(path) and (saved_mtime is None or os.path.getmtime(path) >= saved_mtime):
+            try:
+                return FaceGallery.load(path)
+            except Exception as e:
+                print(f"Warning: Gagal memuat galeri ringkas {path}: {e}")
+    return gallery_from_saved(embeddings_path).quantized(storage)
+
+# Centroid satu orang: rata-rata embedding yang dinormalisasi, lalu dinormalisasi ulang
+def person_centroid(embeddings_list):
+    valid = [e for e in embeddings_list if e is not None]
+    if not valid:
+        return None
+    return normalize_rows(normalize_rows(np.stack(valid)).mean(axis=0))[0]
+
+# Path file centroid per orang diletakkan di samping file embeddings
+def centroids_path_for(embeddings_path):
+    return os.path.splitext(embeddings_path)[0] + "_centroids.npz"
+
+def read_person_centroids(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with np.load(path) as data:
+            return dict(zip(data["names"].tolist(), data["centroids"]))
+    except Exception as e:
+        print(f"Warning: Gagal membaca centroid {path}: {e}")
+        return {}
+
+def write_person_centroids(path, centroids):
+    """Menyimpan {nama: centroid} secara atomik"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            names=np.array(list(centroids), dtype=str),
+            centroids=np.stack(list(centroids.values())) if centroids else np.zeros((0, 0), dtype=np.float32)
+        )
+    os.replace(tmp_path, path)
+
+# Memperbarui file centroid; hanya orang di changed_persons (atau yang belum punya centroid) yang dihitung ulang
+# changed_persons=None berarti semua orang dihitung ulang
+def update_person_centroids(path, known_embeddings, changed_persons=None):
+    existing = read_person_centroids(path) if changed_persons is not None else {}
+    centroids = {}
+
+    for person_name, embeddings_list in known_embeddings.items():
+        if person_name in existing and person_name not in changed_persons:
+            centroid = existing[person_name]
+        else:
+            centroid = person_centroid(embeddings_list)
+        if centroid is not None:
+            centroids[person_name] = centroid
+
+    write_person_centroids(path, centroids)
+
+# Memperbarui centroid setelah perubahan per gambar: hanya embedding orang yang berubah yang dibaca.
+# Di luar MATCH_MODE=centroid file tidak ditulis; file lama yang menjadi basi dihapus dan
+# dihitung dari galeri saat mode centroid dipakai lagi (lihat load_person_centroids).
+def update_changed_centroids(path, embeddings_path, changed_persons):
+    if not changed_persons:
+        return
+    if match_mode() != "centroid":
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    if not os.path.exists(path):
+        update_person_centroids(path, load_embeddings(embeddings_path))
+        return
+
+    centroids = read_person_centroids(path)
+    for person_name, embeddings_list in load_person_embeddings(embeddings_path, changed_persons).items():
+        centroid = person_centroid(embeddings_list)
+        if centroid is None:
+            centroids.pop(person_name, None)
+        else:
+            centroids[person_name] = centroid
+    write_person_centroids(path, centroids)
+
+# File turunan embeddings setelah update / reprocess: centroid orang yang berubah, lalu galeri ringkas
+# dan indeks IVF yang butuh seluruh matriks hanya jika EMBEDDING_STORAGE / MATCH_MODE memakainya
+def refresh_derived_files(embeddings_path, changed_persons):
+    import ann_index
+
+    update_changed_centroids(centroids_path_for(embeddings_path), embeddings_path, changed_persons)
+    if embedding_storage() == "float32" and match_mode() != "ivf":
+        return
+    gallery = gallery_from_saved(embeddings_path)
+    write_compact_gallery(embeddings_path, gallery)
+    ann_index.refresh_index(ann_index.index_path_for(embeddings_path), gallery)
+
+# Matriks centroid sejajar dengan gallery.names; orang yang belum ada di file dihitung langsung dari galeri
+def load_person_centroids(path, gallery):
+    stored = read_person_centroids(path)
+    centroids = np.zeros((len(gallery.names), gallery.dim), dtype=np.float32)
+    missing = []
+
+    for label, person_name in enumerate(gallery.names):
+        centroid = stored.get(person_name)
+        if centroid is None or centroid.shape[0] != gallery.dim:
+            missing.append(label)
+        else:
+            centroids[label] = centroid
+
+    if missing:
+        print(f"Warning: {len(missing)} orang belum punya centroid di {path}, dihitung dari galeri")
+        for label in missing:
+            centroids[label] = person_centroid(gallery.take_rows(gallery.labels == label))
+
+    return centroids
+
+class FaceGallery:
+    """Galeri embedding wajah dalam satu matriks yang sudah dinormalisasi.
+
+    Baris ke-i pada `matrix` milik orang `names[labels[i]]`. Urutan baris
+    mengikuti urutan dictionary face_embeddings.pkl sehingga hasil argmax
+    sama dengan loop lama di utils.find_match.
+
+    `storage` menentukan tipe data `matrix`: "float32" (default), "float16",
+    atau "int8" dengan skala per baris di `scales`. Untuk storage ringkas,
+    pencarian men-dekuantisasi matriks per blok baris sehingga yang disimpan
+    di memori tetap versi ringkasnya.
+
+    Jika `index` diisi (lihat ann_index.IVFIndex), pencarian memakai indeks
+    ANN tersebut; jika None, pencarian exact terhadap seluruh matriks.
+    """
+
+    def __init__(self, matrix, labels, names, index=None, storage="float32", scales=None, fingerprint=None):
+        self.matrix = matrix
+        self.labels = labels
+        self.names = names
+        self.index = index
+        self.storage = storage
+        self.scales = scales
+        self._fingerprint = fingerprint
+
+    @classmethod
+    def from_embeddings(cls, known_embeddings):
+        """Membangun galeri dari dictionary {nama: [np.ndarray, ...]}"""
+        names = []
+        vectors = []
+        labels = []
+
+        for person_name, embeddings_list in known_embeddings.items():
+            valid = [e for e in embeddings_list if e is not None]
+            if not valid:
+                continue
+            label = len(names)
+            names.append(person_name)
+            vectors.extend(valid)
+            labels.extend([label] * len(valid))
+
+        if vectors:
+            matrix = normalize_rows(np.stack(vectors))
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+
+        return cls(matrix, np.asarray(labels, dtype=np.int32), names)
+
+    @classmethod
+    def from_store(cls, store):
+        """Membangun galeri dari EmbeddingStore; tanpa log matriks mmap dipakai langsung (read-only, dibagi antar proses)"""
+        names = []
+        labels = []
+        for person_name, count in store.person_counts():
+            if count == 0:
+                continue
+            labels.extend([len(names)] * count)
+            names.append(person_name)
+
+        matrix = store.matrix if len(store) else np.zeros((0, 0), dtype=np.float32)
+        # Sidik jari dari versi isi store, bukan hash matriks: membuka galeri tidak perlu membaca seluruh mmap
+        fingerprint = f"store-{store.content_version}-{len(store)}"
+        return cls(matrix, np.asarray(labels, dtype=np.int32), names, fingerprint=fingerprint)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1] if len(self) else 0
+
+    # Jumlah byte yang dipakai matriks (dan skala) galeri di memori
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    # Sidik jari isi galeri, dipakai untuk memastikan indeks turunan masih sesuai
+    # Galeri dari store columnar memakai versi isi store (lihat from_store); hash md5 hanya untuk galeri
+    # dari pickle / dictionary. Galeri hasil kuantisasi mewarisi sidik jari galeri float32 asalnya
+    def fingerprint(self):
+        if self._fingerprint is None:
+            digest = hashlib.md5()
+            digest.update("\n".join(self.names).encode("utf-8"))
+            digest.update(self.labels.tobytes())
+            digest.update(self.matrix.tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def quantized(self, storage):
+        """Mengembalikan salinan galeri dengan storage float32, float16, atau int8"""
+        if storage == self.storage:
+            return self
+        if self.storage != "float32":
+            raise ValueError(f"Galeri {self.storage} tidak bisa dikuantisasi ulang ke {storage}")
+        data, scales = quantize_rows(self.matrix, storage)
+        return FaceGallery(data, self.labels, self.names, self.index, storage, scales, self.fingerprint())
+
+    # Mengambil baris galeri sebagai float32 (dekuantisasi jika storage ringkas)
+    def take_rows(self, rows):
+        block = self.matrix[rows]
+        if self.storage == "float32":
+            return block
+        block = block.astype(np.float32)
+        if self.scales is not None:
+            block *= self.scales[rows][:, None]
+        return block
+
+    def best_matches(self, embeddings, chunk_size=DEFAULT_CHUNK_SIZE, exact=False, block_rows=DEFAULT_BLOCK_ROWS):
+        """Mengembalikan (indeks baris terbaik, skor kosinus terbaik) untuk setiap query
+
+        exact=True memaksa pencarian brute force walaupun indeks ANN tersedia.
+        """
+        queries = normalize_rows(embeddings)
+        num_queries = queries.shape[0]
+
+        if self.index is not None and not exact and len(self):
+            return self.index.search(self, queries)
+
+        best_rows = np.full(num_queries, -1, dtype=np.int64)
+        best_scores = np.full(num_queries, -np.inf, dtype=np.float32)
+
+        if num_queries == 0 or len(self) == 0:
+            return best_rows, best_scores
+
+        # Storage float32 cukup satu blok (view tanpa salinan); storage ringkas di-dekuantisasi per blok
+        if self.storage == "float32":
+            block_rows = len(self)
+
+        for block_start in range(0, len(self), block_rows):
+            block = self.take_rows(slice(block_start, block_start + block_rows))
+            for start in range(0, num_queries, chunk_size):
+                scores = queries[start:start + chunk_size] @ block.T
+                rows = np.argmax(scores, axis=1)
+                row_scores = scores[np.arange(len(rows)), rows]
+
+                # Skor sama dengan blok sebelumnya tidak menggantikan agar baris pertama tetap menang
+                better = row_scores > best_scores[start:start + chunk_size]
+                best_rows[start:start + chunk_size][better] = rows[better] + block_start
+                best_scores[start:start + chunk_size][better] = row_scores[better]
+
+        return best_rows, best_scores
+
+    def match(self, embeddings, threshold=DEFAULT_MATCH_THRESHOLD):
+        """Mencocokkan blok (jumlah wajah x dim) dan mengembalikan list nama atau None
+
+        Sama seperti find_match lama, wajah dianggap cocok hanya jika skor
+        terbaiknya lebih besar (bukan sama dengan) dari threshold.
+        """
+        best_rows, best_scores = self.best_matches(embeddings)
+        matches = []
+        for row, score in zip(best_rows, best_scores):
+            if row >= 0 and score > threshold:
+                matches.append(self.names[self.labels[row]])
+            else:
+                matches.append(None)
+        return matches
+
+    def save(self, path):
+        """Menyimpan galeri (dalam storage-nya saat ini) ke file .npz secara atomik"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                matrix=self.matrix,
+                scales=self.scales if self.scales is not None else np.zeros(0, dtype=np.float32),
+                labels=self.labels,
+                names=np.array(self.names, dtype=str),
+                storage=np.array(self.storage),
+                fingerprint=np.array(self.fingerprint())
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            storage = str(data["storage"])
+            return cls(
+                data["matrix"],
+                data["labels"],
+                data["names"].tolist(),
+                storage=storage,
+                scales=data["scales"] if storage == "int8" else None,
+                fingerprint=str(data["fingerprint"])
+            )
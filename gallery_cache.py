@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from gallery import load_gallery, match_mode, embedding_storage, compact_path_for, centroids_path_for
+from embedding_store import embedding_format, embeddings_marker_paths
+from env_settings import env_float
+import ann_index
+
+# Interval (detik) polling file embeddings oleh server; 0 = tanpa polling
+DEFAULT_GALLERY_POLL_SECONDS = 5.0
+
+def gallery_poll_seconds():
+    return env_float("GALLERY_POLL_SECONDS", DEFAULT_GALLERY_POLL_SECONDS, minimum=0.0)
+
+# Tanda tangan stat file (mtime_ns, ukuran), None jika file tidak ada
+def stat_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+class GalleryCache:
+    """Cache galeri per proses untuk satu file embeddings.
+
+    Galeri yang sudah dibangun (termasuk indeks ANN / centroid) dipakai ulang
+    selama kuncinya tidak berubah. Kunci terdiri dari stat (mtime_ns, ukuran)
+    file embeddings (header dan log store columnar, atau file pickle) beserta file
+    turunan yang dipakai mode saat ini, ditambah nomor generasi yang
+    dinaikkan oleh penulis di proses yang sama.
+
+    Galeri baru dibangun di luar jalur baca lalu ditukar secara atomik; job
+    yang sedang berjalan tetap memegang referensi galeri lamanya. Selama galeri
+    baru dibangun di background, get() mengembalikan galeri lama; hanya galeri
+    pertama yang dibangun di jalur job. Perubahan dari proses lain (skrip CLI
+    update / reprocess / rebuild) terdeteksi lewat stat file, baik saat get()
+    maupun oleh thread polling watch().
+    """
+
+    def __init__(self, embeddings_path):
+        self.embeddings_path = embeddings_path
+        self.generation = 0
+        self._state = (None, None)  # (kunci, galeri), ditukar sebagai satu tuple
+        self._build_lock = threading.Lock()
+
+    # Kunci cache: stat file yang relevan untuk mode pencocokan dan storage saat ini + generasi
+    def current_key(self):
+        paths = embeddings_marker_paths(self.embeddings_path)
+        storage = embedding_storage()
+        if storage != "float32":
+            paths.append(compact_path_for(self.embeddings_path, storage))
+        mode = match_mode()
+        if mode == "ivf":
+            paths.append(ann_index.index_path_for(self.embeddings_path))
+        elif mode == "centroid":
+            paths.append(centroids_path_for(self.embeddings_path))
+        return (mode, storage, embedding_format(), self.generation) + tuple(stat_signature(p) for p in paths)
+
+    def build(self, key):
+        start_time = time.time()
+        gallery = load_gallery(self.embeddings_path)
+        ann_index.attach_search_index(gallery, self.embeddings_path)
+        self._state = (key, gallery)
+        print(f"Gallery loaded: {len(gallery.names)} persons, {len(gallery)} embeddings "
+              f"in {time.time() - start_time:.2f} seconds")
+        return gallery
+
+    def get(self):
+        """Mengembalikan galeri terbaru; galeri lama dipakai selama galeri baru dibangun di background"""
+        key = self.current_key()
+        cached_key, gallery = self._state
+        if cached_key == key:
+            return gallery
+
+        # Sudah ada galeri: jangan blok job, bangun ulang di background dan pakai yang lama dulu
+        if gallery is not None:
+            self.rebuild_in_background()
+            return gallery
+
+        # Galeri pertama: tunggu build (bisa sedang dibangun thread lain)
+        with self._build_lock:
+            cached_key, gallery = self._state
+            key = self.current_key()
+            if cached_key == key:
+                return gallery
+            try:
+                return self.build(key)
+            except Exception as e:
+                if gallery is None:
+                    raise
+                print(f"Warning: Gagal memuat ulang galeri ({e}), menggunakan galeri sebelumnya")
+                return gallery
+
+    def _rebuild(self):
+        try:
+            key = self.current_key()
+            if self._state[0] != key:
+                self.build(key)
+        except Exception as e:
+            # File mungkin sedang ditulis ulang; tetap pakai galeri lama dan coba lagi berikutnya
+            print(f"Warning: Gagal memuat ulang galeri ({e}), menggunakan galeri sebelumnya")
+        finally:
+            self._build_lock.release()
+
+    def rebuild_in_background(self):
+        """Mulai membangun galeri baru di background; None jika build lain sedang berjalan"""
+        if not self._build_lock.acquire(blocking=False):
+            return None
+        thread = threading.Thread(target=self._rebuild)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def invalidate(self):
+        """Menandai bahwa isi galeri berubah (misal setelah update embeddings dari admin)"""
+        self.generation += 1
+
+    def refresh_in_background(self):
+        """Invalidate lalu bangun galeri baru di background agar job berikutnya langsung siap"""
+        self.invalidate()
+        return self.rebuild_in_background()
+
+    def poll(self):
+        """Satu putaran polling: bangun ulang di background jika file embeddings berubah"""
+        cached_key, gallery = self._state
+        if gallery is not None and cached_key != self.current_key():
+            return self.rebuild_in_background()
+        return None
+
+    def watch(self, interval):
+        """Thread polling agar perubahan dari skrip CLI dibangun sebelum job berikutnya datang"""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.poll()
+                except Exception as e:
+                    print(f"Warning: Polling galeri gagal ({e})")
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+# Satu cache per file embeddings di dalam proses ini
+gallery_caches = {}
+gallery_caches_lock = threading.Lock()
+
+def get_gallery_cache(embeddings_path="face_embeddings.pkl"):
+    with gallery_caches_lock:
+        if embeddings_path not in gallery_caches:
+            gallery_caches[embeddings_path] = GalleryCache(embeddings_path)
+        return gallery_caches[embeddings_path]
+
+# Dipanggil sekali oleh server (app.py): polling file embeddings setiap GALLERY_POLL_SECONDS
+def start_gallery_watcher(embeddings_path="face_embeddings.pkl"):
+    interval = gallery_poll_seconds()
+    if interval <= 0:
+        return None
+    return get_gallery_cache(embeddings_path).watch(interval)
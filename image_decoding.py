@@ -0,0 +1,66 @@
+import cv2
+from PIL import Image
+from env_settings import env_flag
+
+# Decode resolusi rendah untuk deteksi: YOLO memperkecil gambar ke ukuran input (640) sehingga
+# decode penuh foto 24 MP kebanyakan terbuang. JPEG di-decode dengan skala DCT lewat
+# IMREAD_REDUCED_COLOR_{2,4,8}; piksel resolusi penuh hanya dibaca untuk crop wajah dan VISUALIZED.
+DETECT_IMAGE_SIZE = 640
+REDUCED_READ_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+# Membaca dari environment apakah deteksi memakai decode resolusi rendah
+def reduced_decode_enabled():
+    return env_flag("REDUCED_DECODE", True)
+
+# Faktor reduksi terbesar yang masih menyisakan sisi terpanjang >= min_side piksel
+def reduction_factor(width, height, min_side=DETECT_IMAGE_SIZE):
+    factor = 1
+    for candidate in sorted(REDUCED_READ_FLAGS):
+        if max(width, height) / candidate >= min_side:
+            factor = candidate
+    return factor
+
+def decode_for_detection(image_path, min_side=DETECT_IMAGE_SIZE):
+    """Decode gambar untuk deteksi: (image, (skala_x, skala_y), (tinggi, lebar) penuh).
+
+    Skala mengubah koordinat gambar tereduksi ke koordinat resolusi penuh ((1, 1) jika tidak
+    direduksi). image None jika gambar tidak bisa dibaca, sama seperti cv2.imread.
+    """
+    try:
+        # Hanya header yang dibaca, piksel belum di-decode
+        with Image.open(image_path) as header:
+            width, height = header.size
+    except Exception:
+        image = cv2.imread(image_path)
+        return image, (1.0, 1.0), image.shape[:2] if image is not None else None
+
+    factor = reduction_factor(width, height, min_side)
+    if factor == 1:
+        image = cv2.imread(image_path)
+        return image, (1.0, 1.0), image.shape[:2] if image is not None else None
+
+    image = cv2.imread(image_path, REDUCED_READ_FLAGS[factor])
+    if image is None:
+        return None, (1.0, 1.0), None
+
+    # cv2 menerapkan orientasi EXIF, ukuran header PIL belum: tukar sisi jika gambar diputar
+    small_height, small_width = image.shape[:2]
+    if (small_width > small_height) != (width > height) and width != height:
+        width, height = height, width
+    return image, (width / small_width, height / small_height), (height, width)
+
+# Mengubah bounding box (x1, y1, x2, y2) dari gambar tereduksi ke koordinat resolusi penuh
+def scale_box(bbox, scale, full_shape):
+    scale_x, scale_y = scale
+    height, width = full_shape
+    x1, y1, x2, y2 = bbox
+    return [
+        min(max(x1 * scale_x, 0), width),
+        min(max(y1 * scale_y, 0), height),
+        min(max(x2 * scale_x, 0), width),
+        min(max(y2 * scale_y, 0), height)
+    ]
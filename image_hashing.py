@@ -0,0 +1,49 @@
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from env_settings import env_int
+
+# Hash isi gambar untuk metadata dan cache embeddings.
+# sha256 dari OpenSSL memakai instruksi SHA CPU sehingga lebih cepat dari md5, dan file dibaca
+# per blok (tidak memuat seluruh file ke memori).
+# Hash md5 lama (tanpa prefix) tetap dikenali agar metadata lama tidak perlu diproses ulang.
+HASH_ALGORITHM = "sha256"
+LEGACY_HASH_ALGORITHM = "md5"
+HASH_CHUNK_SIZE = 1 << 20
+DEFAULT_HASH_WORKERS = 1
+
+# Membaca jumlah thread hashing dari environment
+def hash_workers():
+    return env_int("HASH_WORKERS", DEFAULT_HASH_WORKERS, minimum=1)
+
+# Tanda tangan stat file (inode, ukuran, mtime_ns); sama berarti file dianggap tidak berubah
+def file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+# Algoritma dari string hash di metadata: "sha256-<hex>" atau md5 hex lama
+def hash_algorithm_of(image_hash):
+    if image_hash and "-" in image_hash:
+        return image_hash.split("-", 1)[0]
+    return LEGACY_HASH_ALGORITHM
+
+def hash_file(path, algorithm=HASH_ALGORITHM):
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    if algorithm == LEGACY_HASH_ALGORITHM:
+        return digest.hexdigest()
+    return f"{algorithm}-{digest.hexdigest()}"
+
+# Hash banyak file sekaligus: [(path, algoritma)] -> {path: hash}
+# hashlib melepas GIL untuk blok besar sehingga thread pool mempercepat disk + hashing
+def hash_files(jobs, workers=None):
+    workers = workers or hash_workers()
+    if workers <= 1 or len(jobs) <= 1:
+        return {path: hash_file(path, algorithm) for path, algorithm in jobs}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        hashes = executor.map(lambda job: hash_file(*job), jobs)
+        return {path: image_hash for (path, _), image_hash in zip(jobs, hashes)}
@@ -0,0 +1,259 @@
+import os
+import json
+
+import cv2
+import numpy as np
+
+from env_settings import env_int
+
+# Backend inferensi CPU untuk YOLO dan FaceNet. "native" memakai Ultralytics (PyTorch) dan
+# keras-facenet (TensorFlow); "onnx" dan "openvino" menjalankan model ONNX hasil
+# embedding_manager_utils/export_onnx_models.py tanpa mengimport PyTorch / TensorFlow sama sekali.
+# Model ONNX dibungkus dengan antarmuka yang sama (predict / embeddings) sehingga kode pemanggil tidak berubah.
+NATIVE_BACKEND = "native"
+INFERENCE_BACKENDS = (NATIVE_BACKEND, "onnx", "openvino")
+MODEL_PRECISIONS = ("fp32", "int8")
+DEFAULT_MODEL_DIR = "models"
+DEFAULT_DETECTOR_WEIGHTS = "yolov8m-face.pt"
+EMBEDDER_MODEL_NAME = "facenet"
+DETECT_IMAGE_SIZE = 640
+FACE_SIZE = 160
+LETTERBOX_COLOR = (114, 114, 114)
+MAX_DETECTIONS = 300
+
+# Membaca backend inferensi dari environment
+def inference_backend():
+    backend = os.environ.get("INFERENCE_BACKEND", NATIVE_BACKEND).strip().lower()
+    if backend not in INFERENCE_BACKENDS:
+        print(f"Warning: INFERENCE_BACKEND '{backend}' tidak dikenal, memakai {NATIVE_BACKEND}")
+        return NATIVE_BACKEND
+    return backend
+
+# Membaca direktori model hasil ekspor dari environment
+def model_dir():
+    return os.environ.get("MODEL_DIR", DEFAULT_MODEL_DIR)
+
+# Membaca presisi model ONNX dari environment: fp32, atau int8 (hasil quantize_models.py)
+def model_precision():
+    precision = os.environ.get("MODEL_PRECISION", "fp32").strip().lower()
+    if precision not in MODEL_PRECISIONS:
+        print(f"Warning: MODEL_PRECISION '{precision}' tidak dikenal, memakai fp32")
+        return "fp32"
+    return precision
+
+def precision_suffix(precision=None):
+    precision = precision or model_precision()
+    return "" if precision == "fp32" else f".{precision}"
+
+def detector_model_path(weights=DEFAULT_DETECTOR_WEIGHTS, precision=None):
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    return os.path.join(model_dir(), stem + precision_suffix(precision) + ".onnx")
+
+def embedder_model_path(precision=None):
+    return os.path.join(model_dir(), EMBEDDER_MODEL_NAME + precision_suffix(precision) + ".onnx")
+
+# Metadata model ONNX (nama kelas, ukuran input) disimpan di file .json di samping file .onnx
+def metadata_path(model_path):
+    return os.path.splitext(model_path)[0] + ".json"
+
+def load_model_metadata(model_path):
+    try:
+        with open(metadata_path(model_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_model_metadata(model_path, metadata):
+    with open(metadata_path(model_path), "w") as f:
+        json.dump(metadata, f, indent=2)
+
+# Jumlah thread runtime mengikuti batas thread worker (lihat sharded_classify.worker_env)
+def runtime_threads():
+    return env_int("OMP_NUM_THREADS", 0, minimum=0)
+
+class OnnxRuntimeSession:
+    def __init__(self, model_path):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("INFERENCE_BACKEND=onnx membutuhkan paket onnxruntime (pip install onnxruntime)")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = runtime_threads()
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+class OpenVinoSession:
+    def __init__(self, model_path):
+        try:
+            import openvino as ov
+        except ImportError:
+            raise ImportError("INFERENCE_BACKEND=openvino membutuhkan paket openvino (pip install openvino)")
+
+        config = {"PERFORMANCE_HINT": "THROUGHPUT"}
+        threads = runtime_threads()
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        core = ov.Core()
+        self.compiled_model = core.compile_model(core.read_model(model_path), "CPU", config)
+        self.output = self.compiled_model.output(0)
+
+    def run(self, batch):
+        return self.compiled_model(batch)[self.output]
+
+def create_session(model_path, backend):
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model {model_path} tidak ditemukan, jalankan embedding_manager_utils/export_onnx_models.py"
+                                f" (dan quantize_models.py untuk model int8)")
+    if backend == "openvino":
+        return OpenVinoSession(model_path)
+    return OnnxRuntimeSession(model_path)
+
+class DetectionTensor:
+    """Array numpy dengan .cpu() / .numpy() seperti tensor Ultralytics"""
+
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+class DetectionBoxes:
+    """Pengganti Results.boxes Ultralytics: .xyxy, .conf, len(), dan iterasi per box"""
+
+    def __init__(self, xyxy, conf):
+        self.xyxy = DetectionTensor(xyxy)
+        self.conf = DetectionTensor(conf)
+
+    def __len__(self):
+        return len(self.conf.array)
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield DetectionBoxes(self.xyxy.array[k:k + 1], self.conf.array[k:k + 1])
+
+class DetectionResult:
+    def __init__(self, xyxy, conf):
+        self.boxes = DetectionBoxes(xyxy, conf)
+
+# Letterbox seperti Ultralytics: resize dengan rasio tetap lalu padding abu-abu ke image_size x image_size
+def letterbox(image, image_size=DETECT_IMAGE_SIZE):
+    height, width = image.shape[:2]
+    ratio = min(image_size / height, image_size / width)
+    new_width, new_height = int(round(width * ratio)), int(round(height * ratio))
+    if (new_width, new_height) != (width, height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+
+    pad_x = (image_size - new_width) / 2
+    pad_y = (image_size - new_height) / 2
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+    return image, ratio, (left, top)
+
+class OnnxFaceDetector:
+    """Detektor wajah YOLOv8 dari file ONNX dengan antarmuka predict() seperti Ultralytics YOLO.
+
+    Gambar numpy dianggap BGR seperti di Ultralytics. Output model (batch, 4 + kelas, anchor)
+    difilter dengan conf, di-NMS, lalu dikembalikan ke koordinat gambar asli.
+    """
+
+    def __init__(self, model_path, backend="onnx"):
+        metadata = load_model_metadata(model_path)
+        self.model_path = model_path
+        self.backend = backend
+        self.image_size = int(metadata.get("image_size", DETECT_IMAGE_SIZE))
+        self.num_classes = len(metadata.get("names", ["face"])) or 1
+        self.session = create_session(model_path, backend)
+
+    def preprocess(self, images):
+        batch = []
+        transforms = []
+        for image in images:
+            padded, ratio, pad = letterbox(image, self.image_size)
+            batch.append(padded[:, :, ::-1].transpose(2, 0, 1))
+            transforms.append((ratio, pad, image.shape[:2]))
+        return np.ascontiguousarray(np.stack(batch), dtype=np.float32) / 255.0, transforms
+
+    def postprocess(self, output, transform, conf, iou):
+        predictions = output.T  # (anchor, 4 + kelas [+ keypoints])
+        scores = predictions[:, 4:4 + self.num_classes].max(axis=1)
+        keep = scores >= conf
+        predictions, scores = predictions[keep], scores[keep]
+        if not len(scores):
+            return DetectionResult(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32))
+
+        centers, sizes = predictions[:, :2], predictions[:, 2:4]
+        boxes = np.concatenate([centers - sizes / 2, sizes], axis=1)
+        indices = cv2.dnn.NMSBoxes(boxes.tolist(), scores.tolist(), conf, iou)
+        indices = np.array(indices, dtype=np.int64).reshape(-1)[:MAX_DETECTIONS]
+
+        ratio, (pad_x, pad_y), (height, width) = transform
+        xyxy = boxes[indices].copy()
+        xyxy[:, 2:] += xyxy[:, :2]
+        xyxy -= [pad_x, pad_y, pad_x, pad_y]
+        xyxy /= ratio
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, width)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, height)
+        return DetectionResult(xyxy.astype(np.float32), scores[indices].astype(np.float32))
+
+    def predict(self, images, conf=0.25, iou=0.7, verbose=False, **kwargs):
+        if isinstance(images, np.ndarray) and images.ndim == 3:
+            images = [images]
+        if not len(images):
+            return []
+        batch, transforms = self.preprocess(images)
+        outputs = self.session.run(batch)
+        return [self.postprocess(output, transform, conf, iou) for output, transform in zip(outputs, transforms)]
+
+    def __call__(self, images, **kwargs):
+        return self.predict(images, **kwargs)
+
+# Standarisasi per gambar seperti keras-facenet sebelum model dijalankan
+def standardize_faces(faces):
+    faces = np.asarray(faces, dtype=np.float32)
+    mean = faces.mean(axis=(1, 2, 3), keepdims=True)
+    std = np.maximum(faces.std(axis=(1, 2, 3), keepdims=True), 1.0 / np.sqrt(faces[0].size))
+    return (faces - mean) / std
+
+class OnnxFaceEmbedder:
+    """FaceNet dari file ONNX dengan antarmuka embeddings() seperti keras_facenet.FaceNet"""
+
+    def __init__(self, model_path, backend="onnx"):
+        self.model_path = model_path
+        self.backend = backend
+        self.session = create_session(model_path, backend)
+
+    def embeddings(self, images):
+        if not len(images):
+            return np.zeros((0, 512), dtype=np.float32)
+        return self.session.run(standardize_faces(images))
+
+# Model INT8 hanya tersedia sebagai ONNX; backend native selalu memakai bobot float
+def warn_native_precision(backend):
+    if backend == NATIVE_BACKEND and model_precision() != "fp32":
+        print(f"Warning: MODEL_PRECISION={model_precision()} diabaikan untuk backend native, "
+              f"pilih INFERENCE_BACKEND=onnx atau openvino")
+
+def load_detector(weights=DEFAULT_DETECTOR_WEIGHTS, backend=None, precision=None):
+    backend = backend or inference_backend()
+    if backend == NATIVE_BACKEND:
+        warn_native_precision(backend)
+        from ultralytics import YOLO
+        return YOLO(weights)
+    return OnnxFaceDetector(detector_model_path(weights, precision), backend)
+
+def load_embedder(backend=None, precision=None):
+    backend = backend or inference_backend()
+    if backend == NATIVE_BACKEND:
+        warn_native_precision(backend)
+        from keras_facenet import FaceNet
+        return FaceNet()
+    return OnnxFaceEmbedder(embedder_model_path(precision), backend)
@@ -0,0 +1,231 @@
+import os
+import threading
+import time
+
+from inference_backends import inference_backend, model_precision, load_detector, load_embedder, NATIVE_BACKEND
+from embedding_buckets import BucketedEmbedder
+from face_batching import embed_batch_size
+from env_settings import env_flag
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Registry model per proses: YOLO dan FaceNet dimuat sekali (lazy, thread-safe) lalu dipakai
+# bersama oleh klasifikasi, update / reprocess / rebuild embeddings, dan halaman admin.
+DEFAULT_DETECTOR_WEIGHTS = "yolov8m-face.pt"
+
+# Resident set size proses saat ini dalam byte (None jika tidak bisa diukur)
+def current_rss():
+    if psutil is not None:
+        return psutil.Process(os.getpid()).memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class SharedModel:
+    """Pembungkus model bersama: setiap pemanggilan method diserialkan dengan lock.
+
+    Predictor Ultralytics dan model Keras tidak aman dipanggil bersamaan dari
+    beberapa thread (misal job klasifikasi dan update embeddings dari admin),
+    jadi panggilan antar thread diantrikan, bukan memuat salinan model kedua.
+    """
+
+    def __init__(self, name, model):
+        self.name = name
+        self.model = model
+        self.lock = threading.RLock()
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            return self.model(*args, **kwargs)
+
+    def __getattr__(self, attr_name):
+        attr = getattr(self.model, attr_name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            with self.lock:
+                return attr(*args, **kwargs)
+        return locked
+
+class ModelRegistry:
+    def __init__(self):
+        self._models = {}
+        self._stats = {}
+        self._load_locks = {}
+        self._lock = threading.Lock()
+        self._load_hooks = []
+
+    def add_load_hook(self, hook):
+        """hook(name, stats) dipanggil setiap kali sebuah model selesai dimuat"""
+        self._load_hooks.append(hook)
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def get(self, name, factory):
+        """Mengembalikan model bernama `name`, memuatnya dengan factory() jika belum ada"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Satu lock per model: FaceNet bisa dimuat selagi YOLO sedang dimuat di thread lain
+        with load_lock:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            self._stats[name] = {"state": "loading", "started_at": time.time()}
+            rss_before = current_rss()
+            start_time = time.perf_counter()
+            try:
+                model = SharedModel(name, factory())
+            except Exception as e:
+                self._stats[name] = {"state": "error", "error": str(e)}
+                raise
+
+            rss_after = current_rss()
+            stats = {
+                "state": "loaded",
+                "load_seconds": time.perf_counter() - start_time,
+                "rss_delta_bytes": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+                "loaded_at": time.time()
+            }
+            self._stats[name] = stats
+            self._models[name] = model
+
+        rss_delta = stats["rss_delta_bytes"]
+        print(f"Model {name} loaded in {stats['load_seconds']:.2f} seconds"
+              + (f", RSS +{rss_delta / 1e6:.0f} MB" if rss_delta is not None else ""))
+        for hook in self._load_hooks:
+            try:
+                hook(name, stats)
+            except Exception as e:
+                print(f"Warning: Model load hook gagal untuk {name}: {e}")
+        return model
+
+    def stats(self):
+        """Status, waktu muat, dan selisih RSS per model: {nama: {...}}"""
+        return {name: dict(stats) for name, stats in self._stats.items()}
+
+# Registry global untuk proses ini
+model_registry = ModelRegistry()
+
+# Nama model di registry menyertakan backend non-native dan presisinya, misal "yolo:yolov8m-face.pt@onnx-int8"
+def backend_suffix(backend=None):
+    backend = backend or inference_backend()
+    if backend == NATIVE_BACKEND:
+        return ""
+    precision = model_precision()
+    return f"@{backend}" + ("" if precision == "fp32" else f"-{precision}")
+
+def yolo_model_name(weights=DEFAULT_DETECTOR_WEIGHTS):
+    return f"yolo:{os.path.basename(weights)}{backend_suffix()}"
+
+def get_yolo_model(weights=DEFAULT_DETECTOR_WEIGHTS):
+    # Backend dibaca saat model pertama kali dimuat; ultralytics / keras hanya diimport untuk backend native
+    return model_registry.get(yolo_model_name(weights), lambda: load_detector(weights))
+
+FACENET_MODEL_NAME = "facenet"
+
+def face_embedder_name():
+    return FACENET_MODEL_NAME + backend_suffix()
+
+def get_face_embedder():
+    # Panggilan embeddings() dipad ke ukuran bucket tetap (EMBED_BUCKETS) agar graph tidak di-trace ulang
+    return model_registry.get(face_embedder_name(), lambda: BucketedEmbedder(load_embedder()))
+
+def model_stats():
+    return model_registry.stats()
+
+# --- Warm-up di background ---
+# Web process langsung melayani request; model dimuat dan dipanaskan dengan batch dummy di thread
+# terpisah sehingga job pertama tidak menanggung waktu inisialisasi TensorFlow / graph YOLO.
+WARMUP_IMAGE_SIZE = 640
+WARMUP_FACE_SIZE = 160
+
+warmup_ready = threading.Event()
+warmup_status = {"state": "idle", "timings": {}}
+_warmup_lock = threading.Lock()
+
+# Membaca dari environment apakah warm-up dijalankan saat aplikasi start
+def warmup_enabled():
+    return env_flag("MODEL_WARMUP", True)
+
+def _timed(timings, key, func):
+    start_time = time.perf_counter()
+    result = func()
+    timings[key] = round(time.perf_counter() - start_time, 3)
+    return result
+
+def warm_up_models():
+    """Memuat YOLO dan FaceNet lalu menjalankan satu batch dummy melalui keduanya"""
+    import numpy as np
+
+    timings = warmup_status["timings"]
+    warmup_status.update({"state": "warming", "started_at": time.time()})
+    try:
+        yolo_model = _timed(timings, "yolo_load_seconds", get_yolo_model)
+        embedder = _timed(timings, "facenet_load_seconds", get_face_embedder)
+
+        dummy_image = np.zeros((WARMUP_IMAGE_SIZE, WARMUP_IMAGE_SIZE, 3), dtype=np.uint8)
+        dummy_face = np.zeros((WARMUP_FACE_SIZE, WARMUP_FACE_SIZE, 3), dtype=np.uint8)
+        _timed(timings, "yolo_warmup_seconds", lambda: yolo_model.predict([dummy_image], verbose=False))
+        # Semua bucket hingga EMBED_BATCH_SIZE dipanaskan: batch sisa berukuran kecil juga tidak men-trace graph
+        _timed(timings, "facenet_warmup_seconds", lambda: embedder.warm_up(dummy_face, embed_batch_size()))
+
+        warmup_status.update({"state": "ready", "finished_at": time.time()})
+        print(f"Model warm-up selesai: {timings}")
+    except Exception as e:
+        # Job tetap bisa berjalan: model akan dicoba dimuat lagi saat klasifikasi
+        warmup_status.update({"state": "error", "error": str(e), "finished_at": time.time()})
+        print(f"Warning: Model warm-up gagal: {e}")
+    finally:
+        warmup_ready.set()
+
+def start_warm_up():
+    """Menjalankan warm_up_models sekali di daemon thread (pemanggilan berikutnya diabaikan)"""
+    with _warmup_lock:
+        if warmup_status["state"] != "idle":
+            return False
+        warmup_status["state"] = "pending"
+
+    thread = threading.Thread(target=warm_up_models, name="model-warmup")
+    thread.daemon = True
+    thread.start()
+    return True
+
+def wait_until_ready(timeout=None):
+    """Menunggu warm-up selesai (berhasil atau gagal); langsung kembali jika warm-up tidak dijalankan"""
+    if warmup_status["state"] == "idle":
+        return True
+    return warmup_ready.wait(timeout)
+
+# Model utama (YOLO dan FaceNet untuk backend saat ini) sudah dimuat di registry
+def models_loaded():
+    return model_registry.is_loaded(yolo_model_name()) and model_registry.is_loaded(face_embedder_name())
+
+def readiness():
+    """Status kesiapan model untuk endpoint readiness"""
+    status = {key: value for key, value in warmup_status.items() if key != "timings"}
+    state = warmup_status["state"]
+    # "idle": warm-up tidak dijalankan, model dimuat saat job pertama.
+    # "error": job tetap berjalan dan memuat model secara lazy; siap lagi begitu keduanya berhasil dimuat
+    status["ready"] = state in ("ready", "idle") or (state == "error" and models_loaded())
+    status["warmup_timings"] = dict(warmup_status["timings"])
+    status["models"] = model_stats()
+
+    errors = {name: stats["error"] for name, stats in status["models"].items() if stats.get("state") == "error"}
+    if state == "error":
+        errors["warmup"] = warmup_status.get("error")
+    if errors:
+        status["errors"] = errors
+    return status
@@ -1,16 +1,14 @@
-import pickle
 import numpy as np
-import os
+from embedding_store import embeddings_exist, load_embeddings
 
-# Path file face embeddings
+# Path file face embeddings (store columnar face_embeddings_store/ dibaca otomatis jika ada)
 input_path = "face_embeddings.pkl"
 
-# Membaca file .pkl
-if not os.path.exists(input_path):
+# Membaca embeddings dari store columnar atau file .pkl
+if not embeddings_exist(input_path):
     print(f"File {input_path} tidak ditemukan.")
 else:
-    with open(input_path, "rb") as f:
-        embeddings = pickle.load(f)
+    embeddings = load_embeddings(input_path)
     
     # Menampilkan isi embedding
     print("Daftar Orang dalam Database:")
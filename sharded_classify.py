@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+import tempfile
+from datetime import datetime
+from env_settings import env_int
+
+# Klasifikasi multi-proses: daftar gambar dibagi ke N proses worker, masing-masing dengan
+# instance YOLO / FaceNet sendiri, lalu folder per orang, UNKNOWN, VISUALIZED, dan labels
+# digabung menjadi satu hasil. Worker dijalankan sebagai subprocess skrip ini (bukan
+# multiprocessing) agar kode start-up app.py tidak ikut dijalankan ulang di setiap worker.
+DEFAULT_CLASSIFY_WORKERS = 1
+MIN_IMAGES_PER_WORKER = 20
+POLL_SECONDS = 0.2
+
+# Variabel environment yang mengatur jumlah thread library numerik / TensorFlow / PyTorch
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "TF_NUM_INTRAOP_THREADS")
+
+# Membaca jumlah proses worker klasifikasi dari environment
+def classify_workers():
+    return env_int("CLASSIFY_WORKERS", DEFAULT_CLASSIFY_WORKERS, minimum=1)
+
+# Thread per worker agar total thread semua worker tidak melebihi jumlah core
+def threads_per_worker(workers, cpu_count=None):
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return max(cpu_count // workers, 1)
+
+def worker_env(threads, workers):
+    from batch_tuning import memory_limit_bytes
+
+    env = dict(os.environ)
+    for name in THREAD_ENV_VARS:
+        env[name] = str(threads)
+    env["TF_NUM_INTEROP_THREADS"] = "1"
+    # Pipeline di dalam worker juga dibatasi supaya tidak berebut core dengan worker lain
+    env["DECODE_WORKERS"] = str(env_int("DECODE_WORKERS", threads, minimum=1, maximum=threads))
+    env["WRITE_WORKERS"] = str(env_int("WRITE_WORKERS", threads, minimum=1, maximum=threads))
+    env["MODEL_WARMUP"] = "false"
+    # Batas memori auto-tuning batch dibagi rata antar worker
+    memory_limit = memory_limit_bytes()
+    if memory_limit:
+        env["CLASSIFY_MEMORY_LIMIT_MB"] = str(int(memory_limit / 1e6 / workers))
+    return env
+
+# Membagi daftar file secara round-robin agar setiap shard mendapat campuran gambar yang serupa
+def shard_files(image_files, workers):
+    return [image_files[k::workers] for k in range(workers)]
+
+# Memindahkan seluruh isi folder shard ke output gabungan (nama file unik karena berasal dari satu folder input)
+def merge_shard_output(shard_folder, output_folder):
+    for root, dirs, files in os.walk(shard_folder):
+        target_root = os.path.join(output_folder, os.path.relpath(root, shard_folder))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            os.replace(os.path.join(root, name), os.path.join(target_root, name))
+    shutil.rmtree(shard_folder, ignore_errors=True)
+
+def stop_workers(processes):
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def classify_faces_sharded(input_folder, output_folder=None, workers=None, confidence_threshold=0.6,
+                           batch_size=None, match_scope="batch", threads=None, force_processes=False):
+    """Seperti classify_faces, tetapi gambar diproses oleh `workers` proses paralel
+
+    force_processes=True selalu memakai proses worker (juga untuk 1 worker / job kecil),
+    misalnya agar benchmark membandingkan konfigurasi yang sama.
+    """
+    import classify_faces as classifier
+    import utils
+
+    workers = workers or classify_workers()
+    if output_folder is None:
+        output_folder = "(Classified) " + os.path.basename(input_folder)
+
+    image_files = [f for f in os.listdir(input_folder) if f.lower().endswith((".jpg", ".png", ".jpeg"))]
+    if not force_processes:
+        workers = min(workers, max(len(image_files) // MIN_IMAGES_PER_WORKER, 1))
+
+    # Job kecil (atau 1 worker) tidak sebanding dengan biaya memuat model di proses baru
+    if workers <= 1 and not force_processes:
+        return classifier.classify_faces(input_folder, output_folder, confidence_threshold=confidence_threshold,
+                                         batch_size=batch_size, match_scope=match_scope)
+
+    classifier.reset_cancel_flag()
+    print(f"Starting sharded classification ({workers} workers) at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    start_time = time.time()
+
+    threads = threads or threads_per_worker(workers)
+    env = worker_env(threads, workers)
+    work_dir = tempfile.mkdtemp(prefix="classify_shards_")
+    processes = []
+    shard_folders = []
+
+    try:
+        utils.clear_folder(output_folder)
+
+        for k, shard in enumerate(shard_files(image_files, workers)):
+            shard_folder = f"{output_folder}.shard-{k}"
+            files_path = os.path.join(work_dir, f"shard-{k}.json")
+            with open(files_path, "w") as f:
+                json.dump(shard, f)
+
+            command = [sys.executable, os.path.abspath(__file__), "--worker",
+                       "--input", input_folder, "--output", shard_folder, "--files", files_path,
+                       "--confidence", str(confidence_threshold), "--match-scope", match_scope]
+            if batch_size is not None:
+                command += ["--batch-size", str(batch_size)]
+            processes.append(subprocess.Popen(command, env=env))
+            shard_folders.append(shard_folder)
+
+        print(f"  {len(image_files)} images, {threads} threads per worker")
+
+        # Tunggu semua worker; pembatalan atau worker yang gagal menghentikan semuanya
+        while any(process.poll() is None for process in processes):
+            if classifier.processing_cancelled.is_set():
+                break
+            if any(process.poll() not in (None, 0) for process in processes):
+                break
+            time.sleep(POLL_SECONDS)
+
+        failed = [k for k, process in enumerate(processes) if process.poll() not in (None, 0)]
+        if classifier.processing_cancelled.is_set() or failed:
+            stop_workers(processes)
+            for shard_folder in shard_folders:
+                shutil.rmtree(shard_folder, ignore_errors=True)
+            if os.path.exists(output_folder):
+                shutil.rmtree(output_folder)
+            if failed and not classifier.processing_cancelled.is_set():
+                print(f"Error during processing: worker shard {failed} gagal")
+            return None, None, None
+
+        # Gabungkan hasil semua shard lalu buat satu file ZIP
+        for shard_folder in shard_folders:
+            if os.path.isdir(shard_folder):
+                merge_shard_output(shard_folder, output_folder)
+
+        zip_output_path = classifier.zip_output_for(output_folder)
+        utils.zip_folder(output_folder, zip_output_path)
+
+        processing_time = time.time() - start_time
+        print("\n" + "=" * 50)
+        print("SHARDED CLASSIFICATION SUMMARY")
+        print("=" * 50)
+        print(f"Input folder: {input_folder}")
+        print(f"Output folder: {output_folder}")
+        print(f"Total images processed: {len(image_files)}")
+        print(f"Workers: {workers} x {threads} threads")
+        print(f"Processing time: {processing_time:.2f} seconds")
+        print("=" * 50)
+
+        return output_folder, zip_output_path, processing_time
+
+    except Exception as e:
+        stop_workers(processes)
+        print(f"Error during processing: {str(e)}")
+        for shard_folder in shard_folders:
+            shutil.rmtree(shard_folder, ignore_errors=True)
+        if os.path.exists(output_folder):
+            shutil.rmtree(output_folder)
+        return None, None, None
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# Dijalankan di proses worker: klasifikasi satu shard tanpa ZIP
+def run_worker(args):
+    from classify_faces import classify_faces
+
+    with open(args.files) as f:
+        image_files = json.load(f)
+
+    output_folder, _, _ = classify_faces(args.input, args.output, confidence_threshold=args.confidence,
+                                         batch_size=args.batch_size, match_scope=args.match_scope,
+                                         image_files=image_files, make_zip=False)
+    return 0 if output_folder is not None else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Klasifikasi wajah multi-proses (satu shard per worker)")
+    parser.add_argument("--worker", action="store_true", help="Jalankan sebagai proses worker untuk satu shard")
+    parser.add_argument("--input", type=str, required=True, help="Folder gambar input")
+    parser.add_argument("--output", type=str, default=None, help="Folder output")
+    parser.add_argument("--files", type=str, default=None, help="File JSON berisi daftar gambar shard (mode worker)")
+    parser.add_argument("--workers", type=int, default=None, help="Jumlah proses worker (default: CLASSIFY_WORKERS)")
+    parser.add_argument("--confidence", type=float, default=0.6, help="Batas kepercayaan deteksi wajah")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Jumlah gambar per batch YOLO (default: otomatis mulai dari CLASSIFY_BATCH_SIZE)")
+    parser.add_argument("--match-scope", type=str, default="batch", choices=["batch", "job"],
+                        help="Cocokkan wajah per batch YOLO atau sekali per job")
+
+    args = parser.parse_args()
+    if args.worker:
+        sys.exit(run_worker(args))
+
+    classify_faces_sharded(args.input, args.output, workers=args.workers, confidence_threshold=args.confidence,
+                           batch_size=args.batch_size, match_scope=args.match_scope)
@@ -0,0 +1,133 @@
+import queue
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from env_settings import env_int
+
+# Pipeline bertahap untuk klasifikasi: setiap tahap berjalan di thread / pool sendiri dan
+# dihubungkan queue berukuran terbatas, sehingga decode, inferensi, dan penulisan ke disk
+# saling tumpang tindih dan throughput mendekati tahap yang paling lambat.
+DEFAULT_DECODE_WORKERS = 4
+DEFAULT_WRITE_WORKERS = 4
+DEFAULT_QUEUE_BATCHES = 4
+POLL_SECONDS = 0.1
+
+# Penanda akhir aliran data di queue
+END_OF_STREAM = object()
+
+# Jumlah thread untuk membaca / decode gambar
+def decode_workers():
+    return env_int("DECODE_WORKERS", DEFAULT_DECODE_WORKERS, minimum=1)
+
+# Jumlah thread untuk menulis hasil (copy, visualisasi, label)
+def write_workers():
+    return env_int("WRITE_WORKERS", DEFAULT_WRITE_WORKERS, minimum=1)
+
+# Kapasitas queue antar tahap dalam satuan batch (backpressure)
+def queue_batches():
+    return env_int("PIPELINE_QUEUE_BATCHES", DEFAULT_QUEUE_BATCHES, minimum=1)
+
+class StagedPipeline:
+    """Koordinasi thread tahap pipeline, queue terbatas, pool write-behind, dan pembatalan.
+
+    Semua tahap berhenti jika `cancelled` (Event pembatalan job) di-set atau salah satu tahap
+    gagal; exception tahap pertama dilempar ulang oleh close(). put() / get() memeriksa kondisi
+    berhenti secara berkala sehingga tidak ada thread yang tertahan di queue penuh / kosong.
+    """
+
+    def __init__(self, cancelled, write_workers_count=None, max_pending_writes=None):
+        self.cancelled = cancelled
+        self.failed = threading.Event()
+        self.error = None
+        self.threads = []
+        self.stage_seconds = defaultdict(float)
+        self._stats_lock = threading.Lock()
+
+        workers = write_workers_count or write_workers()
+        self.writer = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pipeline-write")
+        self.pending_writes = threading.BoundedSemaphore(max_pending_writes or workers * 4)
+
+    def stopped(self):
+        return self.cancelled.is_set() or self.failed.is_set()
+
+    def fail(self, error):
+        if self.error is None:
+            self.error = error
+        self.failed.set()
+
+    @contextmanager
+    def timed(self, stage):
+        """Menambahkan waktu sibuk tahap ini ke statistik (dijumlahkan antar thread pool)"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._stats_lock:
+                self.stage_seconds[stage] += time.perf_counter() - start_time
+
+    def put(self, q, item):
+        """put dengan backpressure; False jika pipeline berhenti sebelum ada tempat"""
+        while not self.stopped():
+            try:
+                q.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, q):
+        """get yang mengembalikan END_OF_STREAM jika pipeline berhenti"""
+        while True:
+            try:
+                return q.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                if self.stopped():
+                    return END_OF_STREAM
+
+    def start_stage(self, name, target, *args):
+        def run():
+            try:
+                target(*args)
+            except Exception as e:
+                self.fail(e)
+
+        thread = threading.Thread(target=run, name=f"pipeline-{name}")
+        thread.daemon = True
+        thread.start()
+        self.threads.append(thread)
+        return thread
+
+    def submit_write(self, func, *args):
+        """Menjadwalkan penulisan ke pool write-behind; menunggu jika terlalu banyak yang antri"""
+        while not self.pending_writes.acquire(timeout=POLL_SECONDS):
+            if self.stopped():
+                return False
+
+        def run():
+            try:
+                if not self.stopped():
+                    with self.timed("write"):
+                        func(*args)
+            except Exception as e:
+                self.fail(e)
+            finally:
+                self.pending_writes.release()
+
+        self.writer.submit(run)
+        return True
+
+    def close(self, abort=False):
+        """Menunggu semua tahap dan penulisan selesai lalu melempar ulang error tahap (jika ada)"""
+        if abort:
+            self.failed.set()
+        for thread in self.threads:
+            thread.join()
+        self.writer.shutdown(wait=True)
+        if self.error is not None and not abort:
+            raise self.error
+
+    def summary(self):
+        stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in self.stage_seconds.items())
+        return f"Pipeline busy time: {stages}"
@@ -0,0 +1,79 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Agar modul di root project bisa diimport saat pytest dijalankan dari root maupun folder tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+
+from embedding_store import normalize_rows
+from inference_backends import DetectionResult
+
+# Embedding sintetis: beberapa orang, masing-masing beberapa vektor di sekitar satu pusat acak
+def clustered_embeddings(persons=20, per_person=5, dim=64, noise=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.normal(size=(persons, dim)))
+    return {f"person_{p}": [centers[p] + noise * rng.normal(size=dim) / np.sqrt(dim) for _ in range(per_person)]
+            for p in range(persons)}, centers
+
+# Metadata minimal per gambar: satu gambar per embedding, dengan indeks embedding-nya
+def image_metadata(embeddings):
+    return {name: {f"img{i}.jpg": {"embedding_indices": [i]} for i in range(len(vectors))}
+            for name, vectors in embeddings.items()}
+
+class BlobDetector:
+    """Detektor palsu: setiap kotak terang adalah wajah. Seperti YOLO yang memperkecil input,
+    kotak yang lebih kecil dari 1/50 sisi terpanjang input tidak terdeteksi."""
+
+    def __init__(self, confidence=0.9):
+        self.confidence = confidence
+        self.inputs = []
+
+    def predict(self, images, **kwargs):
+        self.inputs.append(len(images))
+        results = []
+        for image in images:
+            mask = (image.max(axis=2) > 127).astype(np.uint8)
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            min_side = max(image.shape[:2]) / 50
+            boxes = [(x, y, x + w, y + h) for x, y, w, h in map(cv2.boundingRect, contours)
+                     if max(w, h) >= min_side]
+            results.append(DetectionResult(np.array(boxes, dtype=np.float32).reshape(-1, 4),
+                                           np.full(len(boxes), self.confidence, dtype=np.float32)))
+        return results
+
+class ColorEmbedder:
+    """FaceNet palsu: embedding crop wajah adalah rata-rata warnanya (RGB)"""
+
+    def __init__(self):
+        self.batches = []
+
+    def embeddings(self, images):
+        self.batches.append(len(images))
+        return np.array([np.asarray(image, dtype=np.float32).reshape(-1, 3).mean(axis=0) for image in images],
+                        dtype=np.float32).reshape(-1, 3)
+
+    def summary(self):
+        return f"ColorEmbedder: {sum(self.batches)} faces"
+
+def image_with_faces(height, width, faces, colors=None):
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    for k, (x1, y1, x2, y2) in enumerate(faces):
+        image[y1:y2, x1:x2] = colors[k] if colors is not None else 255
+    return image
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    # Knob yang memengaruhi galeri / store / pipeline selalu memakai default kecuali test mengaturnya sendiri
+    for name in ("MATCH_MODE", "EMBEDDING_STORAGE", "EMBEDDING_FORMAT", "EMBEDDING_LOG_COMPACT_RATIO",
+                 "ANN_NPROBE", "CENTROID_TOP_K", "EMBED_BUCKETS", "DETECTION_FLOOR",
+                 "EMBEDDING_CACHE_DIR", "EMBEDDING_CACHE_MAX_MB", "DETECTION_CACHE_DIR", "DETECTION_CACHE_MAX_MB",
+                 "DETECTOR_CASCADE", "TILED_DETECTION", "REDUCED_DECODE", "BATCH_TUNING"):
+        monkeypatch.delenv(name, raising=False)
@@ -0,0 +1,76 @@
+import numpy as np
+
+from conftest import clustered_embeddings, image_metadata
+from embedding_store import save_embeddings, apply_embedding_changes, compact_store
+from gallery import FaceGallery, gallery_from_saved
+from ann_index import IVFIndex, load_index, refresh_index
+
+def make_gallery(seed=0, **kwargs):
+    embeddings, centers = clustered_embeddings(seed=seed, **kwargs)
+    return FaceGallery.from_embeddings(embeddings), centers
+
+def queries_near(centers, rng, noise=0.3):
+    return centers + noise * rng.normal(size=centers.shape) / np.sqrt(centers.shape[1])
+
+def test_ivf_recall_against_exact(rng):
+    gallery, centers = make_gallery(persons=50, per_person=8)
+    queries = queries_near(np.repeat(centers, 4, axis=0), rng)
+    exact_rows, exact_scores = gallery.best_matches(queries, exact=True)
+
+    gallery.index = IVFIndex.build(gallery, nprobe=8)
+    rows, scores = gallery.best_matches(queries)
+    assert np.mean(rows == exact_rows) >= 0.95
+    # Skor ANN tidak pernah lebih baik dari exact, dan sama persis jika barisnya sama
+    assert np.all(scores <= exact_scores + 1e-6)
+    same = rows == exact_rows
+    assert np.allclose(scores[same], exact_scores[same])
+
+def test_ivf_probing_all_lists_is_exact(rng):
+    gallery, centers = make_gallery(persons=30)
+    queries = queries_near(centers, rng)
+    exact_rows, _ = gallery.best_matches(queries, exact=True)
+    gallery.index = IVFIndex.build(gallery, nprobe=10 ** 6)
+    rows, _ = gallery.best_matches(queries)
+    assert np.array_equal(rows, exact_rows)
+
+def test_stale_index_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.setenv("MATCH_MODE", "ivf")
+    path = str(tmp_path / "face_embeddings_ivf.npz")
+    gallery, _ = make_gallery(seed=0)
+    refresh_index(path, gallery)
+    assert load_index(path, gallery) is not None
+
+    changed, _ = make_gallery(seed=1)
+    assert load_index(path, changed) is None
+
+def test_refresh_index_only_in_ivf_mode(tmp_path):
+    path = str(tmp_path / "face_embeddings_ivf.npz")
+    gallery, _ = make_gallery()
+    assert refresh_index(path, gallery) is None
+    assert not (tmp_path / "face_embeddings_ivf.npz").exists()
+
+def test_store_index_survives_compaction_but_not_changes(tmp_path, monkeypatch, rng):
+    monkeypatch.setenv("MATCH_MODE", "ivf")
+    embeddings_path = str(tmp_path / "face_embeddings.pkl")
+    path = str(tmp_path / "face_embeddings_ivf.npz")
+    embeddings, _ = clustered_embeddings(persons=10)
+    metadata = image_metadata(embeddings)
+    save_embeddings(embeddings_path, embeddings, metadata)
+    refresh_index(path, gallery_from_saved(embeddings_path))
+
+    # Mengganti embedding satu gambar tidak mengubah jumlah baris, tetapi indeks lama harus ditolak
+    apply_embedding_changes(embeddings_path, puts=[("person_0", "img0.jpg", [rng.normal(size=64)])])
+    changed = gallery_from_saved(embeddings_path)
+    assert load_index(path, changed) is None
+    refresh_index(path, changed)
+    assert load_index(path, changed) is not None
+
+    # Kompaksi tidak mengubah isi: indeks tetap dipakai
+    compact_store(embeddings_path, force=True)
+    compacted = gallery_from_saved(embeddings_path)
+    assert compacted.fingerprint() == changed.fingerprint()
+    assert load_index(path, compacted) is not None
+
+    # Tulis ulang penuh (rebuild) selalu membuat indeks lama basi
+    save_embeddings(embeddings_path, embeddings, metadata)
+    assert load_index(path, gallery_from_saved(embeddings_path)) is None
@@ -0,0 +1,74 @@
+import pytest
+
+from batch_tuning import BatchSizeTuner, memory_limit_bytes, MIN_IMPROVEMENT
+
+# Waktu batch sintetis: overhead tetap per panggilan + biaya per item yang naik tajam setelah `knee`
+# (misal cache CPU penuh), sehingga throughput terbaik ada di ukuran batch = knee
+def batch_seconds(size, knee=16):
+    per_item = 0.01 if size <= knee else 0.03
+    return 0.1 + size * per_item
+
+def run(tuner, batches, rss=lambda size: 0):
+    sizes = []
+    for _ in range(batches):
+        sizes.append(tuner.size)
+        tuner.observe(tuner.size, batch_seconds(tuner.size), rss=rss(tuner.size))
+    return sizes
+
+def throughput(size):
+    return size / batch_seconds(size)
+
+@pytest.mark.parametrize("initial_size,expected", [(1, 16), (5, 10), (16, 16), (24, 48)])
+def test_tuner_converges_to_best_throughput(initial_size, expected):
+    # Tuner mencoba ukuran awal x 2^k, jadi yang terbaik dicari di antara ukuran tersebut
+    # (24 -> 48 masih lebih cepat, 48 -> 64 membaik kurang dari MIN_IMPROVEMENT)
+    tuner = BatchSizeTuner("yolo", initial_size, max_size=64)
+    sizes = run(tuner, 40)
+    assert tuner.settled
+    assert tuner.size == expected
+    assert throughput(expected) * (1 + MIN_IMPROVEMENT) >= max(map(throughput, set(sizes)))
+    # Setelah stabil ukuran batch tidak berubah lagi
+    assert len(set(sizes[-20:])) == 1
+
+def test_tuner_stops_at_max_size():
+    # Overhead per panggilan besar: throughput terus membaik, ukuran berhenti di max_size
+    tuner = BatchSizeTuner("facenet", 8, max_size=100)
+    for _ in range(20):
+        tuner.observe(tuner.size, 1.0 + 0.001 * tuner.size, rss=0)
+    assert tuner.settled and tuner.size == 100
+
+def test_memory_pressure_backs_off_and_caps_growth():
+    limit = 1000
+    # RSS naik bersama ukuran batch; ukuran 32 ke atas melewati batas
+    rss = lambda size: 40 * size
+    tuner = BatchSizeTuner("yolo", 32, max_size=64, memory_limit=limit)
+    sizes = run(tuner, 30, rss)
+    assert sizes[0] == 32 and sizes[1] == 16
+    assert tuner.max_size == 16
+    assert max(sizes[1:]) <= 16
+
+def test_memory_backoff_only_repeats_while_rss_keeps_rising():
+    tuner = BatchSizeTuner("yolo", 32, max_size=64, memory_limit=1000)
+    tuner.observe(32, 1.0, rss=1500)
+    assert tuner.size == 16
+    # RSS tidak turun setelah batch diperkecil (allocator), tetapi juga tidak naik: tidak diperkecil lagi
+    tuner.observe(16, 0.5, rss=1500)
+    assert tuner.size == 16
+    tuner.observe(16, 0.5, rss=1800)
+    assert tuner.size == 8
+    for _ in range(5):
+        tuner.observe(8, 0.2, rss=1900)
+    assert tuner.size == 4
+    tuner.observe(4, 0.1, rss=1900)
+    assert tuner.size == 4
+
+def test_disabled_tuner_keeps_size_and_records_stats():
+    tuner = BatchSizeTuner("yolo", 5, enabled=False, memory_limit=1)
+    run(tuner, 10, rss=lambda size: 10**9)
+    assert tuner.size == 5
+    assert tuner.total_items == 50
+    assert "tetap" in tuner.summary()
+
+def test_memory_limit_from_environment(monkeypatch):
+    monkeypatch.setenv("CLASSIFY_MEMORY_LIMIT_MB", "1500")
+    assert memory_limit_bytes() == 1500 * 10**6
@@ -0,0 +1,59 @@
+import numpy as np
+
+from conftest import clustered_embeddings, image_metadata
+from embedding_store import save_embeddings, apply_embedding_changes
+from gallery import (FaceGallery, person_centroid, centroids_path_for, read_person_centroids,
+                     update_person_centroids, update_changed_centroids)
+from ann_index import IVFIndex, attach_search_index
+
+def test_centroid_prefilter_with_all_persons_is_exact(rng):
+    embeddings, centers = clustered_embeddings(persons=15)
+    gallery = FaceGallery.from_embeddings(embeddings)
+    centroids = np.stack([person_centroid(embeddings[name]) for name in gallery.names])
+    queries = centers + 0.3 * rng.normal(size=centers.shape) / np.sqrt(centers.shape[1])
+    exact_rows, _ = gallery.best_matches(queries, exact=True)
+
+    gallery.index = IVFIndex.from_person_centroids(gallery, centroids, top_k=len(gallery.names))
+    rows, _ = gallery.best_matches(queries)
+    assert np.array_equal(rows, exact_rows)
+
+def test_changed_centroids_match_full_recompute(tmp_path, monkeypatch, rng):
+    monkeypatch.setenv("MATCH_MODE", "centroid")
+    embeddings_path = str(tmp_path / "face_embeddings.pkl")
+    path = centroids_path_for(embeddings_path)
+    embeddings, _ = clustered_embeddings(persons=6)
+    save_embeddings(embeddings_path, embeddings, image_metadata(embeddings))
+    update_person_centroids(path, embeddings)
+
+    # Satu gambar diganti, satu orang dihapus, satu orang baru
+    replaced = [rng.normal(size=64) for _ in range(3)]
+    added = [rng.normal(size=64)]
+    apply_embedding_changes(embeddings_path, puts=[("person_1", "img0.jpg", replaced), ("person_new", "a.jpg", added)],
+                            deletes=[("person_2", None)])
+    update_changed_centroids(path, embeddings_path, ["person_1", "person_2", "person_new"])
+
+    expected = dict(embeddings, person_new=added)
+    expected["person_1"] = replaced + embeddings["person_1"][1:]
+    del expected["person_2"]
+    centroids = read_person_centroids(path)
+    assert sorted(centroids) == sorted(expected)
+    for name, vectors in expected.items():
+        assert np.allclose(centroids[name], person_centroid(vectors), atol=1e-6)
+
+def test_centroid_file_removed_outside_centroid_mode(tmp_path):
+    embeddings_path = str(tmp_path / "face_embeddings.pkl")
+    path = centroids_path_for(embeddings_path)
+    embeddings, _ = clustered_embeddings(persons=3)
+    save_embeddings(embeddings_path, embeddings)
+    update_person_centroids(path, embeddings)
+
+    update_changed_centroids(path, embeddings_path, ["person_0"])
+    assert not (tmp_path / path).exists()
+
+def test_attach_fills_missing_centroids_from_gallery(tmp_path, monkeypatch):
+    monkeypatch.setenv("MATCH_MODE", "centroid")
+    embeddings_path = str(tmp_path / "face_embeddings.pkl")
+    embeddings, _ = clustered_embeddings(persons=4)
+    gallery = attach_search_index(FaceGallery.from_embeddings(embeddings), embeddings_path)
+    expected = np.stack([person_centroid(embeddings[name]) for name in gallery.names])
+    assert np.allclose(gallery.index.centroids, expected, atol=1e-6)
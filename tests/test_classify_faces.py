@@ -0,0 +1,112 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import classify_faces
+from conftest import BlobDetector, ColorEmbedder, image_with_faces
+from gallery import FaceGallery
+from utils import find_match
+
+# Warna wajah (BGR) per orang; putih tidak mirip siapa pun (kosinus ~0.58 < 0.8)
+PERSON_COLORS = {"alice": (0, 0, 255), "bob": (0, 255, 0), "carol": (255, 0, 0)}
+UNKNOWN_COLOR = (255, 255, 255)
+KNOWN = {name: [np.array(color[::-1], dtype=np.float32)] for name, color in PERSON_COLORS.items()}
+
+# (nama file, [orang]); gambar tanpa wajah (dilewati, tidak ada di output) dan wajah tak dikenal ikut diuji
+IMAGES = [
+    ("01.png", ["alice"]),
+    ("02.png", []),
+    ("03.png", ["bob", "carol", "unknown"]),
+    ("04.png", ["unknown"]),
+    ("05.png", ["carol", "alice"]),
+    ("06.png", []),
+    ("07.png", ["bob"]),
+]
+
+class StaticGalleryCache:
+    def __init__(self, gallery):
+        self.gallery = gallery
+
+    def get(self):
+        return self.gallery
+
+def write_images(folder):
+    os.makedirs(folder)
+    for image_name, faces in IMAGES:
+        boxes = [(20 + 60 * k, 30, 60 + 60 * k, 70) for k in range(len(faces))]
+        colors = [PERSON_COLORS.get(face, UNKNOWN_COLOR) for face in faces]
+        cv2.imwrite(os.path.join(folder, image_name), image_with_faces(120, 200, boxes, colors))
+
+# Acuan per gambar: deteksi, crop, embed, dan cocokkan satu gambar setiap kali dengan find_match
+def per_image_labels(folder):
+    detector, embedder = BlobDetector(), ColorEmbedder()
+    labels = {}
+    for image_name, _ in IMAGES:
+        image = cv2.imread(os.path.join(folder, image_name))
+        bboxes, _ = classify_faces.detected_boxes(detector.predict([image])[0], 0.6)
+        embeddings = embedder.embeddings(classify_faces.crop_faces(image, bboxes))
+        labels[image_name] = [find_match(embedding, KNOWN) or "Unknown" for embedding in embeddings]
+    return labels
+
+# Label per gambar dari folder output: folder orang / UNKNOWN dan jumlah baris anotasi
+def output_labels(output_folder):
+    placed = {}
+    for folder in sorted(os.listdir(output_folder)):
+        if folder in ("VISUALIZED", "labels"):
+            continue
+        for image_name in os.listdir(os.path.join(output_folder, folder)):
+            placed.setdefault(image_name, set()).add(folder)
+    faces = {}
+    for label_file in os.listdir(os.path.join(output_folder, "labels")):
+        with open(os.path.join(output_folder, "labels", label_file)) as f:
+            faces[os.path.splitext(label_file)[0] + ".png"] = len(f.read().splitlines())
+    return placed, faces
+
+@pytest.mark.parametrize("match_scope", ["batch", "job"])
+def test_match_scope_gives_same_labels_as_per_image_matching(tmp_path, monkeypatch, match_scope):
+    input_folder = str(tmp_path / "input")
+    write_images(input_folder)
+    monkeypatch.setattr(classify_faces, "get_gallery_cache",
+                        lambda path: StaticGalleryCache(FaceGallery.from_embeddings(KNOWN)))
+    monkeypatch.setattr(classify_faces, "get_yolo_model", lambda *args: BlobDetector())
+    monkeypatch.setattr(classify_faces, "get_face_embedder", ColorEmbedder)
+
+    output_folder = str(tmp_path / match_scope)
+    result = classify_faces.classify_faces(input_folder, output_folder, batch_size=2, embed_batch_size=3,
+                                           match_scope=match_scope, make_zip=False)
+    assert result[0] == output_folder
+
+    expected = per_image_labels(input_folder)
+    assert sorted(expected["03.png"]) == ["Unknown", "bob", "carol"]
+    placed, faces = output_labels(output_folder)
+    for image_name, labels in expected.items():
+        folders = {label for label in labels if label != "Unknown"} or {"UNKNOWN"}
+        assert placed.get(image_name) == (folders if labels else None), image_name
+        assert faces.get(image_name, 0) == len(labels)
+    assert sorted(os.listdir(os.path.join(output_folder, "VISUALIZED"))) == ["01.png", "03.png", "05.png", "07.png"]
+
+class CancellingEmbedder(ColorEmbedder):
+    """Membatalkan job saat batch FaceNet pertama berjalan (seperti tombol cancel di tengah job)"""
+
+    def embeddings(self, images):
+        classify_faces.cancel_processing()
+        return super().embeddings(images)
+
+def test_cancelled_job_stops_pipeline_and_removes_output(tmp_path, monkeypatch):
+    input_folder = str(tmp_path / "input")
+    write_images(input_folder)
+    embedder = CancellingEmbedder()
+    monkeypatch.setattr(classify_faces, "get_gallery_cache",
+                        lambda path: StaticGalleryCache(FaceGallery.from_embeddings(KNOWN)))
+    monkeypatch.setattr(classify_faces, "get_yolo_model", lambda *args: BlobDetector())
+    monkeypatch.setattr(classify_faces, "get_face_embedder", lambda: embedder)
+
+    output_folder = str(tmp_path / "cancelled")
+    result = classify_faces.classify_faces(input_folder, output_folder, batch_size=1, embed_batch_size=1,
+                                           make_zip=False)
+    classify_faces.reset_cancel_flag()
+    assert result == (None, None, None)
+    assert not os.path.exists(output_folder)
+    assert sum(embedder.batches) < 8
@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+
+from embedding_cache import DetectionEntry, DetectionCache, prune_caches
+from face_batching import FaceEnrollmentBatcher
+from inference_backends import DetectionResult
+
+PARAMS = {"detector": "test.pt", "kind": "raw_detections"}
+
+# Satu gambar sintetis dengan empat "wajah" berwarna berbeda dan confidence menurun
+IMAGE = np.zeros((100, 400, 3), dtype=np.uint8)
+BOXES = np.array([[k * 100, 0, k * 100 + 80, 80] for k in range(4)], dtype=np.float32)
+CONFIDENCES = np.array([0.9, 0.7, 0.5, 0.3], dtype=np.float32)
+for k in range(4):
+    IMAGE[:80, k * 100:k * 100 + 80] = 50 * (k + 1)
+
+class FakeDetector:
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, images, conf, verbose=False):
+        self.calls += 1
+        keep = CONFIDENCES >= conf
+        return [DetectionResult(BOXES[keep], CONFIDENCES[keep]) for _ in images]
+
+class FakeEmbedder:
+    """Embedding = warna rata-rata crop, cukup untuk memeriksa wajah mana yang di-embed"""
+
+    def __init__(self):
+        self.faces = 0
+
+    def embeddings(self, faces):
+        self.faces += len(faces)
+        return np.stack([np.full(4, face.mean(), dtype=np.float32) for face in faces])
+
+def test_entry_round_trip(tmp_path, rng):
+    cache = DetectionCache(str(tmp_path), PARAMS)
+    crops = {2: rng.integers(0, 255, size=(160, 160, 3), dtype=np.uint8)}
+    entry = DetectionEntry(0.25, BOXES[:3], CONFIDENCES[:3], {0: rng.normal(size=4), 1: rng.normal(size=4)}, crops)
+    cache.put("abc123", entry)
+
+    loaded = cache.get("abc123", 0.6)
+    assert loaded.floor == 0.25
+    assert np.array_equal(loaded.boxes, entry.boxes)
+    assert np.array_equal(loaded.confidences, entry.confidences)
+    assert sorted(loaded.embeddings) == [0, 1]
+    assert np.allclose(loaded.embeddings[1], entry.embeddings[1])
+    assert np.array_equal(loaded.crops[2], crops[2])
+
+def test_threshold_refiltering():
+    entry = DetectionEntry(0.25, BOXES, CONFIDENCES, {0: np.zeros(4), 1: np.zeros(4)})
+    assert entry.rows_above(0.6) == [0, 1]
+    assert entry.rows_above(0.5) == [0, 1, 2]
+    assert entry.missing_rows(entry.rows_above(0.4)) == [2]
+    assert entry.covers(0.25) and not entry.covers(0.2)
+
+def test_threshold_below_floor_is_a_miss(tmp_path):
+    cache = DetectionCache(str(tmp_path), PARAMS)
+    cache.put("abc123", DetectionEntry(0.4, BOXES[:3], CONFIDENCES[:3]))
+    assert cache.get("abc123", 0.3) is None
+    assert cache.get("missing", 0.6) is None
+    assert cache.get("abc123", 0.4) is not None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def enroll(cache, threshold, detector, embedder):
+    batcher = FaceEnrollmentBatcher(lambda: detector, lambda: embedder, threshold, cache,
+                                    detect_batch_size=1, embed_batch_size=8)
+    completed = batcher.add("img", "abc123", lambda: IMAGE) + batcher.flush()
+    assert len(completed) == 1
+    _, embeddings, confidences, error = completed[0]
+    assert error is None
+    return embeddings, confidences
+
+def test_lower_threshold_reuses_detections(tmp_path, monkeypatch):
+    monkeypatch.setenv("DETECTION_FLOOR", "0.25")
+    cache = DetectionCache(str(tmp_path), PARAMS)
+    detector, embedder = FakeDetector(), FakeEmbedder()
+
+    first, confidences = enroll(cache, 0.6, detector, embedder)
+    assert np.allclose(confidences, [0.9, 0.7])
+    assert (detector.calls, embedder.faces) == (1, 2)
+
+    # Threshold lebih rendah: tanpa deteksi ulang, hanya wajah yang baru lolos yang di-embed
+    second, confidences = enroll(cache, 0.4, detector, embedder)
+    assert np.allclose(confidences, [0.9, 0.7, 0.5])
+    assert (detector.calls, embedder.faces) == (1, 3)
+
+    # Hasilnya sama dengan enrollment tanpa cache di threshold yang sama
+    fresh, _ = enroll(None, 0.4, FakeDetector(), FakeEmbedder())
+    assert np.allclose(np.stack(second), np.stack(fresh))
+    assert np.allclose(np.stack(second[:2]), np.stack(first))
+
+    # Threshold lebih tinggi: semua dari cache
+    third, _ = enroll(cache, 0.8, detector, embedder)
+    assert len(third) == 1
+    assert (detector.calls, embedder.faces) == (1, 3)
+
+def test_prune_keeps_recently_used_entries(tmp_path, monkeypatch, rng):
+    monkeypatch.setenv("EMBEDDING_CACHE_DIR", "")
+    monkeypatch.setenv("DETECTION_CACHE_DIR", str(tmp_path))
+    cache = DetectionCache(str(tmp_path), PARAMS)
+    crops = {0: rng.integers(0, 255, size=(160, 160, 3), dtype=np.uint8)}
+    for age, image_hash in enumerate(["aa01", "bb02", "cc03"]):
+        cache.put(image_hash, DetectionEntry(0.25, BOXES[:1], CONFIDENCES[:1], crops=crops))
+        os.utime(cache.entry_path(image_hash), (1000 + age, 1000 + age))
+    entry_mb = os.path.getsize(cache.entry_path("aa01")) / 1e6
+
+    assert cache.get("aa01", 0.6) is not None
+    monkeypatch.setenv("DETECTION_CACHE_MAX_MB", str(2.5 * entry_mb))
+    prune_caches()
+    assert [cache.get(h, 0.6) is not None for h in ["aa01", "bb02", "cc03"]] == [True, False, True]
@@ -0,0 +1,82 @@
+import numpy as np
+
+from detector_cascade import DetectorCascade
+from inference_backends import DetectionResult
+
+LARGE = (100, 100, 400, 400)
+SMALL = (100, 100, 120, 120)  # 20 px, di bawah 3% dari sisi 1000 px
+
+# Deteksi detektor kecil per gambar: [(box, confidence)]; threshold 0.6 +- 0.15 -> pita meragukan [0.45, 0.75)
+FAST_DETECTIONS = [
+    [(LARGE, 0.9)],                 # 0: yakin, wajah besar
+    [(LARGE, 0.6)],                 # 1: tepat di threshold -> borderline
+    [(LARGE, 0.2)],                 # 2: noise di bawah pita -> diabaikan
+    [(SMALL, 0.9)],                 # 3: yakin tapi sangat kecil -> small_face
+    [],                             # 4: tanpa deteksi
+    [(LARGE, 0.9), (LARGE, 0.46)],  # 5: satu box di dalam pita -> borderline
+    [(LARGE, 0.75)],                # 6: batas atas pita (eksklusif) -> tidak dieskalasi
+    [(SMALL, 0.3)],                 # 7: wajah kecil di bawah pita -> diabaikan
+]
+ESCALATED = [1, 3, 5]
+
+class ScriptedDetector:
+    """Detektor palsu: gambar ke-k (ditandai piksel [0, 0]) mendapat deteksi dari daftar"""
+
+    def __init__(self, detections):
+        self.detections = detections
+        self.calls = []
+
+    def predict(self, images, **kwargs):
+        indices = [int(image[0, 0, 0]) for image in images]
+        self.calls.append(indices)
+        results = []
+        for k in indices:
+            boxes = [box for box, _ in self.detections[k]]
+            confidences = [conf for _, conf in self.detections[k]]
+            results.append(DetectionResult(np.array(boxes, dtype=np.float32).reshape(-1, 4),
+                                           np.array(confidences, dtype=np.float32)))
+        return results
+
+def marked_images(count, height=1000, width=800):
+    images = []
+    for k in range(count):
+        image = np.zeros((height, width, 3), dtype=np.uint8)
+        image[0, 0] = k
+        images.append(image)
+    return images
+
+def full_detections():
+    return [[(LARGE, 0.99)] for _ in FAST_DETECTIONS]
+
+def test_only_borderline_and_small_face_images_are_escalated():
+    fast, full = ScriptedDetector(FAST_DETECTIONS), ScriptedDetector(full_detections())
+    cascade = DetectorCascade(fast, full, 0.6, margin=0.15, min_face=0.03)
+    results = cascade.predict(marked_images(len(FAST_DETECTIONS)))
+
+    # Gambar yang dieskalasi dideteksi ulang bersama dalam satu panggilan detektor besar
+    assert full.calls == [ESCALATED]
+    for k, result in enumerate(results):
+        expected = 0.99 if k in ESCALATED else None
+        confidences = result.boxes.conf.cpu().numpy().tolist()
+        if expected is not None:
+            assert confidences == [np.float32(expected)]
+        else:
+            assert confidences == [np.float32(conf) for _, conf in FAST_DETECTIONS[k]]
+    assert cascade.stats()["reasons"] == {"borderline": 2, "small_face": 1}
+    assert cascade.escalated == 3 and cascade.images == len(FAST_DETECTIONS)
+
+def test_small_face_check_is_relative_to_image_size():
+    fast = ScriptedDetector([[(SMALL, 0.9)]])
+    # 20 px di gambar 500 px = 4%: tidak kecil; di gambar 1000 px = 2%: kecil
+    cascade = DetectorCascade(fast, ScriptedDetector(full_detections()), 0.6, margin=0.15, min_face=0.03)
+    cascade.predict(marked_images(1, height=500, width=400))
+    assert cascade.escalated == 0
+    cascade.predict(marked_images(1, height=1000, width=400))
+    assert cascade.escalated == 1
+
+def test_confident_batch_never_calls_full_detector():
+    fast, full = ScriptedDetector([[(LARGE, 0.9)]] * 4), ScriptedDetector(full_detections())
+    cascade = DetectorCascade(fast, full, 0.6, margin=0.15, min_face=0.03)
+    cascade.predict(marked_images(4))
+    assert full.calls == []
+    assert "0/4 images escalated" in cascade.summary()
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from embedding_buckets import DEFAULT_EMBED_BUCKETS, BucketedEmbedder, bucket_for, embed_buckets, pad_faces
+
+class ProjectionEmbedder:
+    """Embedder palsu per baris (seperti FaceNet dalam mode inferensi): proyeksi acak tetap dari piksel crop"""
+
+    def __init__(self, face_shape=(8, 8, 3), dim=16):
+        self.projection = np.random.default_rng(1).normal(size=(int(np.prod(face_shape)), dim)).astype(np.float32)
+        self.batch_sizes = []
+
+    def embeddings(self, faces):
+        faces = np.asarray(faces, dtype=np.float32)
+        self.batch_sizes.append(len(faces))
+        return faces.reshape(len(faces), -1) @ self.projection
+
+def random_faces(rng, count):
+    return list(rng.integers(0, 255, size=(count, 8, 8, 3), dtype=np.uint8))
+
+@pytest.mark.parametrize("count", [1, 3, 7, 8, 9, 20])
+def test_padded_output_equals_unpadded(rng, count):
+    faces = random_faces(rng, count)
+    expected = ProjectionEmbedder().embeddings(faces)
+
+    inner = ProjectionEmbedder()
+    embedder = BucketedEmbedder(inner, [1, 2, 4, 8])
+    embeddings = embedder.embeddings(faces)
+    # BLAS boleh menjumlah dengan urutan berbeda per ukuran batch: sama hingga pembulatan float32
+    assert embeddings.shape == expected.shape
+    assert np.allclose(embeddings, expected, rtol=1e-5, atol=1e-3)
+    # Hanya ukuran bucket yang dikirim ke model; batch di atas bucket terbesar dipecah
+    assert set(inner.batch_sizes) <= {1, 2, 4, 8}
+    assert sum(inner.batch_sizes) - count == embedder.padded_faces
+    assert embedder.faces == count
+
+def test_without_buckets_batches_are_sent_as_is(rng):
+    inner = ProjectionEmbedder()
+    embedder = BucketedEmbedder(inner, [])
+    embedder.embeddings(random_faces(rng, 5))
+    assert inner.batch_sizes == [5] and embedder.padded_faces == 0
+
+def test_pad_faces_repeats_last_face(rng):
+    faces = random_faces(rng, 3)
+    padded = pad_faces(faces, 4)
+    assert padded.shape == (4, 8, 8, 3)
+    assert np.array_equal(padded[3], faces[2])
+    assert bucket_for(3, [1, 2, 4]) == 4 and bucket_for(5, [1, 2, 4]) is None
+
+@pytest.mark.parametrize("value,expected", [
+    (None, list(DEFAULT_EMBED_BUCKETS)),
+    ("8, 2,2,0", [2, 8]),
+    ("off", []),
+    ("", []),
+    ("2,x", list(DEFAULT_EMBED_BUCKETS)),
+])
+def test_embed_buckets_from_environment(monkeypatch, value, expected):
+    if value is not None:
+        monkeypatch.setenv("EMBED_BUCKETS", value)
+    assert embed_buckets() == expected
+
+def test_malformed_buckets_warn(monkeypatch, capsys):
+    monkeypatch.setenv("EMBED_BUCKETS", "2,x")
+    assert embed_buckets() == list(DEFAULT_EMBED_BUCKETS)
+    assert "EMBED_BUCKETS='2,x' tidak valid" in capsys.readouterr().out
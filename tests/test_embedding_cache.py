@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache, prune_cache_dir, prune_caches
+
+PARAMS = {"detector": "test.pt", "confidence": 0.6}
+
+def test_round_trip(tmp_path, rng):
+    cache = EmbeddingCache(str(tmp_path), PARAMS)
+    embeddings = list(rng.normal(size=(2, 8)).astype(np.float32))
+    cache.put("sha256-abcd", embeddings, [0.9, 0.7])
+    cache.put("sha256-ef01", [], [])
+
+    cached, confidences = cache.get("sha256-abcd")
+    assert np.array_equal(np.stack(cached), np.stack(embeddings))
+    assert confidences == [0.9, 0.7]
+    assert cache.get("sha256-ef01") == ([], [])
+    assert cache.get("sha256-0000") is None
+    # Parameter lain (misal threshold berbeda) tidak pernah melihat entri ini
+    assert EmbeddingCache(str(tmp_path), dict(PARAMS, confidence=0.5)).get("sha256-abcd") is None
+
+def test_prune_removes_least_recently_used(tmp_path, rng):
+    cache = EmbeddingCache(str(tmp_path), PARAMS)
+    hashes = [f"sha256-{k:02x}{k:02x}" for k in range(6)]
+    for age, image_hash in enumerate(hashes):
+        cache.put(image_hash, list(rng.normal(size=(4, 128))), [0.9] * 4)
+        os.utime(cache.entry_path(image_hash), (1000 + age, 1000 + age))
+    entry_bytes = os.path.getsize(cache.entry_path(hashes[0]))
+
+    # Entri tertua yang baru saja dibaca tidak ikut terbuang
+    assert cache.get(hashes[0]) is not None
+    removed, removed_bytes = prune_cache_dir(str(tmp_path), 3 * entry_bytes)
+    assert (removed, removed_bytes) == (3, 3 * entry_bytes)
+    assert [cache.get(h) is not None for h in hashes] == [True, False, False, False, True, True]
+
+def test_prune_caches_respects_limit_from_environment(tmp_path, monkeypatch, rng):
+    monkeypatch.setenv("EMBEDDING_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("DETECTION_CACHE_DIR", "")
+    cache = EmbeddingCache(str(tmp_path), PARAMS)
+    cache.put("sha256-abcd", list(rng.normal(size=(4, 128))), [0.9] * 4)
+
+    monkeypatch.setenv("EMBEDDING_CACHE_MAX_MB", "0")
+    prune_caches()
+    assert cache.get("sha256-abcd") is not None
+    monkeypatch.setenv("EMBEDDING_CACHE_MAX_MB", "0.0001")
+    prune_caches()
+    assert cache.get("sha256-abcd") is None
@@ -0,0 +1,70 @@
+import numpy as np
+
+import embedding_log
+from embedding_log import encode_record, decode_records, read_records, append_records, create_segment
+
+def sample_records(rng):
+    return [
+        encode_record("put", "alice", "a.jpg", rng.normal(size=(2, 8))),
+        encode_record("delete", "bob", "b.jpg"),
+        encode_record("put", "cécile", "c.jpg", rng.normal(size=(1, 8))),
+        encode_record("delete_person", "dave"),
+    ]
+
+def test_round_trip(rng):
+    vectors = rng.normal(size=(3, 8)).astype(np.float32)
+    data = encode_record("put", "alice", "a.jpg", vectors) + encode_record("delete_person", "bob")
+    records, valid_size = decode_records(data)
+
+    assert valid_size == len(data)
+    assert [r["op"] for r in records] == ["put", "delete_person"]
+    assert records[0]["person"] == "alice" and records[0]["image"] == "a.jpg"
+    assert np.array_equal(records[0]["vectors"], vectors)
+    assert records[1]["person"] == "bob" and records[1]["image"] is None
+
+def test_truncated_tail_is_ignored(rng):
+    records = sample_records(rng)
+    data = b"".join(records)
+    complete = len(data) - len(records[-1])
+    for cut in range(complete, len(data)):
+        decoded, valid_size = decode_records(data[:cut])
+        assert len(decoded) == len(records) - 1
+        assert valid_size == complete
+
+def test_bad_crc_stops_replay(rng):
+    records = sample_records(rng)
+    data = bytearray(b"".join(records))
+    # Satu byte payload record pertama rusak: record itu dan semua setelahnya diabaikan
+    data[len(records[0]) - 1] ^= 0xFF
+    decoded, valid_size = decode_records(bytes(data))
+    assert decoded == [] and valid_size == 0
+
+def test_append_truncates_torn_tail(tmp_path, rng):
+    path = str(tmp_path / "log-1.bin")
+    create_segment(path)
+    records = sample_records(rng)
+    append_records(path, records[:2])
+
+    # Crash di tengah append: sebagian record ketiga tertulis
+    with open(path, "ab") as f:
+        f.write(records[2][:10])
+    append_records(path, records[3:])
+
+    decoded, valid_size = read_records(path)
+    assert [r["op"] for r in decoded] == ["put", "delete", "delete_person"]
+    assert valid_size == len(records[0]) + len(records[1]) + len(records[3])
+
+def test_append_with_known_size_does_not_reread(tmp_path, rng, monkeypatch):
+    path = str(tmp_path / "log-1.bin")
+    create_segment(path)
+    records = sample_records(rng)
+    size = append_records(path, records[:2])
+
+    def fail(_):
+        raise AssertionError("log dibaca ulang padahal ukurannya sudah diketahui")
+    monkeypatch.setattr(embedding_log, "read_records", fail)
+    size = append_records(path, records[2:], valid_size=size)
+    monkeypatch.undo()
+
+    decoded, valid_size = read_records(path)
+    assert len(decoded) == len(records) and valid_size == size
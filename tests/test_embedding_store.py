@@ -0,0 +1,137 @@
+import os
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from conftest import clustered_embeddings, image_metadata
+from embedding_store import (EmbeddingStore, store_path_for, save_embeddings, apply_embedding_changes,
+                             compact_store, compaction_threads, load_embeddings, load_person_embeddings,
+                             migrate_pickle_to_store, normalize_rows)
+
+def wait_for_compaction():
+    for thread in list(compaction_threads.values()):
+        thread.join()
+
+def assert_same_embeddings(actual, expected):
+    assert list(actual) == list(expected)
+    for name, vectors in expected.items():
+        assert np.allclose(np.stack(actual[name]), normalize_rows(np.stack(vectors)), atol=1e-6)
+
+def make_store(tmp_path, persons=4):
+    embeddings_path = str(tmp_path / "face_embeddings.pkl")
+    embeddings, _ = clustered_embeddings(persons=persons, per_person=3, dim=16)
+    metadata = image_metadata(embeddings)
+    save_embeddings(embeddings_path, embeddings, metadata)
+    return embeddings_path, embeddings, metadata
+
+def apply_sample_changes(embeddings_path, embeddings, metadata, rng):
+    replaced = list(rng.normal(size=(2, 16)))
+    added = list(rng.normal(size=(1, 16)))
+    appended = apply_embedding_changes(
+        embeddings_path,
+        puts=[("person_0", "img1.jpg", replaced), ("person_new", "x.jpg", added)],
+        deletes=[("person_1", "img2.jpg"), ("person_2", None), ("person_3", "missing.jpg")],
+        metadata=metadata
+    )
+    wait_for_compaction()
+
+    expected = dict(embeddings)
+    expected["person_0"] = [embeddings["person_0"][0]] + replaced + [embeddings["person_0"][2]]
+    expected["person_1"] = embeddings["person_1"][:2]
+    del expected["person_2"]
+    expected["person_new"] = added
+    return appended, expected
+
+def test_changes_are_logged_and_replayed(tmp_path, rng):
+    embeddings_path, embeddings, metadata = make_store(tmp_path)
+    appended, expected = apply_sample_changes(embeddings_path, embeddings, metadata, rng)
+
+    # Hapus gambar yang tidak punya embedding tidak ditulis ke log
+    assert appended == 4
+    store = EmbeddingStore.open(store_path_for(embeddings_path))
+    assert store.log_records == 4
+    assert store.log_size == os.path.getsize(store.log_path)
+    assert_same_embeddings(store.to_dict(), expected)
+    assert metadata["person_0"]["img2.jpg"]["embedding_indices"] == [3]
+    assert metadata["person_1"]["img2.jpg"]["embedding_indices"] == []
+    # Orang yang sudah dihapus dikembalikan sebagai list kosong
+    person_embeddings = load_person_embeddings(embeddings_path, ["person_0", "person_2"])
+    assert person_embeddings.pop("person_2") == []
+    assert_same_embeddings(person_embeddings, {"person_0": expected["person_0"]})
+
+def test_torn_log_tail_is_ignored_and_repaired(tmp_path, rng):
+    embeddings_path, embeddings, metadata = make_store(tmp_path)
+    _, expected = apply_sample_changes(embeddings_path, embeddings, metadata, rng)
+    log_path = EmbeddingStore.open(store_path_for(embeddings_path)).log_path
+    with open(log_path, "ab") as f:
+        f.write(b"\x05\x00\x00\x00partial")
+
+    store = EmbeddingStore.open(store_path_for(embeddings_path))
+    assert_same_embeddings(store.to_dict(), expected)
+
+    # Append berikutnya memotong ekor rusak dulu
+    added = list(rng.normal(size=(1, 16)))
+    apply_embedding_changes(embeddings_path, puts=[("person_3", "y.jpg", added)])
+    wait_for_compaction()
+    expected["person_3"] = embeddings["person_3"] + added
+    store = EmbeddingStore.open(store_path_for(embeddings_path))
+    assert store.log_size == os.path.getsize(log_path)
+    assert_same_embeddings(store.to_dict(), expected)
+
+def test_compaction_preserves_gallery(tmp_path, rng):
+    embeddings_path, embeddings, metadata = make_store(tmp_path)
+    _, expected = apply_sample_changes(embeddings_path, embeddings, metadata, rng)
+    before = EmbeddingStore.open(store_path_for(embeddings_path))
+
+    header = compact_store(embeddings_path, force=True)
+    after = EmbeddingStore.open(store_path_for(embeddings_path))
+    assert header["generation"] == before.generation + 1
+    assert after.log_records == 0
+    assert np.array_equal(after.matrix, before.matrix)
+    assert after.names == before.names
+    assert_same_embeddings(load_embeddings(embeddings_path), expected)
+
+def test_pickle_migration(tmp_path, monkeypatch):
+    monkeypatch.setenv("EMBEDDING_FORMAT", "pickle")
+    embeddings_path, embeddings, _ = make_store(tmp_path)
+    assert not os.path.exists(store_path_for(embeddings_path))
+
+    monkeypatch.setenv("EMBEDDING_FORMAT", "columnar")
+    migrate_pickle_to_store(embeddings_path)
+    store = EmbeddingStore.open(store_path_for(embeddings_path))
+    assert_same_embeddings(store.to_dict(), embeddings)
+
+def append_images(embeddings_path, person_name, count, seed):
+    rng = np.random.default_rng(seed)
+    for k in range(count):
+        apply_embedding_changes(embeddings_path, puts=[(person_name, f"{k}.jpg", list(rng.normal(size=(1, 16))))])
+    wait_for_compaction()
+
+def compact_repeatedly(embeddings_path, count):
+    for _ in range(count):
+        compact_store(embeddings_path, force=True)
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="butuh start method fork")
+def test_concurrent_writer_processes(tmp_path):
+    embeddings_path, embeddings, _ = make_store(tmp_path)
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=append_images, args=(embeddings_path, "writer_a", 25, 1)),
+               context.Process(target=append_images, args=(embeddings_path, "writer_b", 25, 2)),
+               context.Process(target=compact_repeatedly, args=(embeddings_path, 25))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    # Tidak ada append yang hilang karena kompaksi atau penulis lain, dan log terbaca utuh
+    store = EmbeddingStore.open(store_path_for(embeddings_path))
+    assert store.log_size == os.path.getsize(store.log_path)
+    for person_name, seed in (("writer_a", 1), ("writer_b", 2)):
+        rng = np.random.default_rng(seed)
+        expected = {f"{k}.jpg": normalize_rows(rng.normal(size=(1, 16))) for k in range(25)}
+        assert list(store.layout[person_name]) == list(expected)
+        for image_name, rows in expected.items():
+            assert np.allclose(store.layout[person_name][image_name], rows, atol=1e-6)
+    assert_same_embeddings({name: load_embeddings(embeddings_path)[name] for name in embeddings}, embeddings)
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from conftest import BlobDetector, ColorEmbedder, image_with_faces
+from face_batching import FaceDetectionBatcher, FaceEmbeddingBatcher, FaceEnrollmentBatcher
+
+# Warna unik per wajah agar embedding (rata-rata warna) bisa dilacak ke gambar asalnya
+def face_color(image_index, face_index):
+    return (40 + 20 * image_index, 250 - 30 * face_index, 128)
+
+def face_crops(image_index, count):
+    return [np.full((8, 8, 3), face_color(image_index, k), dtype=np.uint8) for k in range(count)]
+
+class BrokenImageDetector(BlobDetector):
+    """Detektor yang gagal untuk gambar bertanda (piksel pojok kiri atas = 1)"""
+
+    def predict(self, images, **kwargs):
+        if any(image[0, 0, 0] == 1 for image in images):
+            raise ValueError("gambar rusak")
+        return super().predict(images, **kwargs)
+
+def enrollment_image(image_index, count):
+    boxes = [(10 + 30 * k, 10, 30 + 30 * k, 30) for k in range(count)]
+    return image_with_faces(64, 128, boxes, [face_color(image_index, k) for k in range(count)])
+
+def test_embedding_batcher_keeps_image_order_across_batches():
+    face_counts = [2, 0, 3, 0, 0, 1, 4, 0]
+    embedder = ColorEmbedder()
+    batcher = FaceEmbeddingBatcher(lambda: embedder, batch_size=3)
+
+    completed = []
+    for image_index, count in enumerate(face_counts):
+        completed.extend(batcher.add(image_index, face_crops(image_index, count)))
+    completed.extend(batcher.flush())
+
+    # Gambar tanpa wajah tetap keluar di posisinya, tidak mendahului gambar sebelumnya
+    assert [key for key, _ in completed] == list(range(len(face_counts)))
+    for image_index, embeddings in completed:
+        expected = [face_color(image_index, k) for k in range(face_counts[image_index])]
+        assert [tuple(embedding) for embedding in embeddings] == expected
+    assert embedder.batches == [3, 3, 3, 1]
+    assert batcher.flush() == []
+
+def test_detection_batcher_retries_failing_batch_per_image():
+    images = [enrollment_image(0, 1), enrollment_image(1, 0), enrollment_image(2, 2), enrollment_image(3, 1)]
+    images[2][0, 0] = 1
+    batcher = FaceDetectionBatcher(BrokenImageDetector, 0.5, batch_size=4, verbose=False)
+
+    completed = []
+    for key, image in enumerate(images):
+        completed.extend(batcher.add(key, image))
+    assert [key for key, *_ in completed] == [0, 1, 2, 3]
+    counts = [None if error else len(faces) for _, faces, _, error in completed]
+    assert counts == [1, 0, None, 1]
+    assert isinstance(completed[2][3], ValueError)
+
+@pytest.mark.parametrize("detect_batch_size,embed_batch_size", [(1, 1), (2, 3), (8, 32)])
+def test_enrollment_batcher_returns_every_image_once(detect_batch_size, embed_batch_size):
+    face_counts = [1, 0, 2, 3, 0, 1, 2]
+    unreadable = 4
+    embedder = ColorEmbedder()
+    batcher = FaceEnrollmentBatcher(BlobDetector, lambda: embedder, 0.5,
+                                    detect_batch_size=detect_batch_size, embed_batch_size=embed_batch_size)
+
+    def loader(image_index):
+        def load():
+            if image_index == unreadable:
+                raise OSError("tidak bisa dibaca")
+            return enrollment_image(image_index, face_counts[image_index])
+        return load
+
+    completed = []
+    for image_index in range(len(face_counts)):
+        completed.extend(batcher.add(image_index, f"hash-{image_index}", loader(image_index)))
+    completed.extend(batcher.flush())
+
+    results = {key: (embeddings, confidences, error) for key, embeddings, confidences, error in completed}
+    assert len(completed) == len(results) == len(face_counts)
+    assert isinstance(results[unreadable][2], OSError)
+    for image_index, count in enumerate(face_counts):
+        if image_index == unreadable:
+            continue
+        embeddings, confidences, error = results[image_index]
+        assert error is None
+        assert confidences == [pytest.approx(0.9)] * count
+        assert sorted(tuple(np.round(e)) for e in embeddings) == sorted(face_color(image_index, k) for k in range(count))
+    # Gambar yang selesai keluar dalam urutan add(), kecuali gambar gagal dibaca yang langsung dikembalikan
+    assert [key for key, *_ in completed if key != unreadable] == [k for k in range(len(face_counts)) if k != unreadable]
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from gallery import FaceGallery
+from utils import cosine_similarity, find_match
+from classify_faces import write_image_result
+
+# Loop find_match sebelum galeri matriks, sebagai acuan perilaku
+def legacy_find_match(embedding, known_embeddings, threshold=0.8):
+    best_match, best_score = None, threshold
+    for person_name, embeddings_list in known_embeddings.items():
+        for person_embedding in embeddings_list:
+            score = cosine_similarity(embedding, person_embedding)
+            if score > best_score:
+                best_match, best_score = person_name, score
+    return best_match
+
+@pytest.mark.parametrize("threshold", [0.0, 0.3, 0.8])
+def test_matches_legacy_loop_on_random_embeddings(rng, threshold):
+    known = {f"person_{p}": list(rng.normal(size=(int(rng.integers(1, 5)), 16))) for p in range(12)}
+    # Query dekat dengan embedding tersimpan (cocok) dan acak (sebagian besar tidak cocok)
+    stored = [e for embeddings_list in known.values() for e in embeddings_list]
+    queries = [e + 0.2 * rng.normal(size=16) for e in stored] + list(rng.normal(size=(40, 16)))
+
+    expected = [legacy_find_match(q, known, threshold) for q in queries]
+    assert [find_match(q, known, threshold) for q in queries] == expected
+    assert FaceGallery.from_embeddings(known).match(np.stack(queries), threshold) == expected
+
+# Komponen kelipatan 1/2 dengan norma pangkat dua: skor kosinus tepat sama di float32 dan float64
+AXIS = np.array([1.0, 0.0, 0.0, 0.0])
+HALF = np.array([0.5, 0.5, 0.5, 0.5])
+
+def test_score_equal_to_threshold_is_not_a_match():
+    known = {"alice": [2 * HALF]}
+    assert legacy_find_match(AXIS, known, 0.5) is None
+    assert find_match(AXIS, known, 0.5) is None
+    assert find_match(AXIS, known, 0.49) == legacy_find_match(AXIS, known, 0.49) == "alice"
+
+def test_tied_scores_pick_first_person_in_dict_order():
+    known = {"bob": [np.array([0.0, 1.0, 0.0, 0.0]), 4 * HALF], "alice": [HALF], "carol": [2 * HALF]}
+    queries = np.stack([AXIS, HALF, -AXIS])
+    expected = [legacy_find_match(q, known, 0.2) for q in queries]
+    assert expected == ["bob", "bob", None]
+    assert [find_match(q, known, 0.2) for q in queries] == expected
+    # Blok galeri kecil: baris pertama tetap menang walaupun skor sama muncul di blok berikutnya
+    gallery = FaceGallery.from_embeddings(known).quantized("float16")
+    rows, _ = gallery.best_matches(queries, block_rows=1)
+    assert [gallery.names[gallery.labels[row]] for row in rows[:2]] == ["bob", "bob"]
+
+def test_unmatched_faces_are_labelled_unknown(tmp_path, monkeypatch):
+    import utils
+    image_path = tmp_path / "group.jpg"
+    image_path.write_bytes(b"not decoded")
+    for name in ("UNKNOWN", "VISUALIZED", "labels"):
+        (tmp_path / "out" / name).mkdir(parents=True)
+
+    drawn = []
+    monkeypatch.setattr(utils, "draw_bounding_box", lambda image, bbox, label: drawn.append(label))
+    monkeypatch.setattr("cv2.imwrite", lambda path, image: True)
+    record = {"image_path": str(image_path), "image_name": "group.jpg", "image": np.zeros((100, 100, 3), np.uint8),
+              "image_shape": (100, 100, 3), "bboxes": [(0, 0, 10, 10), (20, 20, 30, 30)], "confidences": [0.9, 0.8]}
+    write_image_result(record, ["alice", None], str(tmp_path / "out"))
+
+    assert drawn == ["alice", "Unknown"]
+    assert (tmp_path / "out" / "alice" / "group.jpg").exists()
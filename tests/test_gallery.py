@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import clustered_embeddings
+from embedding_store import save_embeddings
+from gallery import FaceGallery, compact_path_for, write_compact_gallery, load_gallery, gallery_from_saved
+
+def queries_and_impostors(centers, rng, noise=0.3):
+    near = centers + noise * rng.normal(size=centers.shape) / np.sqrt(centers.shape[1])
+    return np.vstack([near, rng.normal(size=centers.shape)])
+
+@pytest.mark.parametrize("storage,atol", [("float16", 2e-3), ("int8", 2e-2)])
+def test_quantized_scores_match_float32(storage, atol, rng):
+    embeddings, centers = clustered_embeddings(persons=30)
+    gallery = FaceGallery.from_embeddings(embeddings)
+    queries = queries_and_impostors(centers, rng)
+    rows, scores = gallery.best_matches(queries)
+
+    # block_rows kecil agar dekuantisasi per blok ikut teruji
+    compact = gallery.quantized(storage)
+    compact_rows, compact_scores = compact.best_matches(queries, block_rows=7)
+    assert compact.nbytes < gallery.nbytes
+    assert np.allclose(compact_scores, scores, atol=atol)
+    # Orang terbaik untuk wajah asli harus sama; untuk penyusup cukup keputusannya (tidak cocok) yang sama
+    genuine = slice(0, len(centers))
+    assert np.array_equal(gallery.labels[compact_rows[genuine]], gallery.labels[rows[genuine]])
+    assert compact.match(queries) == gallery.match(queries)
+
+@pytest.mark.parametrize("storage", ["float32", "float16", "int8"])
+def test_save_load_round_trip(tmp_path, storage):
+    embeddings, _ = clustered_embeddings(persons=5)
+    gallery = FaceGallery.from_embeddings(embeddings).quantized(storage)
+    path = str(tmp_path / "gallery.npz")
+    gallery.save(path)
+
+    loaded = FaceGallery.load(path)
+    assert loaded.storage == storage
+    assert loaded.names == gallery.names
+    assert np.array_equal(loaded.labels, gallery.labels)
+    assert np.array_equal(loaded.take_rows(slice(None)), gallery.take_rows(slice(None)))
+    assert loaded.fingerprint() == gallery.fingerprint()
+
+def test_stale_compact_gallery_is_ignored(tmp_path, monkeypatch):
+    monkeypatch.setenv("EMBEDDING_STORAGE", "int8")
+    embeddings_path = str(tmp_path / "face_embeddings.pkl")
+    old, _ = clustered_embeddings(persons=4, seed=0)
+    save_embeddings(embeddings_path, old)
+    write_compact_gallery(embeddings_path, gallery_from_saved(embeddings_path))
+    assert load_gallery(embeddings_path).fingerprint() == gallery_from_saved(embeddings_path).fingerprint()
+
+    # Embeddings ditulis ulang setelah file ringkas: file ringkas lama tidak boleh dipakai
+    new, _ = clustered_embeddings(persons=4, seed=1)
+    save_embeddings(embeddings_path, new)
+    compact_path = compact_path_for(embeddings_path, "int8")
+    os.utime(compact_path, (0, 0))
+    loaded = load_gallery(embeddings_path)
+    assert loaded.storage == "int8"
+    assert loaded.fingerprint() == gallery_from_saved(embeddings_path).fingerprint()
+    expected = FaceGallery.from_embeddings(new).quantized("int8")
+    assert np.array_equal(loaded.take_rows(slice(None)), expected.take_rows(slice(None)))
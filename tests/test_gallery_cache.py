@@ -0,0 +1,86 @@
+from conftest import clustered_embeddings, image_metadata
+from embedding_store import save_embeddings
+from gallery_cache import GalleryCache
+
+def save_persons(path, persons, seed=0):
+    embeddings, _ = clustered_embeddings(persons=persons, per_person=3, seed=seed)
+    save_embeddings(path, embeddings, image_metadata(embeddings))
+    return embeddings
+
+# Menunggu build background yang sedang berjalan selesai
+def wait_for_build(cache):
+    with cache._build_lock:
+        pass
+
+def test_get_reuses_gallery_until_files_change(tmp_path):
+    path = str(tmp_path / "face_embeddings.pkl")
+    save_persons(path, 3)
+    cache = GalleryCache(path)
+    gallery = cache.get()
+    assert len(gallery.names) == 3
+    assert cache.get() is gallery
+
+def test_hot_swap_keeps_old_gallery_for_running_job(tmp_path):
+    path = str(tmp_path / "face_embeddings.pkl")
+    save_persons(path, 3)
+    cache = GalleryCache(path)
+    old = cache.get()
+    old_names = list(old.names)
+
+    # Skrip CLI di proses lain menulis ulang embeddings: job berikutnya tidak menunggu build
+    save_persons(path, 5, seed=1)
+    assert cache.get() is old
+    wait_for_build(cache)
+
+    new = cache.get()
+    assert new is not old
+    assert len(new.names) == 5
+    # Job yang masih memegang galeri lama tidak terpengaruh
+    assert old.names == old_names
+    assert len(old) == 9
+
+def test_stale_gallery_served_while_another_thread_rebuilds(tmp_path):
+    path = str(tmp_path / "face_embeddings.pkl")
+    save_persons(path, 3)
+    cache = GalleryCache(path)
+    old = cache.get()
+    save_persons(path, 4, seed=1)
+
+    # Thread lain sedang membangun: get() langsung mengembalikan galeri lama tanpa memulai build kedua
+    assert cache._build_lock.acquire(blocking=False)
+    try:
+        assert cache.get() is old
+        assert cache.rebuild_in_background() is None
+    finally:
+        cache._build_lock.release()
+
+    assert cache.get() is old
+    wait_for_build(cache)
+    assert len(cache.get().names) == 4
+
+def test_poll_rebuilds_changed_files_in_background(tmp_path):
+    path = str(tmp_path / "face_embeddings.pkl")
+    save_persons(path, 3)
+    cache = GalleryCache(path)
+    assert cache.poll() is None  # belum ada galeri: galeri pertama dimuat oleh job
+
+    cache.get()
+    assert cache.poll() is None
+    save_persons(path, 6, seed=2)
+    thread = cache.poll()
+    assert thread is not None
+    thread.join()
+    assert cache._state[0] == cache.current_key()
+    assert len(cache._state[1].names) == 6
+
+def test_failed_rebuild_keeps_previous_gallery(tmp_path, monkeypatch):
+    path = str(tmp_path / "face_embeddings.pkl")
+    save_persons(path, 3)
+    cache = GalleryCache(path)
+    old = cache.get()
+
+    def broken_load(_path):
+        raise OSError("sedang ditulis")
+    monkeypatch.setattr("gallery_cache.load_gallery", broken_load)
+    cache.refresh_in_background().join()
+    assert cache.get() is old
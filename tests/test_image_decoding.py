@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from image_decoding import decode_for_detection, reduction_factor, scale_box
+
+# JPEG dengan satu kotak putih; orientation mengisi tag EXIF Orientation (6 = putar 90 derajat searah jarum jam)
+def write_jpeg(path, width, height, box, orientation=None):
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    x1, y1, x2, y2 = box
+    image[y1:y2, x1:x2] = 255
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    Image.fromarray(image).save(path, quality=95, exif=exif.tobytes())
+    return str(path)
+
+def white_box(image):
+    ys, xs = np.nonzero(image.max(axis=2) > 127)
+    return xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+
+def test_reduction_keeps_longest_side_above_detector_input():
+    assert reduction_factor(640, 480) == 1
+    assert reduction_factor(1300, 900) == 2
+    assert reduction_factor(2600, 1000) == 4
+    assert reduction_factor(6000, 4000) == 8
+    assert reduction_factor(6000, 4000, min_side=1280) == 4
+
+def test_scale_box_maps_to_full_resolution_and_clamps():
+    assert scale_box([10, 20, 30, 40], (4.0, 4.0), (400, 600)) == [40, 80, 120, 160]
+    assert scale_box([-5, 10, 200, 120], (4.0, 4.0), (400, 600)) == [0, 40, 600, 400]
+
+@pytest.mark.parametrize("orientation", [None, 1, 6, 8])
+def test_reduced_decode_box_matches_full_decode(tmp_path, orientation):
+    path = write_jpeg(tmp_path / "photo.jpg", 2600, 1400, (1200, 400, 1600, 900), orientation)
+    full = cv2.imread(path)
+
+    image, scale, full_shape = decode_for_detection(path)
+    assert full_shape == full.shape[:2]
+    assert max(image.shape[:2]) >= 640 and image.shape[0] < full.shape[0]
+    # cv2 memutar gambar sesuai EXIF, ukuran header PIL tidak: sisi ditukar untuk orientasi 6 / 8
+    assert (full_shape[0] > full_shape[1]) == (orientation in (6, 8))
+
+    mapped = scale_box(white_box(image), scale, full_shape)
+    assert np.allclose(mapped, white_box(full), atol=8)
+
+def test_small_and_unreadable_images_are_not_reduced(tmp_path):
+    path = write_jpeg(tmp_path / "small.jpg", 600, 400, (10, 10, 50, 50))
+    image, scale, full_shape = decode_for_detection(path)
+    assert scale == (1.0, 1.0) and full_shape == (400, 600) and image.shape == (400, 600, 3)
+
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"bukan gambar")
+    assert decode_for_detection(str(broken)) == (None, (1.0, 1.0), None)
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+import inference_backends
+from conftest import image_with_faces
+from inference_backends import OnnxFaceDetector, OnnxFaceEmbedder, letterbox, save_model_metadata
+
+class BoxFindingSession:
+    """Sesi palsu seperti output YOLOv8 (batch, 4 + 1 kelas, anchor): satu anchor per kotak putih
+    di input letterbox (cx, cy, w, h), ditambah duplikat bergeser (untuk NMS) dan anchor berskor rendah"""
+
+    def __init__(self):
+        self.batches = []
+
+    def run(self, batch):
+        self.batches.append(batch)
+        outputs = []
+        for image in batch:
+            ys, xs = np.nonzero(image.max(axis=0) > 0.9)
+            x1, y1, x2, y2 = xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+            cx, cy, w, h = (x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1
+            anchors = [(cx, cy, w, h, 0.9), (cx + 1, cy + 1, w, h, 0.8), (10, 10, 5, 5, 0.1)]
+            outputs.append(np.array(anchors, dtype=np.float32).T)
+        return np.stack(outputs)
+
+@pytest.fixture
+def detector(tmp_path, monkeypatch):
+    model_path = str(tmp_path / "yolov8m-face.onnx")
+    save_model_metadata(model_path, {"image_size": 640, "names": ["face"]})
+    session = BoxFindingSession()
+    monkeypatch.setattr(inference_backends, "create_session", lambda path, backend: session)
+    return OnnxFaceDetector(model_path)
+
+@pytest.mark.parametrize("height,width", [(480, 640), (640, 480), (1200, 1600), (300, 200)])
+def test_letterbox_pads_to_square_with_fixed_ratio(height, width):
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    padded, ratio, (left, top) = letterbox(image)
+    assert padded.shape == (640, 640, 3)
+    assert ratio == pytest.approx(min(640 / height, 640 / width))
+    # Gambar berada di tengah, sisa padding berwarna abu-abu
+    assert abs(2 * left + round(width * ratio) - 640) <= 1 and abs(2 * top + round(height * ratio) - 640) <= 1
+    if top:
+        assert tuple(padded[0, 320]) == tuple(padded[-1, 320]) == (114, 114, 114)
+    if left:
+        assert tuple(padded[320, 0]) == tuple(padded[320, -1]) == (114, 114, 114)
+
+@pytest.mark.parametrize("height,width,box", [
+    (480, 640, (100, 50, 300, 250)),
+    (1200, 1600, (800, 100, 1000, 500)),
+    (300, 200, (20, 150, 120, 280)),
+])
+def test_boxes_are_rescaled_to_original_image(detector, height, width, box):
+    image = image_with_faces(height, width, [box])
+    result = detector.predict(image, conf=0.25)[0]
+    boxes, confidences = result.boxes.xyxy.cpu().numpy(), result.boxes.conf.cpu().numpy()
+
+    # Duplikat dibuang NMS, anchor di bawah conf dibuang filter
+    assert len(result.boxes) == 1 and confidences[0] == pytest.approx(0.9)
+    tolerance = 2 / min(640 / height, 640 / width)
+    assert np.allclose(boxes[0], box, atol=tolerance)
+    assert detector.session.batches[0].shape == (1, 3, 640, 640)
+    assert detector.session.batches[0].dtype == np.float32 and detector.session.batches[0].max() <= 1.0
+
+def test_batch_predict_keeps_per_image_transforms(detector):
+    images = [image_with_faces(480, 640, [(10, 10, 60, 60)]), image_with_faces(1000, 500, [(200, 600, 400, 900)])]
+    results = detector.predict(images)
+    assert [result.boxes.xyxy.cpu().numpy()[0].round().tolist() for result in results] == \
+        [[10, 10, 60, 60], [200, 600, 400, 900]]
+    assert detector.predict([]) == []
+
+class EchoSession:
+    def run(self, batch):
+        self.batch = batch
+        return batch.reshape(len(batch), -1)[:, :512]
+
+def test_embedder_standardizes_faces(monkeypatch):
+    session = EchoSession()
+    monkeypatch.setattr(inference_backends, "create_session", lambda path, backend: session)
+    embedder = OnnxFaceEmbedder("facenet.onnx")
+
+    faces = np.random.default_rng(0).integers(0, 255, size=(3, 160, 160, 3)).astype(np.uint8)
+    assert embedder.embeddings(faces).shape == (3, 512)
+    assert np.allclose(session.batch.mean(axis=(1, 2, 3)), 0, atol=1e-4)
+    assert np.allclose(session.batch.std(axis=(1, 2, 3)), 1, atol=1e-3)
+    assert embedder.embeddings([]).shape == (0, 512)
@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+
+import model_registry
+from conftest import BlobDetector
+from model_registry import ModelRegistry, SharedModel
+
+@pytest.fixture
+def registry(monkeypatch):
+    # Registry dan status warm-up baru per test (keduanya global per proses)
+    fresh = ModelRegistry()
+    monkeypatch.setattr(model_registry, "model_registry", fresh)
+    monkeypatch.setattr(model_registry, "warmup_status", {"state": "idle", "timings": {}})
+    monkeypatch.setattr(model_registry, "warmup_ready", threading.Event())
+    return fresh
+
+def run_threads(target, count=8):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+class ConcurrencyProbe:
+    """Model palsu yang mencatat berapa panggilan berjalan bersamaan"""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def predict(self, images):
+        with self.lock:
+            self.active += 1
+            self.calls += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+        return images
+
+def test_model_loads_once_for_concurrent_callers(registry):
+    loads = []
+
+    def factory():
+        loads.append(threading.current_thread().name)
+        time.sleep(0.05)
+        return ConcurrencyProbe()
+
+    models = []
+    run_threads(lambda: models.append(registry.get("yolo", factory)))
+    assert len(loads) == 1
+    assert len({id(model) for model in models}) == 1
+    assert registry.stats()["yolo"]["state"] == "loaded"
+
+def test_shared_model_serialises_concurrent_calls():
+    probe = ConcurrencyProbe()
+    shared = SharedModel("yolo", probe)
+    run_threads(lambda: shared.predict([1]))
+    assert probe.calls == 8
+    assert probe.max_active == 1
+
+def test_failed_load_is_reported_and_retried(registry):
+    def broken():
+        raise RuntimeError("bobot tidak ditemukan")
+
+    with pytest.raises(RuntimeError):
+        registry.get("facenet", broken)
+    assert registry.stats()["facenet"] == {"state": "error", "error": "bobot tidak ditemukan"}
+    assert registry.get("facenet", ConcurrencyProbe).calls == 0
+    assert registry.is_loaded("facenet")
+
+class GatedEmbedder:
+    def __init__(self, gate):
+        self.gate = gate
+
+    def warm_up(self, face, max_size=None):
+        self.gate.wait()
+
+def test_jobs_wait_until_warm_up_finishes(registry, monkeypatch):
+    gate = threading.Event()
+    monkeypatch.setattr(model_registry, "get_yolo_model", lambda *args: registry.get("yolo", BlobDetector))
+    monkeypatch.setattr(model_registry, "get_face_embedder", lambda: registry.get("facenet", lambda: GatedEmbedder(gate)))
+    monkeypatch.setattr(model_registry, "models_loaded", lambda: registry.is_loaded("yolo") and registry.is_loaded("facenet"))
+
+    # Tanpa warm-up job tidak menunggu
+    assert model_registry.wait_until_ready(timeout=0)
+    assert model_registry.readiness()["ready"]
+
+    assert model_registry.start_warm_up()
+    assert not model_registry.start_warm_up()
+    assert not model_registry.readiness()["ready"]
+    assert not model_registry.wait_until_ready(timeout=0)
+
+    # Job yang datang selama warm-up diantrikan sampai model siap
+    started = threading.Event()
+    job = threading.Thread(target=lambda: model_registry.wait_until_ready() and started.set())
+    job.start()
+    assert not started.wait(0.05)
+
+    gate.set()
+    job.join(timeout=5)
+    assert started.is_set()
+    status = model_registry.readiness()
+    assert status["ready"] and status["state"] == "ready"
+    assert set(status["models"]) == {"yolo", "facenet"}
+    assert "yolo_warmup_seconds" in status["warmup_timings"]
+
+def test_ready_endpoint_returns_503_during_warm_up(registry, monkeypatch):
+    pytest.importorskip("flask")
+    pytest.importorskip("flask_session")
+    # Import app tidak boleh memulai warm-up model asli atau polling galeri
+    monkeypatch.setenv("MODEL_WARMUP", "false")
+    monkeypatch.setenv("GALLERY_POLL_SECONDS", "0")
+    import app as web_app
+
+    monkeypatch.setitem(model_registry.warmup_status, "state", "warming")
+    client = web_app.app.test_client()
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.get_json()["ready"] is False
+
+    monkeypatch.setitem(model_registry.warmup_status, "state", "ready")
+    assert client.get("/ready").status_code == 200
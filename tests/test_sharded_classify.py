@@ -0,0 +1,102 @@
+import argparse
+import os
+
+import pytest
+
+import classify_faces
+import sharded_classify
+from conftest import BlobDetector, ColorEmbedder
+from gallery import FaceGallery
+from test_classify_faces import KNOWN, StaticGalleryCache, write_images, output_labels
+
+def test_shards_cover_every_file_once():
+    image_files = [f"{k:03d}.jpg" for k in range(23)]
+    shards = sharded_classify.shard_files(image_files, 4)
+    assert sorted(f for shard in shards for f in shard) == image_files
+    assert max(map(len, shards)) - min(map(len, shards)) <= 1
+    # Round-robin: gambar berurutan (misal satu sesi foto) tersebar ke semua shard
+    assert [shard[0] for shard in shards] == image_files[:4]
+
+def test_threads_are_split_across_workers(monkeypatch):
+    assert sharded_classify.threads_per_worker(4, cpu_count=16) == 4
+    assert sharded_classify.threads_per_worker(8, cpu_count=4) == 1
+
+    monkeypatch.setenv("DECODE_WORKERS", "16")
+    monkeypatch.delenv("WRITE_WORKERS", raising=False)
+    monkeypatch.setenv("CLASSIFY_MEMORY_LIMIT_MB", "8000")
+    env = sharded_classify.worker_env(threads=2, workers=4)
+    assert all(env[name] == "2" for name in sharded_classify.THREAD_ENV_VARS)
+    assert env["DECODE_WORKERS"] == env["WRITE_WORKERS"] == "2"
+    assert env["MODEL_WARMUP"] == "false"
+    assert env["CLASSIFY_MEMORY_LIMIT_MB"] == "2000"
+
+def test_merge_moves_shard_output_into_one_folder(tmp_path):
+    output = tmp_path / "out"
+    for k, files in enumerate([{"alice": ["a.jpg"], "UNKNOWN": ["u.jpg"], "labels": ["a.txt", "u.txt"]},
+                               {"alice": ["b.jpg"], "bob": ["b.jpg"], "labels": ["b.txt"]}]):
+        shard = tmp_path / f"out.shard-{k}"
+        for folder, names in files.items():
+            (shard / folder).mkdir(parents=True)
+            for name in names:
+                (shard / folder / name).write_text(name)
+        sharded_classify.merge_shard_output(str(shard), str(output))
+        assert not shard.exists()
+
+    assert sorted(os.listdir(output / "alice")) == ["a.jpg", "b.jpg"]
+    assert os.listdir(output / "bob") == ["b.jpg"]
+    assert sorted(os.listdir(output / "labels")) == ["a.txt", "b.txt", "u.txt"]
+
+class InProcessWorker:
+    """Pengganti subprocess.Popen: menjalankan run_worker untuk satu shard di proses test"""
+
+    def __init__(self, command, env=None):
+        options = dict(zip(command[3::2], command[4::2]))
+        args = argparse.Namespace(input=options["--input"], output=options["--output"], files=options["--files"],
+                                  confidence=float(options["--confidence"]), match_scope=options["--match-scope"],
+                                  batch_size=int(options["--batch-size"]) if "--batch-size" in options else None)
+        self.returncode = sharded_classify.run_worker(args)
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+    def terminate(self):
+        pass
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    monkeypatch.setattr(classify_faces, "get_gallery_cache",
+                        lambda path: StaticGalleryCache(FaceGallery.from_embeddings(KNOWN)))
+    monkeypatch.setattr(classify_faces, "get_yolo_model", lambda *args: BlobDetector())
+    monkeypatch.setattr(classify_faces, "get_face_embedder", ColorEmbedder)
+
+def test_sharded_output_matches_single_process(tmp_path, monkeypatch, fake_models):
+    monkeypatch.chdir(tmp_path)
+    write_images("input")
+    monkeypatch.setattr(sharded_classify.subprocess, "Popen", InProcessWorker)
+
+    single = classify_faces.classify_faces("input", "single", batch_size=2, make_zip=False)
+    sharded = sharded_classify.classify_faces_sharded("input", "sharded", workers=3, batch_size=2,
+                                                      force_processes=True)
+    assert single[0] == "single" and sharded[0] == "sharded"
+    assert os.path.exists(sharded[1])
+    assert output_labels("sharded") == output_labels("single")
+    assert sorted(os.listdir("sharded/VISUALIZED")) == sorted(os.listdir("single/VISUALIZED"))
+    assert not [name for name in os.listdir(".") if ".shard-" in name]
+
+def test_failed_worker_removes_partial_output(tmp_path, monkeypatch, fake_models):
+    monkeypatch.chdir(tmp_path)
+    write_images("input")
+
+    class FailingSecondShard(InProcessWorker):
+        def __init__(self, command, env=None):
+            super().__init__(command, env)
+            if command[command.index("--output") + 1].endswith("shard-1"):
+                self.returncode = 1
+
+    monkeypatch.setattr(sharded_classify.subprocess, "Popen", FailingSecondShard)
+    result = sharded_classify.classify_faces_sharded("input", "sharded", workers=2, force_processes=True)
+    assert result == (None, None, None)
+    assert sorted(os.listdir(".")) == ["input"]
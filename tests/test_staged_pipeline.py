@@ -0,0 +1,92 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from staged_pipeline import StagedPipeline, END_OF_STREAM
+
+def produce(pipeline, out_queue, count, produced):
+    for item in range(count):
+        if not pipeline.put(out_queue, item):
+            return
+        produced.append(item)
+    pipeline.put(out_queue, END_OF_STREAM)
+
+def test_bounded_queue_applies_backpressure():
+    pipeline = StagedPipeline(threading.Event(), write_workers_count=1)
+    items = queue.Queue(maxsize=2)
+    produced = []
+    pipeline.start_stage("produce", produce, pipeline, items, 50, produced)
+
+    consumed = []
+    while True:
+        item = pipeline.get(items)
+        if item is END_OF_STREAM:
+            break
+        # Produsen tidak pernah lebih dari kapasitas queue (+ satu item yang sedang di-put) di depan konsumen
+        assert len(produced) - len(consumed) <= items.maxsize + 1
+        consumed.append(item)
+        time.sleep(0.001)
+    pipeline.close()
+    assert consumed == list(range(50))
+
+def test_cancellation_stops_blocked_stages():
+    cancelled = threading.Event()
+    pipeline = StagedPipeline(cancelled, write_workers_count=1)
+    items = queue.Queue(maxsize=1)
+    produced = []
+    producer = pipeline.start_stage("produce", produce, pipeline, items, 10**6, produced)
+
+    assert pipeline.get(items) == 0
+    cancelled.set()
+    # Produsen yang tertahan di queue penuh keluar, dan get() berhenti menunggu
+    producer.join(timeout=2)
+    assert not producer.is_alive()
+    while pipeline.get(items) is not END_OF_STREAM:
+        pass
+    # Penulisan yang dijadwalkan setelah pembatalan tidak dijalankan
+    written = []
+    pipeline.submit_write(written.append, "late")
+    pipeline.close()
+    assert written == []
+    assert len(produced) < 10
+
+def test_stage_error_stops_pipeline_and_is_reraised():
+    pipeline = StagedPipeline(threading.Event(), write_workers_count=1)
+    items = queue.Queue(maxsize=1)
+
+    def broken():
+        raise RuntimeError("decode gagal")
+
+    pipeline.start_stage("decode", broken)
+    assert pipeline.get(items) is END_OF_STREAM
+    with pytest.raises(RuntimeError, match="decode gagal"):
+        pipeline.close()
+
+def test_write_behind_is_bounded_and_skipped_after_cancel():
+    cancelled = threading.Event()
+    pipeline = StagedPipeline(cancelled, write_workers_count=1, max_pending_writes=2)
+    gate = threading.Event()
+    written = []
+
+    def write(item):
+        gate.wait()
+        written.append(item)
+
+    # Satu penulisan berjalan (tertahan gate), satu antri: slot penuh
+    assert pipeline.submit_write(write, 0)
+    assert pipeline.submit_write(write, 1)
+    submitted = []
+    blocked = threading.Thread(target=lambda: submitted.append(pipeline.submit_write(write, 2)))
+    blocked.start()
+    blocked.join(timeout=0.3)
+    assert blocked.is_alive() and submitted == []
+
+    # Pembatalan membebaskan submit yang menunggu; penulisan yang belum mulai dilewati
+    cancelled.set()
+    blocked.join(timeout=2)
+    assert submitted == [False]
+    gate.set()
+    pipeline.close()
+    assert written == [0]
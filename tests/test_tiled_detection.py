@@ -0,0 +1,64 @@
+import numpy as np
+
+from conftest import BlobDetector, image_with_faces
+from tiled_detection import tile_windows, inner_edge_mask, merge_boxes, result_arrays, TiledDetector
+
+def sorted_boxes(boxes):
+    return sorted(map(tuple, np.asarray(boxes).astype(int).tolist()))
+
+def test_windows_cover_image_with_overlap():
+    height, width, size = 3000, 4100, 1280
+    windows = tile_windows(height, width, size, 0.2)
+    covered = np.zeros((height, width), dtype=bool)
+    for x1, y1, x2, y2 in windows:
+        assert x2 - x1 <= size and y2 - y1 <= size
+        covered[y1:y2, x1:x2] = True
+    assert covered.all()
+    assert tile_windows(500, 600, size, 0.2) == [(0, 0, 600, 500)]
+
+def test_inner_edge_mask_only_drops_inner_edges():
+    # Tile di pojok kiri atas gambar 2000x2000: tepi kiri / atas adalah tepi gambar
+    window = (0, 0, 1000, 1000)
+    boxes = np.array([[0, 0, 50, 50],          # menyentuh tepi gambar: dipertahankan
+                      [960, 100, 1000, 150],   # menyentuh tepi dalam kanan: dibuang
+                      [100, 990, 150, 999],    # menyentuh tepi dalam bawah: dibuang
+                      [500, 500, 550, 550]], dtype=np.float32)
+    assert inner_edge_mask(boxes, window, 2000, 2000).tolist() == [True, False, False, True]
+    # Tile di pojok kanan bawah: yang dibuang justru box di tepi kiri / atas
+    window = (1000, 1000, 2000, 2000)
+    assert inner_edge_mask(boxes, window, 2000, 2000).tolist() == [False, True, True, True]
+
+def test_merge_boxes_deduplicates_overlapping_detections():
+    boxes = np.array([[0, 0, 100, 100], [2, 2, 102, 102], [300, 300, 350, 350]], dtype=np.float32)
+    merged, confidences = merge_boxes(boxes, np.array([0.8, 0.9, 0.7], dtype=np.float32))
+    assert sorted_boxes(merged) == [(2, 2, 102, 102), (300, 300, 350, 350)]
+    assert sorted(confidences.tolist()) == [np.float32(0.7), np.float32(0.9)]
+
+def test_tiled_detector_finds_small_faces_once():
+    faces = [
+        (200, 200, 240, 240),      # wajah kecil di dalam satu tile
+        (1000, 500, 1040, 540),    # terpotong tepi kiri tile kedua, utuh di tile pertama
+        (1100, 1100, 1140, 1140),  # utuh di empat tile yang tumpang tindih
+        (1200, 1800, 1500, 2100),  # wajah besar melintasi batas tile
+        (2950, 2950, 2990, 2990),  # wajah kecil di pojok gambar
+    ]
+    image = image_with_faces(3000, 3000, faces)
+    detector = BlobDetector()
+
+    # Tanpa tile hanya wajah besar yang terdeteksi
+    plain_boxes, _ = result_arrays(detector.predict([image])[0])
+    assert sorted_boxes(plain_boxes) == [faces[3]]
+
+    tiled = TiledDetector(BlobDetector(), size=1280, overlap=0.2, min_image_side=2560, batch_size=4)
+    boxes, confidences = result_arrays(tiled.predict([image])[0])
+    assert sorted_boxes(boxes) == sorted(faces)
+    assert np.allclose(confidences, 0.9)
+    assert tiled.tiles == 9 and sum(tiled.detector.inputs) == 10
+    assert max(tiled.detector.inputs) <= 4
+
+def test_small_images_are_not_tiled():
+    image = image_with_faces(800, 600, [(100, 100, 200, 200)])
+    tiled = TiledDetector(BlobDetector(), size=1280, overlap=0.2, min_image_side=2560)
+    boxes, _ = result_arrays(tiled.predict([image])[0])
+    assert sorted_boxes(boxes) == [(100, 100, 200, 200)]
+    assert tiled.tiles == 0
@@ -0,0 +1,70 @@
+import os
+
+import cv2
+import pytest
+
+import embedding_manager_utils.update_face_embeddings as update_module
+from conftest import BlobDetector, ColorEmbedder, image_with_faces
+from embedding_store import load_embeddings
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setenv("EMBEDDING_CACHE_DIR", "")
+    monkeypatch.setenv("DETECTION_CACHE_DIR", "")
+    monkeypatch.setattr(update_module, "get_yolo_model", lambda *args: BlobDetector())
+    monkeypatch.setattr(update_module, "get_face_embedder", ColorEmbedder)
+
+    for person, color in (("alice", (0, 0, 255)), ("bob", (0, 255, 0))):
+        os.makedirs(tmp_path / "database" / person)
+        for k in range(3):
+            image = image_with_faces(100, 100, [(20 + k, 20, 60 + k, 60)], [color])
+            cv2.imwrite(str(tmp_path / "database" / person / f"{k}.png"), image)
+    return tmp_path
+
+# Menjalankan update dan mencatat file mana yang di-hash ulang
+def run_update(root, monkeypatch):
+    hashed = []
+    hash_files = update_module.hash_files
+
+    def recording_hash_files(jobs, workers=None):
+        hashed.extend(os.path.relpath(path, root / "database") for path, _ in jobs)
+        return hash_files(jobs, workers)
+
+    monkeypatch.setattr(update_module, "hash_files", recording_hash_files)
+    stats = update_module.update_face_embeddings(str(root / "database"), str(root / "face_embeddings.pkl"),
+                                                 str(root / "face_embeddings_metadata.pkl"))
+    return sorted(hashed), stats
+
+def test_unchanged_files_skip_hashing(database, monkeypatch):
+    hashed, stats = run_update(database, monkeypatch)
+    assert len(hashed) == 6 and stats["new_embeddings"] == 6
+
+    hashed, stats = run_update(database, monkeypatch)
+    assert hashed == []
+    assert stats["new_embeddings"] == 0 and stats["retained_embeddings"] == 6
+
+def test_touched_files_are_rehashed(database, monkeypatch):
+    run_update(database, monkeypatch)
+
+    # mtime berubah tanpa perubahan isi: di-hash ulang, tetapi embeddings-nya dipertahankan
+    touched = database / "database" / "alice" / "1.png"
+    stat = os.stat(touched)
+    os.utime(touched, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    # Isi berubah: di-hash ulang dan di-embed ulang
+    cv2.imwrite(str(database / "database" / "bob" / "2.png"),
+                image_with_faces(100, 100, [(10, 10, 50, 50), (60, 60, 95, 95)], [(0, 255, 0)] * 2))
+
+    hashed, stats = run_update(database, monkeypatch)
+    assert hashed == [os.path.join("alice", "1.png"), os.path.join("bob", "2.png")]
+    assert stats["new_embeddings"] == 2
+    assert stats["retained_embeddings"] == 5
+    assert len(load_embeddings(str(database / "face_embeddings.pkl"))["bob"]) == 4
+
+def test_renamed_file_reuses_hash_by_inode(database, monkeypatch):
+    run_update(database, monkeypatch)
+    os.rename(database / "database" / "alice" / "0.png", database / "database" / "alice" / "renamed.png")
+
+    hashed, stats = run_update(database, monkeypatch)
+    assert hashed == []
+    assert stats["removed_embeddings"] == 1
+    assert len(load_embeddings(str(database / "face_embeddings.pkl"))["alice"]) == 3
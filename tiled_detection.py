@@ -0,0 +1,157 @@
+import time
+
+import cv2
+import numpy as np
+
+from inference_backends import DetectionResult
+from env_settings import env_int, env_float, env_flag
+
+# Deteksi bertile untuk foto grup besar: YOLO memperkecil gambar ke 640 piksel sehingga wajah kecil
+# hilang. Gambar besar dipotong menjadi tile yang saling tumpang tindih, tile dideteksi per batch,
+# lalu box digabung dengan NMS. Gambar kecil (potret) tetap dideteksi sekali tanpa tile.
+DEFAULT_TILE_SIZE = 1280
+DEFAULT_TILE_OVERLAP = 0.2
+DEFAULT_TILE_MIN_IMAGE_SIDE = 2560
+DEFAULT_TILE_BATCH_SIZE = 16
+TILE_NMS_IOU = 0.5
+# Box yang menyentuh tepi dalam tile (bukan tepi gambar) kemungkinan wajah terpotong
+TILE_EDGE_PIXELS = 2
+
+# Membaca dari environment apakah klasifikasi memakai deteksi bertile
+def tiled_detection_enabled():
+    return env_flag("TILED_DETECTION", False)
+
+# Ukuran sisi tile dalam piksel gambar yang dideteksi
+def tile_size():
+    return env_int("TILE_SIZE", DEFAULT_TILE_SIZE, minimum=320)
+
+# Fraksi tumpang tindih antar tile yang bersebelahan
+def tile_overlap():
+    return env_float("TILE_OVERLAP", DEFAULT_TILE_OVERLAP, minimum=0.0, maximum=0.5)
+
+# Hanya gambar dengan sisi terpanjang minimal sebesar ini yang dipotong menjadi tile
+def tile_min_image_side():
+    return env_int("TILE_MIN_IMAGE_SIDE", DEFAULT_TILE_MIN_IMAGE_SIDE)
+
+# Jumlah tile per panggilan detektor
+def tile_batch_size():
+    return env_int("TILE_BATCH_SIZE", DEFAULT_TILE_BATCH_SIZE, minimum=1)
+
+# Posisi awal tile di satu sumbu: tile terakhir digeser agar berakhir tepat di tepi gambar
+def tile_starts(length, size, stride):
+    if length <= size:
+        return [0]
+    starts = list(range(0, length - size, stride))
+    starts.append(length - size)
+    return starts
+
+def tile_windows(height, width, size, overlap):
+    """Jendela tile (x1, y1, x2, y2) yang menutupi seluruh gambar dengan tumpang tindih `overlap`"""
+    stride = max(int(size * (1 - overlap)), 1)
+    return [(x, y, min(x + size, width), min(y + size, height))
+            for y in tile_starts(height, size, stride)
+            for x in tile_starts(width, size, stride)]
+
+def result_arrays(result):
+    if not result or not result.boxes:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32)
+    boxes = [box.xyxy.cpu().numpy()[0] for box in result.boxes]
+    confidences = [box.conf.cpu().numpy()[0] for box in result.boxes]
+    return np.array(boxes, dtype=np.float32).reshape(-1, 4), np.array(confidences, dtype=np.float32)
+
+# Membuang box yang menyentuh tepi tile di bagian dalam gambar (wajah terpotong, utuh di tile tetangga)
+def inner_edge_mask(boxes, window, height, width):
+    x1, y1, x2, y2 = window
+    keep = np.ones(len(boxes), dtype=bool)
+    if x1 > 0:
+        keep &= boxes[:, 0] > TILE_EDGE_PIXELS
+    if y1 > 0:
+        keep &= boxes[:, 1] > TILE_EDGE_PIXELS
+    if x2 < width:
+        keep &= boxes[:, 2] < (x2 - x1) - TILE_EDGE_PIXELS
+    if y2 < height:
+        keep &= boxes[:, 3] < (y2 - y1) - TILE_EDGE_PIXELS
+    return keep
+
+def merge_boxes(boxes, confidences, iou=TILE_NMS_IOU):
+    if not len(boxes):
+        return boxes, confidences
+    xywh = np.concatenate([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]], axis=1)
+    indices = cv2.dnn.NMSBoxes(xywh.tolist(), confidences.tolist(), 0.0, iou)
+    indices = np.array(indices, dtype=np.int64).reshape(-1)
+    return boxes[indices], confidences[indices]
+
+class TiledDetector:
+    """Pembungkus detektor dengan antarmuka predict() seperti YOLO yang men-tile gambar besar.
+
+    Gambar besar dideteksi utuh (untuk wajah besar yang terpotong tile) ditambah semua tile-nya;
+    seluruh tile dari satu batch gambar dikirim ke detektor per TILE_BATCH_SIZE, lalu box per
+    gambar digeser ke koordinat gambar dan digabung dengan NMS.
+    """
+
+    def __init__(self, detector, size=None, overlap=None, min_image_side=None, batch_size=None):
+        self.detector = detector
+        self.size = size or tile_size()
+        self.overlap = tile_overlap() if overlap is None else overlap
+        self.min_image_side = min_image_side or tile_min_image_side()
+        self.batch_size = batch_size or tile_batch_size()
+        self.images = 0
+        self.tiled_images = 0
+        self.tiles = 0
+        self.seconds = 0.0
+
+    def windows_for(self, image):
+        height, width = image.shape[:2]
+        if max(height, width) < self.min_image_side:
+            return []
+        return tile_windows(height, width, self.size, self.overlap)
+
+    def predict(self, images, **kwargs):
+        start_time = time.perf_counter()
+        self.images += len(images)
+
+        # Setiap crop: (indeks gambar, jendela tile atau None untuk gambar utuh)
+        crops = []
+        for k, image in enumerate(images):
+            crops.append((k, None))
+            windows = self.windows_for(image)
+            if windows:
+                self.tiled_images += 1
+                self.tiles += len(windows)
+                crops.extend((k, window) for window in windows)
+
+        results = [None] * len(images)
+        boxes = [[] for _ in images]
+        confidences = [[] for _ in images]
+        for start in range(0, len(crops), self.batch_size):
+            chunk = crops[start:start + self.batch_size]
+            inputs = [images[k] if window is None else images[k][window[1]:window[3], window[0]:window[2]]
+                      for k, window in chunk]
+            for (k, window), result in zip(chunk, self.detector.predict(inputs, **kwargs)):
+                tile_boxes, tile_confidences = result_arrays(result)
+                if window is None:
+                    results[k] = result
+                else:
+                    height, width = images[k].shape[:2]
+                    keep = inner_edge_mask(tile_boxes, window, height, width)
+                    offset = np.array([window[0], window[1], window[0], window[1]], dtype=np.float32)
+                    tile_boxes = tile_boxes[keep] + offset
+                    tile_confidences = tile_confidences[keep]
+                boxes[k].append(tile_boxes)
+                confidences[k].append(tile_confidences)
+
+        # Gambar yang tidak di-tile memakai hasil detektor apa adanya
+        for k in range(len(images)):
+            if len(boxes[k]) > 1:
+                merged = merge_boxes(np.concatenate(boxes[k]), np.concatenate(confidences[k]))
+                results[k] = DetectionResult(*merged)
+
+        self.seconds += time.perf_counter() - start_time
+        return results
+
+    def __call__(self, images, **kwargs):
+        return self.predict(images, **kwargs)
+
+    def summary(self):
+        return (f"Tiled detection: {self.tiled_images}/{self.images} images tiled into {self.tiles} tiles "
+                f"({self.size}px, overlap {self.overlap:.0%}), {self.seconds:.2f}s")
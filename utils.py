@@ -3,20 +3,18 @@ import shutil
 import zipfile
 import numpy as np
 import cv2
+from gallery import FaceGallery
 
 # Menghitung kemiripan kosinus antara dua vektor
 def cosine_similarity(a, b):
     return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
 
 # Mencari kecocokan embedding wajah dengan database known_embeddings
+# known_embeddings boleh berupa dictionary {nama: [embedding]} atau FaceGallery yang sudah dibangun
 def find_match(embedding, known_embeddings, threshold=0.8):
-    best_match, best_score = None, threshold
-    for person_name, embeddings_list in known_embeddings.items():
-        for person_embedding in embeddings_list:
-            score = cosine_similarity(embedding, person_embedding)
-            if score > best_score:
-                best_match, best_score = person_name, score
-    return best_match
+    if not isinstance(known_embeddings, FaceGallery):
+        known_embeddings = FaceGallery.from_embeddings(known_embeddings)
+    return known_embeddings.match(embedding, threshold=threshold)[0]
 
 # Memotong gambar wajah berdasarkan bounding box
 def crop_face(image, bbox):